@@ -0,0 +1,74 @@
+"""
+Compare the old pydub concatenation path with assemble_audio on a long output.
+
+Usage: python benchmarks/bench_assemble.py [--minutes 60] [--sample-rate 24000] [--chunk-seconds 150]
+
+Reports wall time and peak traced memory (tracemalloc) for each approach.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('TESTING', '1')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+from pydub import AudioSegment
+
+from src.app import assemble_audio
+
+
+def pydub_concat(audio_segments):
+    """The concatenation previously used by /speak and /speak-file."""
+    combined = AudioSegment.silent(duration=0)
+    for arr, sr in audio_segments:
+        seg = AudioSegment(
+            arr.tobytes(),
+            frame_rate=sr,
+            sample_width=arr.dtype.itemsize,
+            channels=1 if len(arr.shape) == 1 else arr.shape[1]
+        )
+        combined += seg
+    return np.array(combined.get_array_of_samples()), combined.frame_rate
+
+
+def measure(fn, segments):
+    tracemalloc.start()
+    start = time.perf_counter()
+    audio, sr = fn(segments)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, len(audio) / sr
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--minutes', type=float, default=60)
+    parser.add_argument('--sample-rate', type=int, default=24000)
+    parser.add_argument('--chunk-seconds', type=float, default=150)
+    parser.add_argument('--skip-pydub', action='store_true', help='Only measure assemble_audio')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    total = int(args.minutes * 60 * args.sample_rate)
+    per_chunk = int(args.chunk_seconds * args.sample_rate)
+    segments = []
+    while total > 0:
+        n = min(per_chunk, total)
+        segments.append(((rng.random(n, dtype=np.float32) - 0.5) * 0.2, args.sample_rate))
+        total -= n
+    print(f"{len(segments)} segments, {args.minutes:g} min at {args.sample_rate} Hz")
+
+    runs = [('assemble_audio', assemble_audio)]
+    if not args.skip_pydub:
+        runs.insert(0, ('pydub concat', pydub_concat))
+    for name, fn in runs:
+        elapsed, peak, seconds = measure(fn, segments)
+        print(f"{name:15s} time={elapsed:8.3f}s peak={peak / 2 ** 20:9.1f} MiB output={seconds / 60:.1f} min")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+Offline benchmark suite for the synthesis, encoding, catalog and job-polling hot paths.
+
+Usage: python benchmarks/run_benchmarks.py [--quick] [--only PREFIX] [--update-baseline]
+
+Runs with DummyTTS and synthetic data, so no model, broker or network is needed.
+Each case reports the median wall time of --repeat runs. The results are compared
+against a JSON baseline (benchmarks/baseline.json by default), and the run exits
+non-zero if a case is slower than baseline * threshold. The default threshold is
+1.5x; a per-case threshold can be set under "thresholds" in the baseline file, and
+the default can be changed with --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('TESTING', '1')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+
+import src.app as app_module
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+WORDS = ('speech synthesis audio model voice text chunk sentence catalog output '
+         'format quality tenant user title the a of and to in').split()
+
+
+def timed(fn, repeat):
+    fn()  # warm-up: first-call imports and caches are not what we measure
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def synthetic_text(n_chars, seed=0):
+    rng = random.Random(seed)
+    parts, size = [], 0
+    while size < n_chars:
+        sentence = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 24))).capitalize() + rng.choice('.!?')
+        parts.append(sentence)
+        size += len(sentence) + 1
+    return ' '.join(parts)[:n_chars]
+
+
+def bench_chunking(repeat):
+    for mb in (1, 4):
+        text = synthetic_text(mb * 2 ** 20, seed=mb)
+        yield f'chunk_split_{mb}mb', timed(lambda: app_module.split_text_into_chunks(text, max_tokens=1024), repeat)
+
+
+def bench_concat(repeat):
+    for n_chunks in (50, 500):
+        chunks = ['x' * 200] * n_chunks
+        yield f'concat_{n_chunks}_chunks', timed(lambda: app_module.assemble_audio(app_module.synthesize_chunks(chunks, {})), repeat)
+
+
+def bench_save(repeat, out_dir):
+    rng = np.random.default_rng(0)
+    sr = 24000
+    audio = ((rng.random(sr * 60, dtype=np.float32) - 0.5) * 0.2)
+    cases = [('wav', None)] + [(fmt, q) for fmt in ('mp3', 'ogg') for q in ('low', 'medium', 'high')]
+    for fmt, quality in cases:
+        path = os.path.join(out_dir, f'bench.{fmt}')
+        name = f'save_{fmt}' + (f'_{quality}' if quality else '')
+        yield name, timed(lambda: app_module.save_audio_with_format(audio, sr, path, fmt, quality), repeat)
+
+
+def populate_catalog(store, n_rows, seed=0):
+    rng = random.Random(seed)
+    batch = []
+    for i in range(n_rows):
+        batch.append({
+            'title': f'{rng.choice(WORDS)} {rng.choice(WORDS)} {i}',
+            'text': 'synthetic', 'file_path': f'/outputs/{i}.wav', 'url': f'/outputs/{i}.wav',
+            'date': f'2024-01-{rng.randint(1, 28):02d}', 'duration': '1.0', 'format': rng.choice(('wav', 'mp3', 'ogg')),
+            'user': f'user{rng.randrange(100)}', 'tenant': f'tenant{rng.randrange(10)}',
+        })
+        if len(batch) == 10000:
+            store.insert_many(batch)
+            batch = []
+    if batch:
+        store.insert_many(batch)
+
+
+def bench_catalog(repeat, sizes, work_dir):
+    client = app_module.app.test_client()
+    for size in sizes:
+        store = app_module.CatalogStore(os.path.join(work_dir, f'catalog_{size}.db'))
+        populate_catalog(store, size)
+        app_module._catalog_store = store
+        deep_page = max(1, size // 50 // 2)
+        last_id = store.query({}, None, limit=1, offset=size // 2)[0][0]['id']
+        queries = {
+            'filter_user': '/catalog?user=user7&page_size=50',
+            'filter_tenant_format': '/catalog?tenant=tenant3&format=mp3&page_size=50',
+            'page_deep_offset': f'/catalog?page={deep_page}&page_size=50',
+            'page_after_id': f'/catalog?after_id={last_id}&page_size=50',
+            'title_search': '/catalog?title=voice%20model&page_size=50',
+        }
+        for case, url in queries.items():
+            yield f'catalog_{size}_{case}', timed(lambda: client.get(url), repeat)
+
+
+def bench_job_poll(repeat, sizes, work_dir):
+    # Job results come from an in-memory Celery result backend instead of Redis
+    app_module.celery_app.conf.result_backend = 'cache+memory://'
+    client = app_module.app.test_client()
+    backend = app_module.tts_task.backend
+    for size in sizes:
+        store = app_module.JobStore(os.path.join(work_dir, f'jobs_{size}.db'))
+        conn = store._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        for i in range(size):
+            store._insert(conn, {'job_id': f'job-{i}', 'user': f'user{i % 100}', 'text': 'synthetic', 'status': 'pending'})
+        conn.execute('COMMIT')
+        app_module._job_store = store
+        done_id = f'job-{size // 2}'
+        backend.store_result(done_id, {'url': f'/outputs/{done_id}.wav'}, 'SUCCESS')
+        yield f'job_poll_{size}_pending', timed(lambda: client.get(f'/job/job-{size - 1}'), repeat)
+        yield f'job_poll_{size}_complete', timed(lambda: client.get(f'/job/{done_id}'), repeat)
+
+
+def compare(results, baseline, default_threshold):
+    """Return a list of (name, seconds, baseline_seconds, limit) for cases over their limit."""
+    regressions = []
+    thresholds = baseline.get('thresholds', {})
+    for name, seconds in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            continue
+        limit = base * thresholds.get(name, default_threshold)
+        if seconds > limit:
+            regressions.append((name, seconds, base, limit))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+    parser.add_argument('--update-baseline', action='store_true', help='Write the results to the baseline file instead of comparing')
+    parser.add_argument('--threshold', type=float, default=None, help='Allowed slowdown factor (default: baseline file value or 1.5)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='Catalog and job history row counts')
+    parser.add_argument('--quick', action='store_true', help='Only use the smallest catalog/job size')
+    parser.add_argument('--only', default=None, help='Only run cases whose name starts with this prefix')
+    parser.add_argument('--output', default=None, help='Also write the results JSON here')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    if args.quick:
+        sizes = sizes[:1]
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        suites = [
+            ('chunk_split', lambda: bench_chunking(args.repeat)),
+            ('concat', lambda: bench_concat(args.repeat)),
+            ('save', lambda: bench_save(args.repeat, work_dir)),
+            ('catalog', lambda: bench_catalog(args.repeat, sizes, work_dir)),
+            ('job_poll', lambda: bench_job_poll(args.repeat, sizes, work_dir)),
+        ]
+        for prefix, suite in suites:
+            # Skip the setup of suites that --only rules out entirely
+            if args.only and not (prefix.startswith(args.only) or args.only.startswith(prefix)):
+                continue
+            for name, seconds in suite():
+                if args.only and not name.startswith(args.only):
+                    continue
+                results[name] = seconds
+                print(f"{name:45s} {seconds * 1000:10.3f} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results}, f, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.setdefault('threshold', 1.5)
+        baseline.setdefault('thresholds', {})
+        baseline['machine'] = {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()}
+        baseline.setdefault('results', {}).update({name: round(seconds, 6) for name, seconds in results.items()})
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    threshold = args.threshold or baseline.get('threshold', 1.5)
+    regressions = compare(results, baseline, threshold)
+    for name, seconds, base, limit in regressions:
+        print(f"REGRESSION {name}: {seconds * 1000:.3f} ms > {limit * 1000:.3f} ms (baseline {base * 1000:.3f} ms)")
+    if regressions:
+        return 1
+    print(f"No regressions against {args.baseline} ({len(results)} cases, threshold {threshold:g}x)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
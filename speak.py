@@ -3,8 +3,146 @@ import requests
 import os
 import sys
 import json
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote, urljoin
 from tqdm import tqdm
 
+TEXT_EXTENSIONS = ('.txt', '.md', '.json')
+# Responses worth retrying: rate limited or a server-side failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DOWNLOAD_BLOCK = 1024 * 1024
+
+def find_input_files(directory, recursive=False):
+    """Text files in directory (and its subdirectories if recursive), in a stable order."""
+    if not recursive:
+        return sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(TEXT_EXTENSIONS))
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        found.extend(os.path.join(root, f) for f in sorted(files) if f.endswith(TEXT_EXTENSIONS))
+    return found
+
+def retry_delay(resp, attempt, backoff):
+    """Seconds to wait before retrying: the server's Retry-After if given, else exponential backoff with jitter."""
+    retry_after = resp.headers.get('Retry-After') if resp is not None else None
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return backoff * 2 ** attempt * random.uniform(0.5, 1.0)
+
+def request_with_retries(session, method, url, retries=5, backoff=1.0, **kwargs):
+    """
+    Send a request, retrying on connection errors, 429 and 5xx responses.
+    Returns the last response (raises the last connection error if every attempt failed).
+    """
+    for attempt in range(retries + 1):
+        try:
+            resp = session.request(method, url, **kwargs)
+        except requests.ConnectionError:
+            if attempt == retries:
+                raise
+            time.sleep(retry_delay(None, attempt, backoff))
+            continue
+        if resp.status_code not in RETRY_STATUSES or attempt == retries:
+            return resp
+        delay = retry_delay(resp, attempt, backoff)
+        resp.close()
+        time.sleep(delay)
+
+class Manifest:
+    """
+    Append-only JSON-lines record of finished inputs, keyed by content hash and request
+    parameters, so an interrupted batch resumes where it stopped and edited files are redone.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.isfile(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by a crash
+                    self.entries[entry['key']] = entry
+
+    @staticmethod
+    def key(content, params):
+        params_hash = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+        return f"{hashlib.sha256(content).hexdigest()}:{params_hash}"
+
+    def done(self, key):
+        entry = self.entries.get(key)
+        return entry is not None and (not entry.get('output') or os.path.isfile(entry['output']))
+
+    def record(self, key, **entry):
+        entry['key'] = key
+        with self._lock:
+            self.entries[key] = entry
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+def download_url(api, result):
+    """The /download URL of a generated file on the API server (falls back to the returned url)."""
+    file_path = result.get('file_path') or ''
+    if file_path.startswith('/outputs/'):
+        return urljoin(api, '/download/' + quote(file_path[len('/outputs/'):]))
+    return result.get('url')
+
+def download(session, url, dest, retries, backoff):
+    """Stream url to dest through a .part file. Returns the number of bytes written."""
+    resp = request_with_retries(session, 'GET', url, retries, backoff, stream=True)
+    with resp:
+        resp.raise_for_status()
+        os.makedirs(os.path.dirname(dest) or '.', exist_ok=True)
+        written = 0
+        with open(dest + '.part', 'wb') as fout:
+            for block in resp.iter_content(DOWNLOAD_BLOCK):
+                fout.write(block)
+                written += len(block)
+    os.replace(dest + '.part', dest)
+    return written
+
+def process_file(session, args, params, fpath, base_dir, manifest):
+    """Synthesize one file. Returns (status, bytes uploaded, bytes downloaded)."""
+    with open(fpath, 'rb') as fin:
+        content = fin.read()
+    key = Manifest.key(content, params)
+    if manifest.done(key):
+        return 'skipped', 0, 0
+    files = {'file': (os.path.basename(fpath), content)}
+    resp = request_with_retries(session, 'POST', args.api, args.retries, args.backoff, data=params, files=files)
+    if resp.status_code != 200:
+        tqdm.write(f"Error processing {fpath}: {resp.status_code} {resp.text[:200]}")
+        return 'failed', len(content), 0
+    result = resp.json()
+    tqdm.write(f"Success: {fpath} -> {result.get('file_path')}")
+    output, downloaded = None, 0
+    url = download_url(args.api, result)
+    if url and not args.no_download:
+        # Mirror the input's subdirectory under the output directory
+        rel_dir = os.path.relpath(os.path.dirname(os.path.abspath(fpath)), base_dir)
+        output = os.path.normpath(os.path.join(args.output, rel_dir, os.path.basename(result['file_path'])))
+        try:
+            downloaded = download(session, url, output, args.retries, args.backoff)
+        except requests.RequestException as e:
+            tqdm.write(f"Error downloading {url}: {e}")
+            return 'failed', len(content), 0
+    manifest.record(key, source=fpath, file_path=result.get('file_path'), output=output, completed_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+    return 'done', len(content), downloaded
+
 def main():
     parser = argparse.ArgumentParser(description="DiaSpeak CLI - Batch TTS Processor")
     parser.add_argument('--file', type=str, help='Input text, md, or json file')
@@ -18,48 +156,60 @@ def main():
     parser.add_argument('--output', type=str, default='outputs', help='Output directory')
     parser.add_argument('--api', type=str, default='http://localhost:8000/speak-file', help='API endpoint')
     parser.add_argument('--batch', type=str, help='Directory for batch processing')
+    parser.add_argument('--recursive', action='store_true', help='Include subdirectories of the batch directory')
+    parser.add_argument('--token', type=str, default=os.environ.get('DIASPEAK_TOKEN'), help='JWT from /login (default: $DIASPEAK_TOKEN)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Files processed in parallel')
+    parser.add_argument('--retries', type=int, default=5, help='Retries per request on 429/5xx/connection errors')
+    parser.add_argument('--backoff', type=float, default=1.0, help='Initial retry backoff in seconds (doubles each retry)')
+    parser.add_argument('--manifest', type=str, help='Resume manifest (default: <output>/.speak-manifest.jsonl)')
+    parser.add_argument('--no-download', action='store_true', help='Do not download the generated audio')
     args = parser.parse_args()
 
-    files_to_process = []
     if args.batch:
-        for fname in os.listdir(args.batch):
-            if fname.endswith(('.txt', '.md', '.json')):
-                files_to_process.append(os.path.join(args.batch, fname))
+        files_to_process = find_input_files(args.batch, args.recursive)
+        base_dir = os.path.abspath(args.batch)
     elif args.file:
         files_to_process = [args.file]
+        base_dir = os.path.dirname(os.path.abspath(args.file))
     else:
         print('No input file or batch directory specified.')
         sys.exit(1)
 
-    for fpath in tqdm(files_to_process, desc='Processing files'):
-        with open(fpath, 'rb') as fin:
-            data = {
-                'format': args.format,
-                'quality': args.quality,
-            }
-            if args.tone: data['tone'] = args.tone
-            if args.prompt: data['prompt'] = args.prompt
-            if args.voice: data['voice'] = args.voice
-            if args.speed: data['speed'] = args.speed
-            if args.pitch: data['pitch'] = args.pitch
-            files = {'file': (os.path.basename(fpath), fin)}
-            resp = requests.post(args.api, data=data, files=files)
-            if resp.status_code == 200:
-                result = resp.json()
-                print(f"Success: {fpath} -> {result.get('file_path')}")
-                # Optionally download the file
-                url = result.get('url')
-                if url:
-                    outdir = args.output
-                    os.makedirs(outdir, exist_ok=True)
-                    outname = os.path.join(outdir, os.path.basename(result['file_path']))
-                    audio_resp = requests.get(url)
-                    if audio_resp.status_code == 200:
-                        with open(outname, 'wb') as fout:
-                            fout.write(audio_resp.content)
-                        print(f"Downloaded: {outname}")
-            else:
-                print(f"Error processing {fpath}: {resp.text}")
+    params = {'format': args.format, 'quality': args.quality}
+    for field in ('tone', 'prompt', 'voice', 'speed', 'pitch'):
+        if getattr(args, field):
+            params[field] = getattr(args, field)
+    manifest = Manifest(args.manifest or os.path.join(args.output, '.speak-manifest.jsonl'))
+
+    # One keep-alive session shared by all workers, with a connection per worker
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=args.concurrency, pool_maxsize=args.concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if args.token:
+        session.headers['Authorization'] = f'Bearer {args.token}'
+
+    counts = {'done': 0, 'skipped': 0, 'failed': 0}
+    uploaded = downloaded = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        futures = {pool.submit(process_file, session, args, params, fpath, base_dir, manifest): fpath for fpath in files_to_process}
+        for future in tqdm(as_completed(futures), total=len(futures), desc='Processing files'):
+            try:
+                status, sent, received = future.result()
+            except Exception as e:
+                tqdm.write(f"Error processing {futures[future]}: {e}")
+                status, sent, received = 'failed', 0, 0
+            counts[status] += 1
+            uploaded += sent
+            downloaded += received
+    elapsed = time.perf_counter() - start
+
+    print(f"Processed {counts['done']} files ({counts['skipped']} skipped, {counts['failed']} failed) in {elapsed:.1f}s")
+    if elapsed > 0:
+        print(f"Throughput: {counts['done'] / elapsed * 60:.1f} files/min, "
+              f"{uploaded / elapsed / 1024:.1f} KiB/s text, {downloaded / elapsed / 1024 ** 2:.2f} MiB/s audio")
+    sys.exit(1 if counts['failed'] else 0)
 
 if __name__ == '__main__':
     main()
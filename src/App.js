@@ -331,10 +331,9 @@ function App() {
   const [batchProgress, setBatchProgress] = useState(0);
   const [asyncText, setAsyncText] = useState('');
   const [asyncJobs, setAsyncJobs] = useState([]); // {id, text, status, result, submittedAt}
-  const pollingRef = useRef(null);
   const [catalogFilters, setCatalogFilters] = useState({ title: '', user: '', tenant: '', date: '', format: '' });
   const [selectedRows, setSelectedRows] = useState([]);
-  const [editDialog, setEditDialog] = useState({ open: false, idx: null, data: {} });
+  const [editDialog, setEditDialog] = useState({ open: false, id: null, data: {} });
   const [catalogPage, setCatalogPage] = useState(0); // zero-based for TablePagination
   const [pageSize, setPageSize] = useState(20);
   const [searchAll, setSearchAll] = useState('');
@@ -450,18 +449,18 @@ function App() {
   };
 
   // Row selection for batch actions
-  const handleRowSelect = (idx) => {
-    setSelectedRows(rows => rows.includes(idx) ? rows.filter(i => i !== idx) : [...rows, idx]);
+  const handleRowSelect = (id) => {
+    setSelectedRows(rows => rows.includes(id) ? rows.filter(i => i !== id) : [...rows, id]);
   };
   const handleSelectAll = (e) => {
-    if (e.target.checked) setSelectedRows(catalog.results.map((_, idx) => idx));
+    if (e.target.checked) setSelectedRows(catalog.results.map(row => row.id));
     else setSelectedRows([]);
   };
 
   // Delete single or batch
-  const deleteCatalogItem = async (idx) => {
+  const deleteCatalogItem = async (id) => {
     try {
-      await apiCall(`${API_URL}/catalog/${idx}`, { method: 'DELETE' });
+      await apiCall(`${API_URL}/catalog/${id}`, { method: 'DELETE' });
       setMessage(t('Deleted catalog item.'));
       setMessageType('success');
       setShowMsg(true);
@@ -469,24 +468,24 @@ function App() {
     } catch {}
   };
   const deleteSelected = async () => {
-    for (let idx of selectedRows) {
-      await deleteCatalogItem(idx);
+    for (let id of selectedRows) {
+      await deleteCatalogItem(id);
     }
     setSelectedRows([]);
     fetchCatalog();
   };
 
   // Edit metadata dialog
-  const openEditDialog = (idx, row) => {
-    setEditDialog({ open: true, idx, data: { ...row } });
+  const openEditDialog = (id, row) => {
+    setEditDialog({ open: true, id, data: { ...row } });
   };
-  const closeEditDialog = () => setEditDialog({ open: false, idx: null, data: {} });
+  const closeEditDialog = () => setEditDialog({ open: false, id: null, data: {} });
   const handleEditChange = (e) => {
     setEditDialog(ed => ({ ...ed, data: { ...ed.data, [e.target.name]: e.target.value } }));
   };
   const saveEdit = async () => {
     try {
-      await apiCall(`${API_URL}/catalog/${editDialog.idx}`, {
+      await apiCall(`${API_URL}/catalog/${editDialog.id}`, {
         method: 'PUT',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(editDialog.data)
@@ -578,8 +577,6 @@ function App() {
         setMessage(t('Async job submitted!'));
         setMessageType('success');
         setShowMsg(true);
-        // Start polling for this job
-        pollJobStatus(data.job_id);
       } else {
         setMessage(data.error || t('Async job submission failed'));
         setMessageType('error');
@@ -592,38 +589,52 @@ function App() {
     }
   };
 
-  // Poll job status
-  const pollJobStatus = (jobId) => {
-    const poll = async () => {
-      try {
-        const resp = await fetch(`${API_URL}/job/${jobId}`);
-        const data = await resp.json();
-        setAsyncJobs(jobs => jobs.map(j =>
-          j.id === jobId ? { ...j, status: data.status, result: data.result } : j
-        ));
-        if (data.status === 'pending' || data.status === 'processing') {
-          pollingRef.current = setTimeout(poll, 2000);
-        } else if (data.status === 'complete') {
-          notifyJobComplete(data);
-        }
-        if (data.status === 'complete' && notifyOnJob && window.Notification && Notification.permission === 'granted') {
-          notifyJobComplete({ ...job, ...data });
-        }
-      } catch {}
-    };
-    poll();
+  // Apply a job status change from /jobs/stream or /jobs/poll
+  const applyJobUpdate = (update) => {
+    setAsyncJobs(jobs => jobs.map(j =>
+      j.id === update.job_id ? {
+        ...j,
+        status: update.status,
+        result: update.status === 'complete' ? { url: update.result_url }
+          : update.status === 'error' ? { message: update.error } : j.result
+      } : j
+    ));
+    if (update.status === 'complete') {
+      notifyJobComplete(update);
+    }
   };
 
-  // Optionally, poll all jobs that are not complete/error on mount
+  // Subscribe to status changes of this user's jobs: one SSE stream (or a
+  // long-poll loop where EventSource is unavailable) instead of polling each job
   React.useEffect(() => {
-    asyncJobs.forEach(job => {
-      if (job.status === 'pending' || job.status === 'processing') {
-        pollJobStatus(job.id);
+    if (!token || !userInfo || !userInfo.user) return undefined;
+    if (window.EventSource) {
+      // EventSource cannot send an Authorization header, so the token goes in the query
+      const source = new EventSource(`${API_URL}/jobs/stream?token=${encodeURIComponent(token)}`);
+      source.addEventListener('job', e => applyJobUpdate(JSON.parse(e.data)));
+      return () => source.close();
+    }
+    let cancelled = false;
+    let since = '';
+    const longPoll = async () => {
+      while (!cancelled) {
+        try {
+          const resp = await fetch(`${API_URL}/jobs/poll?timeout=25${since !== '' ? `&since=${since}` : ''}`, {
+            headers: { 'Authorization': `Bearer ${token}` }
+          });
+          const data = await resp.json();
+          if (cancelled) break;
+          data.jobs.forEach(applyJobUpdate);
+          since = data.seq;
+        } catch {
+          await new Promise(resolve => setTimeout(resolve, 2000));
+        }
       }
-    });
-    return () => { if (pollingRef.current) clearTimeout(pollingRef.current); };
+    };
+    longPoll();
+    return () => { cancelled = true; };
     // eslint-disable-next-line
-  }, []);
+  }, [token, userInfo]);
 
   // Pagination handlers
   const handleChangePage = (event, newPage) => {
@@ -658,11 +669,11 @@ function App() {
   // Batch actions
   const handleBatchDownload = async () => {
     if (!selectedRows.length) return;
-    const indices = selectedRows;
+    const ids = selectedRows;
     const resp = await fetch(`${API_URL}/catalog/batch`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ action: 'download', indices })
+      body: JSON.stringify({ action: 'download', ids })
     });
     const blob = await resp.blob();
     const url = window.URL.createObjectURL(blob);
@@ -675,11 +686,11 @@ function App() {
 
   const handleBatchExportCSV = async () => {
     if (!selectedRows.length) return;
-    const indices = selectedRows;
+    const ids = selectedRows;
     const resp = await fetch(`${API_URL}/catalog/batch`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ action: 'export_csv', indices })
+      body: JSON.stringify({ action: 'export_csv', ids })
     });
     const blob = await resp.blob();
     const url = window.URL.createObjectURL(blob);
@@ -699,7 +710,7 @@ function App() {
     await fetch(`${API_URL}/catalog/batch`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ action: 'edit', indices: selectedRows, update: { [batchEditDialog.field]: batchEditDialog.value } })
+      body: JSON.stringify({ action: 'edit', ids: selectedRows, update: { [batchEditDialog.field]: batchEditDialog.value } })
     });
     setMessage(t('Batch edit complete.'));
     setMessageType('success');
@@ -1144,9 +1155,9 @@ function App() {
                   </TableRow>
                 </TableHead>
                 <TableBody>
-                  {filteredResults.map((row, idx) => (
-                    <TableRow key={idx} selected={selectedRows.includes(idx)}>
-                      <TableCell padding="checkbox"><Checkbox checked={selectedRows.includes(idx)} onChange={() => handleRowSelect(idx)} /></TableCell>
+                  {filteredResults.map((row) => (
+                    <TableRow key={row.id} selected={selectedRows.includes(row.id)}>
+                      <TableCell padding="checkbox"><Checkbox checked={selectedRows.includes(row.id)} onChange={() => handleRowSelect(row.id)} /></TableCell>
                       <TableCell>{row.title || <i>({t('untitled')})</i>}</TableCell>
                       <TableCell>{row.date}</TableCell>
                       <TableCell>{row.length}</TableCell>
@@ -1158,8 +1169,8 @@ function App() {
                       <TableCell>
                         {row.url || row.file_path ? <AudioPlayer src={row.url || row.file_path} /> : null}
                         {row.url || row.file_path ? <IconButton href={row.url || row.file_path} download><DownloadIcon /></IconButton> : null}
-                        <IconButton onClick={() => openEditDialog(idx, row)}><EditIcon /></IconButton>
-                        <IconButton color="error" onClick={() => deleteCatalogItem(idx)}><DeleteIcon /></IconButton>
+                        <IconButton onClick={() => openEditDialog(row.id, row)}><EditIcon /></IconButton>
+                        <IconButton color="error" onClick={() => deleteCatalogItem(row.id)}><DeleteIcon /></IconButton>
                       </TableCell>
                     </TableRow>
                   ))}
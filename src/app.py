@@ -1,6 +1,5 @@
 from flask import Flask, request, jsonify, g, send_file, Response, abort
 from werkzeug.utils import secure_filename
-from transformers import pipeline
 import os
 from datetime import datetime, timedelta
 import soundfile as sf
@@ -8,21 +7,30 @@ import numpy as np
 import uuid
 from urllib.parse import quote
 import json
-from pydub import AudioSegment
 import csv
 from typing import List
 import re
 from celery import Celery
+from celery.signals import worker_process_init
 import time
 from functools import wraps
-from collections import defaultdict
+from collections import defaultdict, deque, OrderedDict
+from concurrent.futures import Future
 import jwt  # PyJWT is installed as 'jwt'
 import mimetypes
-import boto3
-from botocore.exceptions import BotoCoreError, NoCredentialsError
 import zipfile
-from io import BytesIO
 import threading
+import click
+import sys
+import hashlib
+import hmac
+import shutil
+import sqlite3
+import struct
+import subprocess
+import io
+import codecs
+import itertools
 
 # Secret key for JWT (in production, use env var)
 JWT_SECRET = 'supersecretkey'
@@ -34,33 +42,218 @@ USERS = {
     'bob': {'password': 'password456', 'tenant': 'org2'},
 }
 
-# In-memory rate limit store: {user: [timestamps]}
-RATE_LIMIT = defaultdict(list)
-RATE_LIMIT_MAX = 10  # requests
-RATE_LIMIT_WINDOW = 60  # seconds
+# Rate limiting: RATE_LIMIT_MAX requests per user per RATE_LIMIT_WINDOW seconds.
+# RATE_LIMIT_TENANTS overrides the limit per tenant, e.g. '{"org1": 100}'.
+RATE_LIMIT_MAX = int(os.environ.get('RATE_LIMIT_MAX', 10))  # requests
+RATE_LIMIT_WINDOW = int(os.environ.get('RATE_LIMIT_WINDOW', 60))  # seconds
+RATE_LIMIT_TENANTS = json.loads(os.environ.get('RATE_LIMIT_TENANTS', '{}'))
+
+class RateLimitResult:
+    def __init__(self, allowed, limit, remaining, reset_after, retry_after=0):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_after = reset_after
+        self.retry_after = retry_after
+
+    def headers(self):
+        headers = {
+            'RateLimit-Limit': str(self.limit),
+            'RateLimit-Remaining': str(self.remaining),
+            'RateLimit-Reset': str(self.reset_after),
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(self.retry_after)
+        return headers
+
+def sliding_window_decision(previous, current, elapsed, limit, window):
+    """
+    Sliding-window counter: the previous fixed window's count is weighted by how much
+    of it still overlaps the sliding window. current excludes the request being decided.
+    Returns a RateLimitResult.
+    """
+    import math
+    weight = 1.0 - elapsed / window
+    estimate = previous * weight + current
+    reset_after = max(1, math.ceil(window - elapsed))
+    if estimate + 1 <= limit:
+        remaining = max(0, int(limit - estimate - 1))
+        return RateLimitResult(True, limit, remaining, reset_after)
+    # Time until the weighted estimate leaves room for one more request
+    if current + 1 <= limit and previous:
+        wait = window * (1.0 - (limit - 1 - current) / previous) - elapsed
+    else:
+        wait = (window - elapsed) + window * max(0.0, 1.0 - (limit - 1) / max(current, 1))
+    return RateLimitResult(False, limit, 0, reset_after, max(1, math.ceil(wait)))
+
+class MemoryRateLimiter:
+    """
+    In-process sliding-window counters: O(1) per request, one small entry per active key.
+    Keys idle for two windows are dropped as new requests arrive, and at most max_keys
+    keys are kept, so memory stays bounded.
+    """
+    def __init__(self, max_keys=100000, clock=time.time):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._windows = OrderedDict()  # key -> [window index, current count, previous count, window]
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window):
+        now = self.clock()
+        index = int(now // window)
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None or entry[0] < index - 1 or entry[3] != window:
+                entry = [index, 0, 0, window]
+            elif entry[0] == index - 1:
+                entry = [index, 0, entry[1], window]
+            self._windows[key] = entry
+            self._windows.move_to_end(key)
+            result = sliding_window_decision(entry[2], entry[1], now - index * window, limit, window)
+            if result.allowed:
+                entry[1] += 1
+            self._prune(now)
+        return result
+
+    def _prune(self, now):
+        # Entries are in last-use order, so stale ones are at the front
+        while self._windows:
+            key, (index, _, _, window) = next(iter(self._windows.items()))
+            if len(self._windows) <= self.max_keys and index >= int(now // window) - 1:
+                break
+            del self._windows[key]
+
+class RedisRateLimiter:
+    """
+    Cluster-wide sliding-window counters in Redis, shared by every web process.
+    Each request does one MULTI/EXEC round trip (INCR + EXPIRE on the current window,
+    GET on the previous one); a rejected request gives its increment back.
+    """
+    def __init__(self, client, prefix='ratelimit', clock=time.time):
+        self.client = client
+        self.prefix = prefix
+        self.clock = clock
+
+    def hit(self, key, limit, window):
+        now = self.clock()
+        index = int(now // window)
+        current_key = f'{self.prefix}:{key}:{window}:{index}'
+        pipe = self.client.pipeline(transaction=True)
+        pipe.incr(current_key)
+        pipe.expire(current_key, window * 2)
+        pipe.get(f'{self.prefix}:{key}:{window}:{index - 1}')
+        current, _, previous = pipe.execute()
+        result = sliding_window_decision(int(previous or 0), current - 1, now - index * window, limit, window)
+        if not result.allowed:
+            self.client.decr(current_key)
+        return result
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """
+    The process-wide rate limiter. RATE_LIMIT_BACKEND=redis shares limits across processes
+    through RATE_LIMIT_REDIS_URL; the default 'memory' backend limits each process separately.
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            if os.environ.get('RATE_LIMIT_BACKEND', 'memory') == 'redis':
+                import redis
+                client = redis.Redis.from_url(os.environ.get('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0'))
+                _rate_limiter = RedisRateLimiter(client)
+            else:
+                _rate_limiter = MemoryRateLimiter()
+        return _rate_limiter
+
+def rate_limit_for(tenant):
+    """Requests allowed per RATE_LIMIT_WINDOW for users of tenant."""
+    return int(RATE_LIMIT_TENANTS.get(tenant, RATE_LIMIT_MAX))
+
+class TokenCache:
+    """
+    Verified JWT claims keyed by a hash of the token, kept until the token's exp,
+    so repeat requests skip the signature check. Bounded LRU of max_entries.
+    """
+    def __init__(self, max_entries=10000, max_ttl=3600, clock=time.time):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # sha256(token) -> (claims, expires_at)
+        self._lock = threading.Lock()
+
+    def verify(self, token):
+        """Return the token's claims, decoding and verifying it on a cache miss (raises if invalid)."""
+        key = hashlib.sha256(token.encode()).digest()
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    return entry[0]
+                del self._entries[key]
+        claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
+        expires_at = min(claims.get('exp', now + self.max_ttl), now + self.max_ttl)
+        with self._lock:
+            self._entries[key] = (claims, expires_at)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return claims
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+token_cache = TokenCache()
+
+def token_version(record):
+    """
+    Fingerprint of a user's credentials, embedded in their tokens as 'ver'.
+    Changing the password or tenant changes it, which revokes tokens issued before.
+    It is keyed with JWT_SECRET, so it reveals nothing about the password.
+    """
+    material = f"{record.get('password', '')}\0{record.get('tenant', '')}".encode()
+    return hmac.new(JWT_SECRET.encode(), material, hashlib.sha256).hexdigest()[:16]
 
-# Helper: JWT auth decorator
-def jwt_required(f):
+def authenticate_request(query_token=False):
+    """
+    Check the request's bearer token and that its user still exists unchanged.
+    With query_token, a ?token= parameter is accepted when there is no Authorization
+    header (EventSource cannot send headers). Returns (claims, None) or (None, error response).
+    """
+    auth = request.headers.get('Authorization', None)
+    if query_token and not auth and request.args.get('token'):
+        auth = 'Bearer ' + request.args['token']
+    if not auth or not auth.startswith('Bearer '):
+        return None, (jsonify({'error': 'Missing or invalid Authorization header'}), 401)
+    token = auth.split(' ', 1)[1]
+    try:
+        claims = token_cache.verify(token)
+    except Exception as e:
+        return None, (jsonify({'error': 'Invalid token', 'message': str(e)}), 401)
+    # Revocation: the user store is cached and reloads when users.json changes in any process
+    record = get_user_store().get(claims.get('user'))
+    if record is None or ('ver' in claims and claims['ver'] != token_version(record)):
+        return None, (jsonify({'error': 'Invalid token', 'message': 'Token has been revoked'}), 401)
+    return claims, None
+
+# Helper: JWT auth decorator; @jwt_required(query_token=True) also accepts ?token=
+def jwt_required(f=None, query_token=False):
+    if f is None:
+        return lambda f: jwt_required(f, query_token)
     @wraps(f)
     def decorated(*args, **kwargs):
-        auth = request.headers.get('Authorization', None)
-        if not auth or not auth.startswith('Bearer '):
-            return jsonify({'error': 'Missing or invalid Authorization header'}), 401
-        token = auth.split(' ', 1)[1]
-        try:
-            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
-            g.user = payload['user']
-            g.tenant = payload.get('tenant')
-        except Exception as e:
-            return jsonify({'error': 'Invalid token', 'message': str(e)}), 401
-        # Rate limiting
-        now = time.time()
-        timestamps = RATE_LIMIT[g.user]
-        # Remove old timestamps
-        RATE_LIMIT[g.user] = [t for t in timestamps if now - t < RATE_LIMIT_WINDOW]
-        if len(RATE_LIMIT[g.user]) >= RATE_LIMIT_MAX:
-            return jsonify({'error': 'Rate limit exceeded. Try again later.'}), 429
-        RATE_LIMIT[g.user].append(now)
+        claims, error = authenticate_request(query_token)
+        if error:
+            return error
+        g.user = claims['user']
+        g.tenant = claims.get('tenant')
+        # Rate limiting (headers are added to the response by add_rate_limit_headers)
+        g.rate_limit = get_rate_limiter().hit(f'user:{g.user}', rate_limit_for(g.tenant), RATE_LIMIT_WINDOW)
+        if not g.rate_limit.allowed:
+            return jsonify({'error': 'Rate limit exceeded. Try again later.', 'retry_after': g.rate_limit.retry_after}), 429
         return f(*args, **kwargs)
     return decorated
 
@@ -77,17 +270,194 @@ def is_test_mode():
         any('pytest' in x or 'unittest' in x for x in sys.modules)
     )
 
+@app.after_request
+def add_rate_limit_headers(response):
+    result = g.pop('rate_limit', None)
+    if result is not None:
+        response.headers.update(result.headers())
+    return response
+
+# Prometheus metrics (optional: without prometheus_client they are no-ops).
+# To aggregate across several web/worker processes, point PROMETHEUS_MULTIPROC_DIR at an
+# empty directory shared by all of them before they start.
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs):
+        return self
+    def time(self):
+        return self
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def observe(self, value):
+        pass
+    def inc(self, amount=1):
+        pass
+    def dec(self, amount=1):
+        pass
+
+if prometheus_client is not None:
+    STAGE_SECONDS = prometheus_client.Histogram(
+        'speechforge_stage_seconds', 'Time spent in each synthesis pipeline stage', ['stage'],
+        buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+    REQUESTS_TOTAL = prometheus_client.Counter(
+        'speechforge_requests_total', 'HTTP requests', ['endpoint', 'status', 'format', 'backend'])
+    REQUEST_SECONDS = prometheus_client.Histogram(
+        'speechforge_request_seconds', 'HTTP request latency, including streamed bodies', ['endpoint'],
+        buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+    IN_FLIGHT = prometheus_client.Gauge(
+        'speechforge_requests_in_flight', 'HTTP requests being served', ['endpoint'], multiprocess_mode='livesum')
+    CHARACTERS_TOTAL = prometheus_client.Counter(
+        'speechforge_characters_synthesized_total', 'Characters sent to the TTS backend', ['backend'])
+    AUDIO_SECONDS_TOTAL = prometheus_client.Counter(
+        'speechforge_audio_seconds_total', 'Seconds of audio generated by the TTS backend', ['backend'])
+    REAL_TIME_FACTOR = prometheus_client.Histogram(
+        'speechforge_real_time_factor', 'Synthesis wall time divided by generated audio duration', ['backend'],
+        buckets=(.05, .1, .25, .5, .75, 1, 1.5, 2, 3, 5, 10, 25))
+    CACHE_REQUESTS = prometheus_client.Counter(
+        'speechforge_synthesis_cache_requests_total', 'Synthesis cache lookups', ['result'])
+else:
+    STAGE_SECONDS = REQUESTS_TOTAL = REQUEST_SECONDS = IN_FLIGHT = _NoopMetric()
+    CHARACTERS_TOTAL = AUDIO_SECONDS_TOTAL = REAL_TIME_FACTOR = CACHE_REQUESTS = _NoopMetric()
+
+def stage_timer(stage):
+    """Context manager that records its body's duration under speechforge_stage_seconds{stage=...}."""
+    return STAGE_SECONDS.labels(stage=stage).time()
+
+def record_synthesis(characters, audio_seconds, elapsed):
+    """Count characters and audio produced by the backend and observe the real-time factor."""
+    backend = tts_backend_name()
+    CHARACTERS_TOTAL.labels(backend=backend).inc(characters)
+    AUDIO_SECONDS_TOTAL.labels(backend=backend).inc(audio_seconds)
+    if audio_seconds > 0:
+        REAL_TIME_FACTOR.labels(backend=backend).observe(elapsed / audio_seconds)
+
+# Endpoints whose request counters carry the audio format and TTS backend
+SYNTHESIS_ENDPOINTS = {'speak', 'speak_stream', 'speak_async', 'speak_file'}
+
+@app.before_request
+def start_request_metrics():
+    if request.endpoint == 'metrics':
+        return
+    g.metrics_start = time.perf_counter()
+    g.metrics_endpoint = request.endpoint or 'unknown'
+    IN_FLIGHT.labels(endpoint=g.metrics_endpoint).inc()
+
+@app.after_request
+def finish_request_metrics(response):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return response
+    endpoint = g.metrics_endpoint
+    format_, backend = '', ''
+    if endpoint in SYNTHESIS_ENDPOINTS:
+        data = request.get_json(silent=True) or request.form
+        format_ = str(data.get('format') or 'wav').lower()
+        if format_ not in ('wav', 'mp3', 'ogg', 'pcm'):
+            format_ = 'other'
+        backend = tts_backend_name()
+    REQUESTS_TOTAL.labels(endpoint=endpoint, status=str(response.status_code), format=format_, backend=backend).inc()
+    # Streamed bodies are still being produced here; finish the timing when the response closes
+    def close():
+        REQUEST_SECONDS.labels(endpoint=endpoint).observe(time.perf_counter() - start)
+        IN_FLIGHT.labels(endpoint=endpoint).dec()
+    response.call_on_close(close)
+    return response
+
+@app.teardown_request
+def abort_request_metrics(exc):
+    # Reached with metrics_start still set only if after_request never ran (unhandled error)
+    if g.pop('metrics_start', None) is not None:
+        IN_FLIGHT.labels(endpoint=g.metrics_endpoint).dec()
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics for this process, or for all processes sharing PROMETHEUS_MULTIPROC_DIR."""
+    if prometheus_client is None:
+        return jsonify({'error': 'prometheus_client is not installed'}), 501
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return Response(prometheus_client.generate_latest(registry), mimetype=prometheus_client.CONTENT_TYPE_LATEST)
+
 # Model abstraction layer for TTS backends
 class BaseTTS:
+    model_id = None  # identifies the weights behind the backend (used in cache keys)
+    max_text_tokens = 1024  # longest text input the model accepts, in its own tokens
     def __call__(self, text, **kwargs):
         raise NotImplementedError
+    def count_tokens(self, text):
+        """Length of text in model tokens (Dia's tokenizer is byte-level: one token per UTF-8 byte)."""
+        return len(text.encode('utf-8'))
+    def batch(self, texts, batch_size=None, **kwargs):
+        """Synthesize a list of texts, returning one result per text in input order."""
+        return [self(text, **kwargs) for text in texts]
 
 class DiaTTS(BaseTTS):
+    """
+    Dia through the transformers pipeline, tuned for CPU inference.
+    Every call runs under torch.inference_mode. Subclasses switch on dynamic int8
+    quantization of the Linear layers, bf16 autocast or torch.compile.
+    TTS_TORCH_THREADS sets the intra-op thread count.
+    """
+    model_id = "nari-labs/Dia-1.6B"
+    quantize = False
+    autocast_dtype = None
+    compile = False
     def __init__(self):
+        import torch
         from transformers import pipeline
-        self.pipeline = pipeline("text-to-speech", model="nari-labs/Dia-1.6B")
+        threads = int(os.environ.get('TTS_TORCH_THREADS', 0))
+        if threads:
+            torch.set_num_threads(threads)
+        self.pipeline = pipeline("text-to-speech", model=self.model_id, device='cpu')
+        model = self.pipeline.model.eval()
+        if self.quantize:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            self.pipeline.model = model
+        if self.compile:
+            # Compile forward only so generate() keeps working on the original module
+            model.forward = torch.compile(model.forward, dynamic=True)
+        self.tokenizer = getattr(self.pipeline, 'tokenizer', None)
+        encoder_config = getattr(model.config, 'encoder_config', None)
+        self.max_text_tokens = getattr(encoder_config, 'max_position_embeddings', None) or self.max_text_tokens
+    def count_tokens(self, text):
+        if self.tokenizer is None:
+            return super().count_tokens(text)
+        return len(self.tokenizer(text, add_special_tokens=False)['input_ids'])
+    def _inference(self):
+        import contextlib
+        import torch
+        stack = contextlib.ExitStack()
+        stack.enter_context(torch.inference_mode())
+        if self.autocast_dtype:
+            stack.enter_context(torch.autocast('cpu', dtype=getattr(torch, self.autocast_dtype)))
+        return stack
     def __call__(self, text, **kwargs):
-        return self.pipeline(text, **kwargs)
+        with self._inference():
+            return self.pipeline(text, **kwargs)
+    def batch(self, texts, batch_size=None, **kwargs):
+        # The transformers pipeline pads list inputs and runs them batch_size at a time
+        texts = list(texts)
+        with self._inference():
+            return list(self.pipeline(texts, batch_size=batch_size or len(texts), **kwargs))
+
+class DiaInt8TTS(DiaTTS):
+    quantize = True
+
+class DiaBF16TTS(DiaTTS):
+    autocast_dtype = 'bfloat16'
+
+class DiaCompiledTTS(DiaTTS):
+    compile = True
 
 class DummyTTS(BaseTTS):
     def __call__(self, text, **kwargs):
@@ -98,20 +468,433 @@ class DummyTTS(BaseTTS):
 # TTS backend selection
 TTS_BACKENDS = {
     'dia': DiaTTS,
+    'dia-int8': DiaInt8TTS,
+    'dia-bf16': DiaBF16TTS,
+    'dia-compiled': DiaCompiledTTS,
     'dummy': DummyTTS,
 }
 
-def get_tts_backend():
+def _pool_worker_main(index, backend, task_queue, result_queue, cores, threads):
+    """Inference pool worker: runs batches on the inherited backend and returns audio via shared memory."""
+    from multiprocessing import resource_tracker, shared_memory
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    if threads and 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(threads)
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, texts, tts_kwargs = task
+        try:
+            results = run_backend_batch(backend, texts, tts_kwargs)
+            descriptors = []
+            for audio_array, sampling_rate in results:
+                audio_array = np.ascontiguousarray(audio_array)
+                shm = shared_memory.SharedMemory(create=True, size=max(audio_array.nbytes, 1))
+                np.ndarray(audio_array.shape, dtype=audio_array.dtype, buffer=shm.buf)[...] = audio_array
+                descriptors.append((shm.name, audio_array.shape, audio_array.dtype.str, sampling_rate))
+                shm.close()
+                # The parent process unlinks the block once it has copied the audio out
+                resource_tracker.unregister(shm._name, 'shared_memory')
+            result_queue.put((task_id, index, descriptors, None))
+        except Exception as e:
+            result_queue.put((task_id, index, None, f"{type(e).__name__}: {e}"))
+
+class InferencePool(BaseTTS):
+    """
+    Runs a TTS backend in N forked worker processes.
+    The parent loads the model once and forks afterwards, so the weights are shared
+    copy-on-write (and moved to torch shared memory when the model supports it)
+    instead of being loaded N times. Tasks go to the least busy worker; audio comes
+    back through multiprocessing.shared_memory, so arrays are never pickled.
+    Workers can be pinned to disjoint CPU sets, and the intra-op thread count per
+    worker defaults to that set's size.
+    """
+    def __init__(self, backend, workers=2, pin_cores=False, threads_per_worker=None):
+        self.backend = backend
+        self.model_id = backend.model_id
+        self.max_text_tokens = backend.max_text_tokens
+        self.workers = max(1, int(workers))
+        self.pin_cores = pin_cores
+        self.threads_per_worker = threads_per_worker
+        self._procs = []
+        self._task_queues = []
+        self._inflight = {}  # task_id -> (worker index, future)
+        self._load = []
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def _cpu_sets(self):
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+        per = max(1, len(cpus) // self.workers)
+        return [cpus[(i * per) % len(cpus):(i * per) % len(cpus) + per] for i in range(self.workers)]
+
+    def start(self):
+        import multiprocessing
+        self._ctx = multiprocessing.get_context('fork')
+        model = getattr(getattr(self.backend, 'pipeline', None), 'model', None)
+        if hasattr(model, 'share_memory'):
+            model.share_memory()
+        self._result_queue = self._ctx.Queue()
+        self._cpu_set_list = self._cpu_sets()
+        self._closing = False
+        self._procs = [None] * self.workers
+        self._task_queues = [None] * self.workers
+        self._load = [0] * self.workers
+        for i in range(self.workers):
+            self._spawn(i)
+        threading.Thread(target=self._collect, name='tts-pool-results', daemon=True).start()
+        return self
+
+    def _spawn(self, i):
+        """Start (or restart) the worker in slot i with a fresh task queue."""
+        cores = self._cpu_set_list[i] if self.pin_cores else None
+        threads = self.threads_per_worker or (len(self._cpu_set_list[i]) if self.pin_cores else None)
+        task_queue = self._ctx.SimpleQueue()
+        proc = self._ctx.Process(
+            target=_pool_worker_main,
+            args=(i, self.backend, task_queue, self._result_queue, cores, threads),
+            name=f'tts-pool-{i}', daemon=True,
+        )
+        proc.start()
+        self._procs[i] = proc
+        self._task_queues[i] = task_queue
+
+    def _collect(self):
+        import queue
+        last_reap = time.monotonic()
+        while True:
+            try:
+                message = self._result_queue.get(timeout=1)
+            except queue.Empty:
+                message = None
+            except Exception as e:
+                print(f"[TTS POOL] reading a result failed: {e}")
+                message = None
+            if message is not None:
+                self._deliver(*message)
+            # Check for dead workers at least once a second, busy or not
+            if time.monotonic() - last_reap >= 1:
+                last_reap = time.monotonic()
+                try:
+                    self._reap_dead_workers()
+                except Exception as e:
+                    print(f"[TTS POOL] restarting workers failed: {e}")
+
+    def _deliver(self, task_id, index, descriptors, error):
+        """Copy a worker's results out of shared memory and resolve the task's future."""
+        from multiprocessing import shared_memory
+        with self._lock:
+            entry = self._inflight.pop(task_id, None)
+            if entry is not None:
+                self._load[index] -= 1
+        future = entry[1] if entry is not None else None
+        failure = RuntimeError(error) if error is not None else None
+        results = []
+        # Every block is unlinked, even for a task the reaper already failed
+        for name, shape, dtype, sampling_rate in descriptors or []:
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            except Exception as e:
+                failure = failure or RuntimeError(f"{type(e).__name__}: {e}")
+                continue
+            try:
+                if future is not None and failure is None:
+                    results.append((np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf).copy(), sampling_rate))
+            except Exception as e:
+                failure = RuntimeError(f"{type(e).__name__}: {e}")
+            finally:
+                shm.close()
+                shm.unlink()
+        if future is None:
+            return
+        if failure is not None:
+            future.set_exception(failure)
+        else:
+            future.set_result(results)
+
+    def _reap_dead_workers(self):
+        """Fail the tasks of workers that died and start replacements in their slots."""
+        with self._lock:
+            if self._closing:
+                return
+            dead = [i for i, proc in enumerate(self._procs) if not proc.is_alive()]
+            failed = [task_id for task_id, (index, _) in self._inflight.items() if index in dead]
+            futures = [self._inflight.pop(task_id)[1] for task_id in failed]
+            for i in dead:
+                print(f"[TTS POOL] worker {i} exited with code {self._procs[i].exitcode}; restarting it")
+                self._load[i] = 0
+                self._spawn(i)
+        for future in futures:
+            future.set_exception(RuntimeError('inference worker exited'))
+
+    def submit(self, texts, tts_kwargs):
+        """Send a batch of texts to the least busy live worker. Returns a Future of [(audio, sr), ...]."""
+        future = Future()
+        with self._lock:
+            live = [i for i, proc in enumerate(self._procs) if proc.is_alive()]
+            if not live:
+                raise RuntimeError('no live inference workers')
+            index = min(live, key=lambda i: self._load[i])
+            task_id = self._next_id
+            self._next_id += 1
+            self._inflight[task_id] = (index, future)
+            self._load[index] += 1
+        self._task_queues[index].put((task_id, list(texts), tts_kwargs))
+        return future
+
+    def count_tokens(self, text):
+        # The tokenizer is light, so token counting stays in the parent process
+        return self.backend.count_tokens(text)
+
+    def __call__(self, text, **kwargs):
+        audio_array, sampling_rate = self.submit([text], kwargs).result()[0]
+        return {"audio": audio_array, "sampling_rate": sampling_rate}
+
+    def batch(self, texts, batch_size=None, **kwargs):
+        # Spread the batch over the workers as contiguous slices and reassemble in order
+        texts = list(texts)
+        per_worker = -(-len(texts) // self.workers)
+        futures = [self.submit(texts[i:i + per_worker], kwargs) for i in range(0, len(texts), per_worker)]
+        return [{"audio": audio, "sampling_rate": sr} for future in futures for audio, sr in future.result()]
+
+    def close(self):
+        with self._lock:
+            self._closing = True
+        for task_queue in self._task_queues:
+            task_queue.put(None)
+        for proc in self._procs:
+            proc.join(timeout=5)
+
+def get_tts_backend_class():
     if is_test_mode():
-        return DummyTTS()
+        return DummyTTS
     backend = os.environ.get('TTS_BACKEND', 'dia')
-    return TTS_BACKENDS.get(backend, DiaTTS)()
+    return TTS_BACKENDS.get(backend, DiaTTS)
 
-tts_pipeline = get_tts_backend()
+def get_tts_backend():
+    return get_tts_backend_class()()
+
+_tts_backend_name = None
+
+def tts_backend_name():
+    """TTS_BACKENDS key of the configured backend (used as a metrics label; resolved once per process)."""
+    global _tts_backend_name
+    if _tts_backend_name is None:
+        cls = get_tts_backend_class()
+        _tts_backend_name = next((name for name, backend in TTS_BACKENDS.items() if backend is cls), cls.__name__)
+    return _tts_backend_name
+
+# The model is loaded on first use or by warmup_model(), never at import time.
+# Celery workers load it once per worker process at startup (see load_worker_model).
+tts_pipeline = None
+_tts_pipeline_lock = threading.Lock()
+# Model load state reported by /ready
+MODEL_STATE = {'status': 'not_loaded', 'backend': None, 'load_seconds': None, 'error': None}
+
+def get_tts_pipeline():
+    """Return the process-wide TTS backend, loading the model on first use."""
+    global tts_pipeline
+    if tts_pipeline is None:
+        with _tts_pipeline_lock:
+            if tts_pipeline is None:
+                backend_class = get_tts_backend_class()
+                MODEL_STATE.update(status='loading', backend=backend_class.__name__, error=None)
+                start = time.monotonic()
+                try:
+                    backend = backend_class()
+                    workers = int(os.environ.get('TTS_POOL_WORKERS', 0))
+                    if workers > 0:
+                        backend = InferencePool(
+                            backend,
+                            workers=workers,
+                            pin_cores=os.environ.get('TTS_POOL_PIN_CORES') == '1',
+                            threads_per_worker=int(os.environ.get('TTS_POOL_THREADS', 0)) or None,
+                        ).start()
+                    tts_pipeline = backend
+                except Exception as e:
+                    MODEL_STATE.update(status='error', error=str(e))
+                    raise
+                MODEL_STATE.update(status='ready', load_seconds=round(time.monotonic() - start, 3))
+    return tts_pipeline
+
+def warmup_model(background=True):
+    """Load the TTS model ahead of the first request (in a background thread by default)."""
+    def load():
+        try:
+            get_tts_pipeline()
+        except Exception as e:
+            print(f"[TTS WARMUP ERROR] {e}")
+    if not background:
+        load()
+        return None
+    thread = threading.Thread(target=load, name='tts-warmup', daemon=True)
+    thread.start()
+    return thread
+
+# Number of chunks sent to the TTS backend per forward pass
+TTS_BATCH_SIZE = int(os.environ.get('TTS_BATCH_SIZE', 4))
+
+def unpack_audio(audio):
+    """Normalize a TTS backend result into (audio_array, sampling_rate)."""
+    audio_array = audio["audio"] if isinstance(audio, dict) and "audio" in audio else audio
+    sampling_rate = audio.get("sampling_rate", 22050) if isinstance(audio, dict) else 22050
+    return audio_array, sampling_rate
+
+def audio_frames(audio_array):
+    """Number of frames in (frames,), (frames, channels) or (1, frames) audio."""
+    shape = np.shape(audio_array)
+    return shape[1] if len(shape) == 2 and shape[0] == 1 else shape[0]
+
+def run_tts_batch(texts, tts_kwargs):
+    """
+    Synthesize texts with one batched call to the process-wide backend.
+    If the batched call fails, the texts are retried one at a time.
+    """
+    return run_backend_batch(get_tts_pipeline(), texts, tts_kwargs)
+
+def run_backend_batch(backend, texts, tts_kwargs):
+    results = None
+    if len(texts) > 1:
+        try:
+            results = backend.batch(texts, batch_size=len(texts), **tts_kwargs)
+        except Exception as e:
+            print(f"[TTS BATCH] batched call failed, falling back to single calls: {e}")
+        if results is not None and len(results) != len(texts):
+            results = None
+    if results is None:
+        results = [backend(text, **tts_kwargs) for text in texts]
+    return [unpack_audio(audio) for audio in results]
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching scheduler in front of the shared tts_pipeline.
+    Synthesis calls from concurrent requests are collected for up to max_wait_ms,
+    and calls with identical settings (voice, speed, pitch) run as one batch.
+    """
+    def __init__(self, max_wait_ms=10, max_batch_size=8):
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max(1, int(max_batch_size))
+        self._cond = threading.Condition()
+        self._queues = {}  # settings key -> deque of (enqueued_at, text, tts_kwargs, future)
+        self._pending = 0
+        self._thread = None
+        self._stats = {
+            'submitted': 0,
+            'batches': 0,
+            'max_queue_depth': 0,
+            'total_wait_ms': 0.0,
+            'batch_sizes': defaultdict(int),
+        }
+
+    @staticmethod
+    def _key(tts_kwargs):
+        return json.dumps(tts_kwargs, sort_keys=True, default=str)
+
+    def submit(self, text, **tts_kwargs):
+        """Queue one synthesis call. Returns a Future resolving to (audio_array, sampling_rate)."""
+        future = Future()
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='tts-microbatcher', daemon=True)
+                self._thread.start()
+            key = self._key(tts_kwargs)
+            self._queues.setdefault(key, deque()).append((time.monotonic(), text, tts_kwargs, future))
+            self._pending += 1
+            self._stats['submitted'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._pending)
+            self._cond.notify()
+        return future
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queues:
+                self._cond.wait()
+            # Serve the group whose oldest call has waited longest
+            key = min(self._queues, key=lambda k: self._queues[k][0][0])
+            queue = self._queues[key]
+            deadline = queue[0][0] + self.max_wait
+            while len(queue) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [queue.popleft() for _ in range(min(len(queue), self.max_batch_size))]
+            if not queue:
+                del self._queues[key]
+            self._pending -= len(batch)
+            now = time.monotonic()
+            self._stats['batches'] += 1
+            self._stats['batch_sizes'][len(batch)] += 1
+            self._stats['total_wait_ms'] += sum(now - item[0] for item in batch) * 1000
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            texts = [item[1] for item in batch]
+            try:
+                segments = run_tts_batch(texts, batch[0][2])
+            except Exception as e:
+                for item in batch:
+                    item[3].set_exception(e)
+                continue
+            for item, segment in zip(batch, segments):
+                item[3].set_result(segment)
+
+    def stats(self):
+        """Queue depth and batch-size statistics for tuning the batching window."""
+        with self._cond:
+            batches = self._stats['batches']
+            submitted = self._stats['submitted']
+            batched = submitted - self._pending
+            return {
+                'queue_depth': self._pending,
+                'max_queue_depth': self._stats['max_queue_depth'],
+                'submitted': submitted,
+                'batches': batches,
+                'avg_batch_size': round(batched / batches, 2) if batches else 0,
+                'avg_wait_ms': round(self._stats['total_wait_ms'] / batched, 2) if batched else 0,
+                'batch_size_histogram': {str(k): v for k, v in sorted(self._stats['batch_sizes'].items())},
+                'max_wait_ms': self.max_wait * 1000,
+                'max_batch_size': self.max_batch_size,
+            }
+
+# Cross-request micro-batching (off by default; TTS_SCHEDULER=1 enables it)
+tts_scheduler = None
+if os.environ.get('TTS_SCHEDULER') == '1':
+    tts_scheduler = MicroBatcher(
+        max_wait_ms=float(os.environ.get('TTS_SCHEDULER_WAIT_MS', 10)),
+        max_batch_size=int(os.environ.get('TTS_SCHEDULER_MAX_BATCH', 8)),
+    )
+
+def synthesize_chunks(chunks, tts_kwargs, batch_size=None):
+    """
+    Run text chunks through the TTS backend as padded batches of batch_size.
+    Returns a list of (audio_array, sampling_rate) in the original chunk order.
+    When the micro-batching scheduler is enabled, chunks are queued there instead
+    so they can share model batches with other requests.
+    """
+    start = time.perf_counter()
+    with stage_timer('inference'):
+        if tts_scheduler is not None:
+            futures = [tts_scheduler.submit(chunk, **tts_kwargs) for chunk in chunks]
+            segments = [future.result() for future in futures]
+        else:
+            batch_size = max(1, int(batch_size or TTS_BATCH_SIZE))
+            segments = []
+            for offset in range(0, len(chunks), batch_size):
+                segments.extend(run_tts_batch(chunks[offset:offset + batch_size], tts_kwargs))
+    audio_seconds = sum(audio_frames(audio) / sr for audio, sr in segments)
+    record_synthesis(sum(len(chunk) for chunk in chunks), audio_seconds, time.perf_counter() - start)
+    return segments
 
 # Login endpoint to get JWT
-def create_token(user, tenant):
+def create_token(user, tenant, version=None):
     payload = {'user': user, 'tenant': tenant, 'exp': datetime.utcnow() + timedelta(hours=12)}
+    if version:
+        payload['ver'] = version
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGO)
 
 @app.route('/login', methods=['POST'])
@@ -119,67 +902,414 @@ def login():
     data = request.get_json()
     username = data.get('username')
     password = data.get('password')
-    user = USERS.get(username)
+    user = get_user_store().get(username)
     if not user or user['password'] != password:
         return jsonify({'error': 'Invalid credentials'}), 401
-    token = create_token(username, user['tenant'])
+    token = create_token(username, user['tenant'], token_version(user))
     return jsonify({'token': token})
 
 # Celery configuration
 celery_app = Celery('diaspeak', broker='redis://localhost:6379/0', backend='redis://localhost:6379/0')
 
+# Texts with at least this many chunks are split into per-chunk Celery subtasks
+TTS_FANOUT_MIN_CHUNKS = int(os.environ.get('TTS_FANOUT_MIN_CHUNKS', 4))
+
+@worker_process_init.connect
+def load_worker_model(**kwargs):
+    """Load the TTS model once per Celery worker process, before it accepts tasks."""
+    get_tts_pipeline()
+
+def tts_job_options(params):
+    """Validate /speak-async params. Returns (voice, speed, pitch, format, quality)."""
+    format_ = (params.get('format') or 'wav').lower()
+    if format_ not in {'wav', 'mp3', 'ogg'}:
+        raise ValueError(f"Unsupported format '{format_}'. Supported: wav, mp3, ogg.")
+    quality = params.get('quality', 'medium')
+    if quality not in {'low', 'medium', 'high'}:
+        quality = 'medium'
+    return params.get('voice', 'default'), params.get('speed'), params.get('pitch'), format_, quality
+
+def tts_job_fields(params, user, tenant):
+    """Catalog metadata for an async job's params (see publish_output)."""
+    voice, speed, pitch, format_, quality = tts_job_options(params)
+    return {
+        'title': params.get('title'),
+        'tone': params.get('tone'),
+        'prompt': params.get('prompt'),
+        'voice': voice,
+        'speed': speed,
+        'pitch': pitch,
+        'format': format_,
+        'quality': quality,
+        'user': user,
+        'tenant': tenant,
+    }
+
+def finish_tts_job(output_file, now, duration_sec, cached, params, user, tenant):
+    """Publish a finished async job and build the task result (same shape as /speak)."""
+    fields = tts_job_fields(params, user, tenant)
+    result = publish_output(output_file, now, duration_sec, fields)
+    result.update({"status": "complete", "format": fields['format'], "quality": fields['quality'], "cached": cached})
+    return result
+
 @celery_app.task(bind=True)
-def tts_task(self, text, params):
+def tts_task(self, text, params, user=None, tenant=None):
     """
     Background TTS task for async processing.
+    Runs the same chunk -> synthesize -> concatenate -> encode -> catalog path as /speak
+    on the worker's resident model. Texts with TTS_FANOUT_MIN_CHUNKS or more chunks fan
+    out to one tts_chunk_task per chunk so several workers share a long document;
+    tts_assemble_task then joins the parts in order and replaces this task's result.
     """
-    # Simulate long processing for demonstration
-    time.sleep(1)
-    # Here you would call the TTS logic (refactor main logic into a helper for reuse)
-    # For now, just return a dummy result
-    return {"status": "complete", "message": "TTS job finished", "params": params}
+    voice, speed, pitch, format_, quality = tts_job_options(params)
+    tts_kwargs = build_tts_kwargs(voice, speed, pitch)
+    chunks = chunk_text_for_tts(text)
+    if len(chunks) >= TTS_FANOUT_MIN_CHUNKS and not self.request.is_eager:
+        cache = get_synthesis_cache()
+        if cache is not None:
+            output_file, now = allocate_output_file(text, format_, params.get('title'))
+            key = cache.make_key(text, dict(tts_kwargs, format=format_, quality=quality))
+            duration_sec = cache.fetch(key, output_file)
+            if duration_sec is not None:
+                return finish_tts_job(output_file, now, duration_sec, True, params, user, tenant)
+            release_output_file(output_file)
+        # Parts are exchanged through the outputs volume, not the result backend
+        parts_dir = os.path.join(get_output_dir(), '.parts', self.request.id)
+        from celery import chord, group
+        header = group(
+            tts_chunk_task.s(chunk, tts_kwargs, os.path.join(parts_dir, f'{i:05d}.npy'))
+            for i, chunk in enumerate(chunks)
+        )
+        return self.replace(chord(header, tts_assemble_task.s(text, params, user, tenant, parts_dir)))
+    output_file, now = allocate_output_file(text, format_, params.get('title'))
+    duration_sec, cached = render_audio_file(text, tts_kwargs, output_file, format_, quality)
+    return finish_tts_job(output_file, now, duration_sec, cached, params, user, tenant)
+
+@celery_app.task
+def tts_chunk_task(chunk, tts_kwargs, part_path):
+    """Synthesize one chunk of a fanned-out job and store its samples at part_path."""
+    audio_array, sampling_rate = synthesize_chunks([chunk], tts_kwargs)[0]
+    os.makedirs(os.path.dirname(part_path), exist_ok=True)
+    np.save(part_path, np.asarray(audio_array))
+    return {'path': part_path, 'sampling_rate': sampling_rate}
+
+@celery_app.task
+def tts_assemble_task(parts, text, params, user, tenant, parts_dir):
+    """Join the chunk parts of a fanned-out job (in chunk order), encode and catalog the result."""
+    voice, speed, pitch, format_, quality = tts_job_options(params)
+    segments = [(np.load(part['path']), part['sampling_rate']) for part in parts]
+    audio_array, sampling_rate = join_chunk_audio(segments)
+    output_file, now = allocate_output_file(text, format_, params.get('title'))
+    try:
+        save_audio_with_format(audio_array, sampling_rate, output_file, format_, quality)
+    except Exception:
+        release_output_file(output_file)
+        raise
+    duration_sec = len(audio_array) / sampling_rate
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    cache = get_synthesis_cache()
+    if cache is not None:
+        key = cache.make_key(text, dict(build_tts_kwargs(voice, speed, pitch), format=format_, quality=quality))
+        cache.put(key, output_file, duration_sec)
+    return finish_tts_job(output_file, now, duration_sec, False, params, user, tenant)
+
+# Target bitrate (kbit/s) per quality setting for mp3/ogg
+QUALITY_BITRATES = {'low': 64, 'medium': 128, 'high': 192}
+# libsndfile encodes Vorbis as quality-based VBR; these levels average close to
+# the bitrates above for 44.1 kHz speech
+VORBIS_COMPRESSION_LEVELS = {'low': 0.85, 'medium': 0.2, 'high': 0.1}
+SOUNDFILE_CODECS = {'mp3': ('MP3', 'MPEG_LAYER_III'), 'ogg': ('OGG', 'VORBIS')}
+FFMPEG_CODECS = {'mp3': 'libmp3lame', 'ogg': 'libvorbis'}
+
+# (lowest sampling rate, max kbps, min kbps) of the MPEG-1, MPEG-2 and MPEG-2.5 Layer III bitrate ranges
+MP3_BITRATE_RANGES = ((32000, 320, 32), (16000, 160, 8), (0, 64, 8))
+
+def mp3_compression_level(kbps, sampling_rate):
+    """
+    libsndfile maps compression_level linearly onto the constant-bitrate range of
+    the MPEG version used at sampling_rate. Bitrates outside that range are clamped
+    to it, so at 16-24 kHz 'high' is encoded at 160 kbps, and below 16 kHz
+    'medium' and 'high' are both encoded at 64 kbps.
+    """
+    max_kbps, min_kbps = next((hi, lo) for rate, hi, lo in MP3_BITRATE_RANGES if sampling_rate >= rate)
+    kbps = min(max(kbps, min_kbps), max_kbps)
+    return (max_kbps - kbps) / (max_kbps - min_kbps)
+
+def probe_native_codecs():
+    """The formats of SOUNDFILE_CODECS this libsndfile can encode, warning about the rest."""
+    available = sf.available_formats()
+    native = {fmt for fmt, (major, _) in SOUNDFILE_CODECS.items() if major in available}
+    missing = sorted(set(SOUNDFILE_CODECS) - native)
+    if missing:
+        print(f"[AUDIO WARNING] libsndfile {sf.__libsndfile_version__} cannot encode {', '.join(missing)}; "
+              f"each such file will be encoded by starting ffmpeg (MP3 needs libsndfile 1.1 or newer)")
+    return native
+
+# Probed once at startup
+NATIVE_CODECS = probe_native_codecs()
+
+def soundfile_codec_args(fmt, sampling_rate, quality):
+    """soundfile arguments to encode fmt natively, or None if this libsndfile lacks the codec."""
+    if fmt not in NATIVE_CODECS:
+        return None
+    major, subtype = SOUNDFILE_CODECS[fmt]
+    if quality not in QUALITY_BITRATES:
+        quality = 'medium'
+    if fmt == 'mp3':
+        level = mp3_compression_level(QUALITY_BITRATES[quality], sampling_rate)
+        return {'format': major, 'subtype': subtype, 'bitrate_mode': 'CONSTANT', 'compression_level': level}
+    return {'format': major, 'subtype': subtype, 'compression_level': VORBIS_COMPRESSION_LEVELS[quality]}
+
+def ffmpeg_encode(audio_array, sampling_rate, output_file, fmt, quality):
+    """Encode by piping float PCM into ffmpeg's stdin (no intermediate file)."""
+    channels = 1 if audio_array.ndim == 1 else audio_array.shape[1]
+    bitrate = f"{QUALITY_BITRATES.get(quality, 128)}k"
+    cmd = [
+        'ffmpeg', '-loglevel', 'error', '-y',
+        '-f', 'f32le', '-ar', str(sampling_rate), '-ac', str(channels), '-i', 'pipe:0',
+        '-c:a', FFMPEG_CODECS[fmt], '-b:a', bitrate, '-f', fmt, output_file,
+    ]
+    pcm = np.ascontiguousarray(audio_array, dtype='<f4')
+    subprocess.run(cmd, input=memoryview(pcm).cast('B'), check=True, capture_output=True)
 
 def save_audio_with_format(audio_array, sampling_rate, output_file, fmt, quality=None):
     """
-    Save audio in the requested format using soundfile (wav) or pydub (mp3, ogg).
+    Save audio in the requested format, encoding straight from the in-memory array.
+    wav is written by soundfile; mp3 and ogg are encoded by libsndfile when it has the
+    codec, otherwise PCM is piped into ffmpeg. No temporary files are written.
     """
     if fmt == 'wav':
-        sf.write(output_file, audio_array, sampling_rate)
+        codec_args = {'format': 'WAV'}
     else:
-        # Save as wav to temp, then convert
-        tmp_wav = output_file + '.tmp.wav'
-        sf.write(tmp_wav, audio_array, sampling_rate)
-        audio = AudioSegment.from_wav(tmp_wav)
-        params = {}
-        if quality == 'low':
-            params['bitrate'] = '64k'
-        elif quality == 'medium':
-            params['bitrate'] = '128k'
-        elif quality == 'high':
-            params['bitrate'] = '192k'
-        else:
-            params['bitrate'] = '128k'
-        audio.export(output_file, format=fmt, **params)
-        os.remove(tmp_wav)
-
-def log_metadata(metadata):
+        audio_array = as_float32_audio(audio_array)
+        codec_args = soundfile_codec_args(fmt, sampling_rate, quality)
+    if codec_args is None:
+        with stage_timer('encode'):
+            ffmpeg_encode(audio_array, sampling_rate, output_file, fmt, quality)
+        return
+    # soundfile encodes and writes in one pass, so the encode stage covers the disk write
+    with stage_timer('encode'):
+        sf.write(output_file, audio_array, sampling_rate, **codec_args)
+
+CATALOG_FIELDS = ['title', 'date', 'length', 'tone', 'prompt', 'voice', 'speed', 'pitch', 'format', 'quality', 'file_path', 'user', 'tenant', 's3_url']
+
+class CatalogStore:
+    """
+    SQLite catalog of generated audio files (replaces outputs/catalog.csv).
+    Rows get stable integer ids. user, tenant, date and format are indexed, and
+    titles are searchable through an FTS5 trigram index, which keeps the old
+    case-insensitive substring semantics. Values are stored as text, exactly as
+    the CSV catalog held them, so the /catalog JSON and CSV exports are unchanged.
     """
-    Append metadata to a CSV catalog file.
+    FILTERS = ('user', 'tenant', 'date', 'format')
+
+    def __init__(self, db_path, legacy_csv_path=None):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._conn()
+        columns = ', '.join(f'"{field}" TEXT' for field in CATALOG_FIELDS)
+        conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS catalog (id INTEGER PRIMARY KEY AUTOINCREMENT, {columns});
+            CREATE INDEX IF NOT EXISTS catalog_user ON catalog (user, id);
+            CREATE INDEX IF NOT EXISTS catalog_tenant ON catalog (tenant, id);
+            CREATE INDEX IF NOT EXISTS catalog_date ON catalog (date, id);
+            CREATE INDEX IF NOT EXISTS catalog_format ON catalog (format, id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS catalog_title USING fts5(
+                title, content='catalog', content_rowid='id', tokenize='trigram');
+            CREATE TRIGGER IF NOT EXISTS catalog_ai AFTER INSERT ON catalog BEGIN
+                INSERT INTO catalog_title (rowid, title) VALUES (new.id, new.title);
+            END;
+            CREATE TRIGGER IF NOT EXISTS catalog_ad AFTER DELETE ON catalog BEGIN
+                INSERT INTO catalog_title (catalog_title, rowid, title) VALUES ('delete', old.id, old.title);
+            END;
+            CREATE TRIGGER IF NOT EXISTS catalog_au AFTER UPDATE OF title ON catalog BEGIN
+                INSERT INTO catalog_title (catalog_title, rowid, title) VALUES ('delete', old.id, old.title);
+                INSERT INTO catalog_title (rowid, title) VALUES (new.id, new.title);
+            END;
+        """)
+        if legacy_csv_path and os.path.isfile(legacy_csv_path):
+            self._migrate_csv(legacy_csv_path)
+
+    def _conn(self):
+        # One connection per thread (and per process after a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = open_sqlite(self.db_path)
+            self._local.pid = os.getpid()
+        return conn
+
+    def _migrate_csv(self, csv_path):
+        """One-time import of the legacy catalog.csv; the CSV is kept as catalog.csv.migrated."""
+        with open(csv_path, 'r', newline='') as csvfile:
+            rows = list(csv.DictReader(csvfile))
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have migrated while we waited for the lock
+            if os.path.isfile(csv_path):
+                self._insert_rows(conn, rows)
+                os.replace(csv_path, csv_path + '.migrated')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def _values(row):
+        return ['' if row.get(field) is None else str(row.get(field)) for field in CATALOG_FIELDS]
+
+    def _insert_rows(self, conn, rows):
+        columns = ', '.join(f'"{field}"' for field in CATALOG_FIELDS)
+        placeholders = ', '.join('?' for _ in CATALOG_FIELDS)
+        ids = []
+        for row in rows:
+            cur = conn.execute(f'INSERT INTO catalog ({columns}) VALUES ({placeholders})', self._values(row))
+            ids.append(cur.lastrowid)
+        return ids
+
+    def insert(self, metadata):
+        """Add one catalog row. Returns its id."""
+        return self.insert_many([metadata])[0]
+
+    def insert_many(self, rows):
+        """Add rows in a single transaction. Returns their ids in order."""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            ids = self._insert_rows(conn, rows)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return ids
+
+    @staticmethod
+    def _to_dict(row):
+        item = {'id': row['id']}
+        item.update({field: row[field] for field in CATALOG_FIELDS})
+        return item
+
+    def _where(self, filters, title):
+        clauses, params = [], []
+        for field in self.FILTERS:
+            if filters.get(field):
+                clauses.append(f'"{field}" = ?')
+                params.append(filters[field])
+        if title:
+            if len(title) >= 3:
+                clauses.append('id IN (SELECT rowid FROM catalog_title WHERE catalog_title MATCH ?)')
+                params.append('"' + title.replace('"', '""') + '"')
+            else:
+                # Trigram search needs 3+ characters; short terms fall back to a scan
+                clauses.append("title LIKE ? ESCAPE '\\'")
+                params.append('%' + title.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def query(self, filters=None, title=None, limit=None, offset=0, after_id=None):
+        """
+        Filtered rows in id order plus the total match count.
+        Pass after_id for keyset pagination (rows with a larger id), or offset for page numbers.
+        """
+        where, params = self._where(filters or {}, title)
+        conn = self._conn()
+        total = conn.execute(f'SELECT COUNT(*) FROM catalog{where}', params).fetchone()[0]
+        sql = f'SELECT * FROM catalog{where}'
+        page_params = list(params)
+        if after_id is not None:
+            sql += (' AND' if where else ' WHERE') + ' id > ?'
+            page_params.append(after_id)
+        sql += ' ORDER BY id'
+        if limit is not None:
+            sql += ' LIMIT ? OFFSET ?'
+            page_params += [limit, 0 if after_id is not None else offset]
+        return [self._to_dict(row) for row in conn.execute(sql, page_params)], total
+
+    def iter_rows(self, filters=None, title=None):
+        """Stream filtered rows in id order without loading them all."""
+        where, params = self._where(filters or {}, title)
+        for row in self._conn().execute(f'SELECT * FROM catalog{where} ORDER BY id', params):
+            yield self._to_dict(row)
+
+    def get_many(self, ids):
+        """Rows for the given ids, in the order requested (unknown ids are skipped)."""
+        ids = [int(i) for i in ids]
+        if not ids:
+            return []
+        found = {}
+        conn = self._conn()
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            sql = f'SELECT * FROM catalog WHERE id IN ({", ".join("?" for _ in batch)})'
+            found.update((row['id'], self._to_dict(row)) for row in conn.execute(sql, batch))
+        return [found[i] for i in ids if i in found]
+
+    def get(self, item_id):
+        rows = self.get_many([item_id])
+        return rows[0] if rows else None
+
+    def update_many(self, ids, fields):
+        """Set fields on the given rows. Returns the number of rows changed."""
+        fields = {k: v for k, v in fields.items() if k in CATALOG_FIELDS}
+        ids = [int(i) for i in ids]
+        if not fields or not ids:
+            return 0
+        assignments = ', '.join(f'"{k}" = ?' for k in fields)
+        values = ['' if v is None else str(v) for v in fields.values()]
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            changed = 0
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                cur = conn.execute(
+                    f'UPDATE catalog SET {assignments} WHERE id IN ({", ".join("?" for _ in batch)})',
+                    values + batch
+                )
+                changed += cur.rowcount
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return changed
+
+    def update(self, item_id, fields):
+        return self.update_many([item_id], fields) > 0
+
+    def delete(self, item_id):
+        """Remove a row. Returns the deleted row, or None if it did not exist."""
+        row = self.get(item_id)
+        if row is not None:
+            self._conn().execute('DELETE FROM catalog WHERE id = ?', (int(item_id),))
+        return row
+
+_catalog_store = None
+_catalog_store_lock = threading.Lock()
+
+def get_catalog_store():
+    """
+    The process-wide catalog store.
     In test mode, use a temp file for the catalog.
     """
-    if is_test_mode():
-        import tempfile
-        catalog_path = os.path.join(tempfile.gettempdir(), 'catalog.csv')
-    else:
-        catalog_path = os.path.join('outputs', 'catalog.csv')
-    os.makedirs(os.path.dirname(catalog_path), exist_ok=True)
-    file_exists = os.path.isfile(catalog_path)
-    with open(catalog_path, 'a', newline='') as csvfile:
-        fieldnames = ['title', 'date', 'length', 'tone', 'prompt', 'voice', 'speed', 'pitch', 'format', 'quality', 'file_path', 'user', 'tenant', 's3_url']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow(metadata)
+    global _catalog_store
+    with _catalog_store_lock:
+        if _catalog_store is None:
+            if is_test_mode():
+                import tempfile
+                base = tempfile.gettempdir()
+            else:
+                base = 'outputs'
+            _catalog_store = CatalogStore(os.path.join(base, 'catalog.db'), legacy_csv_path=os.path.join(base, 'catalog.csv'))
+        return _catalog_store
+
+def log_metadata(metadata):
+    """Add a generated file to the catalog. Returns the new catalog item id."""
+    with stage_timer('catalog'):
+        return get_catalog_store().insert(metadata)
+
+def log_metadata_many(rows):
+    """Add several generated files to the catalog in one transaction. Returns their ids."""
+    with stage_timer('catalog'):
+        return get_catalog_store().insert_many(rows)
 
 def sanitize_filename(s):
     """Sanitize and normalize a string for safe filenames."""
@@ -187,31 +1317,173 @@ def sanitize_filename(s):
     s = ''.join(c for c in s if c.isalnum() or c in ('-', '_'))
     return s[:64]  # limit length
 
-def split_text_into_chunks(text: str, max_chars: int = 2000, overlap: int = 100) -> List[str]:
+# Dia speaker tags; a chunk that starts mid-dialogue is prefixed with the one in effect
+SPEAKER_TAG_RE = re.compile(r'\[S[12]\]')
+# Sentence ends, and the space before a speaker tag
+SENTENCE_BREAK_RE = re.compile(r'(?<=[.!?]) +| *(?=\[S[12]\])')
+CLAUSE_BREAK_RE = re.compile(r'(?<=[,;:]) +')
+
+def utf8_token_count(text):
+    return len(text.encode('utf-8'))
+
+def split_long_piece(piece, max_tokens, count_tokens):
+    """Split a sentence longer than max_tokens at clause breaks, then spaces, then anywhere."""
+    for pattern in (CLAUSE_BREAK_RE, re.compile(' +')):
+        parts = [part for part in pattern.split(piece) if part]
+        if len(parts) > 1:
+            return pack_pieces(parts, max_tokens, count_tokens)
+    # One unbroken run of text: cut it by characters, binary-searching the longest
+    # slice that fits (a token covers at least one character, so the cut is at most
+    # max_tokens characters on)
+    out, start = [], 0
+    while start < len(piece):
+        lo, hi = start + 1, min(len(piece), start + max_tokens)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if count_tokens(piece[start:mid]) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid - 1
+        out.append(piece[start:lo])
+        start = lo
+    return out
+
+def pack_pieces(pieces, max_tokens, count_tokens):
+    """Join pieces with spaces into as few strings of at most max_tokens as possible, in order."""
+    out, current, current_tokens = [], [], 0
+    for piece in pieces:
+        tokens = count_tokens(piece)
+        if tokens > max_tokens:
+            if current:
+                out.append(' '.join(current))
+                current, current_tokens = [], 0
+            out.extend(split_long_piece(piece, max_tokens, count_tokens))
+            continue
+        if current and current_tokens + 1 + tokens > max_tokens:
+            out.append(' '.join(current))
+            current, current_tokens = [], 0
+        current_tokens += tokens + (1 if current else 0)
+        current.append(piece)
+    if current:
+        out.append(' '.join(current))
+    return out
+
+def iter_sentences(pieces, max_pending=65536):
     """
-    Split text into chunks of up to max_chars, preferably at sentence boundaries.
-    Overlap is the number of characters to repeat at the end of each chunk for continuity.
+    Sentences (split at sentence ends and before speaker tags, whitespace collapsed)
+    from text that arrives in pieces. Each sentence is yielded as soon as the text
+    after it shows that it is complete; only the unfinished tail is held, and a tail
+    longer than max_pending characters without a break is cut at a space.
     """
-    # Normalize whitespace
-    text = re.sub(r'\s+', ' ', text.strip())
-    sentences = re.split(r'(?<=[.!?]) +', text)
-    chunks = []
-    current = ''
-    for sentence in sentences:
-        if len(current) + len(sentence) + 1 <= max_chars:
-            current += (' ' if current else '') + sentence
-        else:
-            if current:
-                chunks.append(current.strip())
-            current = sentence
+    pending = ''
+    for piece in pieces:
+        raw = pending + piece
+        parts = SENTENCE_BREAK_RE.split(' '.join(raw.split()))
+        yield from (part for part in parts[:-1] if part)
+        pending = parts[-1] + (' ' if raw[-1:].isspace() else '')
+        while len(pending) > max_pending:
+            cut = pending.rfind(' ', 0, max_pending)
+            if cut <= 0:
+                cut = max_pending
+            yield pending[:cut]
+            pending = pending[cut:].lstrip()
+    if pending.strip():
+        yield pending.strip()
+
+def iter_text_chunks(pieces, max_tokens=1024, count_tokens=None):
+    """
+    Chunks of at most max_tokens model tokens from text that arrives in pieces,
+    yielded as soon as each is full (see split_text_into_chunks). Runs in linear
+    time and holds only the current chunk and the unfinished sentence.
+    """
+    count_tokens = count_tokens or utf8_token_count
+    # Room for the carried-over speaker tag and its space
+    budget = max(1, max_tokens - count_tokens('[S1] '))
+    current, current_tokens = [], 0
+    speaker = None  # speaker tag in effect at the end of current
+    for sentence in iter_sentences(pieces):
+        tokens = count_tokens(sentence)
+        for part in (split_long_piece(sentence, budget, count_tokens) if tokens > budget else [sentence]):
+            tokens = count_tokens(part)
+            if current and current_tokens + 1 + tokens > max_tokens:
+                yield ' '.join(current)
+                current, current_tokens = [], 0
+            tag = SPEAKER_TAG_RE.match(part)
+            if not current and speaker and not tag:
+                current.append(speaker)
+                current_tokens = count_tokens(speaker)
+            if tag:
+                speaker = tag.group()
+            current_tokens += tokens + (1 if current else 0)
+            current.append(part)
     if current:
-        chunks.append(current.strip())
-    # Add overlap
-    if overlap > 0 and len(chunks) > 1:
-        for i in range(1, len(chunks)):
-            prev = chunks[i-1]
-            chunks[i] = prev[-overlap:] + ' ' + chunks[i]
-    return chunks
+        yield ' '.join(current)
+
+def split_text_into_chunks(text: str, max_tokens: int = 1024, count_tokens=None) -> List[str]:
+    """
+    Split text into chunks of at most max_tokens model tokens at sentence and
+    speaker-tag ([S1]/[S2]) boundaries; overlong sentences are split at clause
+    breaks, then between words. No text is repeated across chunks. A chunk that
+    does not start with a speaker tag is prefixed with the tag in effect, so the
+    model keeps conditioning on the same speaker across the join.
+    count_tokens measures a string in model tokens (default: UTF-8 bytes).
+    """
+    return list(iter_text_chunks([text], max_tokens, count_tokens))
+
+# Block size for reading uploaded documents
+UPLOAD_READ_BYTES = 64 * 1024
+
+def iter_decoded_text(stream, encoding='utf-8', block_size=UPLOAD_READ_BYTES):
+    """Read a binary stream in blocks and decode it incrementally (undecodable bytes are dropped)."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='ignore')
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        text = decoder.decode(block)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+def split_title_line(pieces, max_line=UPLOAD_READ_BYTES):
+    """
+    Take an optional "Title:" first line off streamed .txt/.md text.
+    Returns (title or None, pieces of the remaining text).
+    """
+    pieces = iter(pieces)
+    head, exhausted = '', True
+    for piece in pieces:
+        head += piece
+        if '\n' in head or len(head) > max_line:
+            exhausted = False
+            break
+    first, sep, rest = head.partition('\n')
+    if (sep or exhausted) and first.lower().startswith('title:'):
+        return ' '.join(first[6:].split()) or None, itertools.chain([rest], pieces)
+    return None, itertools.chain([head], pieces)
+
+def upload_text_pieces(stream, title=None):
+    """
+    (title, pieces of the text to synthesize) of a streamed .txt/.md upload.
+    An explicit title wins; otherwise a "Title:" first line is taken off the text.
+    """
+    pieces = iter_decoded_text(stream)
+    if title:
+        return ' '.join(title.split()), pieces
+    return split_title_line(pieces)
+
+def skip_blank_pieces(pieces):
+    """
+    Drop leading whitespace-only pieces of streamed text.
+    Returns (the first piece with text, or None if there is none, pieces from that one on).
+    """
+    pieces = iter(pieces)
+    for piece in pieces:
+        if piece.strip():
+            return piece, itertools.chain([piece], pieces)
+    return None, iter(())
 
 # Utility: get output dir (test mode uses temp dir)
 def get_output_dir():
@@ -224,20 +1496,711 @@ def get_output_dir():
         now = datetime.now()
         return os.path.join("outputs", f"{now.year}", f"{now.month:02}", f"{now.day:02}")
 
+# Utility: S3 client (boto3 is only imported when S3 is actually used).
+# One client per process, reused by every request and upload thread (clients are thread-safe).
+_s3_client = None
+_s3_client_pid = None
+_s3_client_lock = threading.Lock()
+
+def get_s3_client():
+    global _s3_client, _s3_client_pid
+    with _s3_client_lock:
+        if _s3_client is None or _s3_client_pid != os.getpid():
+            import boto3
+            from botocore.config import Config
+            _s3_client = boto3.client('s3', config=Config(
+                max_pool_connections=int(os.environ.get('S3_MAX_POOL_CONNECTIONS', 32)),
+                retries={'max_attempts': 3, 'mode': 'standard'},
+            ))
+            _s3_client_pid = os.getpid()
+        return _s3_client
+
+def s3_transfer_config():
+    """Multipart settings: parts of S3_MULTIPART_MB, S3_UPLOAD_CONCURRENCY parts in flight per file."""
+    from boto3.s3.transfer import TransferConfig
+    part_size = int(float(os.environ.get('S3_MULTIPART_MB', 8)) * 1024 * 1024)
+    return TransferConfig(
+        multipart_threshold=part_size,
+        multipart_chunksize=part_size,
+        max_concurrency=int(os.environ.get('S3_UPLOAD_CONCURRENCY', 8)),
+        use_threads=True,
+    )
+
 # Utility: upload file to S3
 def upload_to_s3(local_path, s3_bucket, s3_key):
+    from boto3.exceptions import S3UploadFailedError
+    from botocore.exceptions import BotoCoreError, ClientError
     try:
-        s3 = boto3.client('s3')
-        s3.upload_file(local_path, s3_bucket, s3_key)
+        s3 = get_s3_client()
+        with stage_timer('s3_upload'):
+            s3.upload_file(local_path, s3_bucket, s3_key, Config=s3_transfer_config())
         return f's3://{s3_bucket}/{s3_key}'
-    except (BotoCoreError, NoCredentialsError) as e:
+    except (BotoCoreError, ClientError, S3UploadFailedError) as e:
         print(f"[S3 UPLOAD ERROR] {e}")
         return None
 
+class S3Uploader:
+    """
+    Background S3 uploads, so requests do not wait for them.
+    A bounded queue (max_queue) feeds worker threads that share the process-wide client.
+    Failed uploads are retried with exponential backoff and jitter. When an upload
+    succeeds, the catalog row's s3_url is filled in. submit() blocks while the queue
+    is full, which pushes back on producers instead of growing memory.
+    """
+    def __init__(self, workers=2, max_queue=100, attempts=5, backoff=0.5, max_backoff=30.0):
+        import queue
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._queue = queue.Queue(maxsize=max_queue)
+        for i in range(workers):
+            threading.Thread(target=self._run, name=f's3-upload-{i}', daemon=True).start()
+
+    def submit(self, local_path, s3_bucket, s3_key, catalog_id=None):
+        self._queue.put((local_path, s3_bucket, s3_key, catalog_id))
+
+    def join(self):
+        """Wait until every queued upload has finished (or given up)."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                self._upload(*item)
+            except Exception as e:
+                print(f"[S3 UPLOAD ERROR] {e}")
+            finally:
+                self._queue.task_done()
+
+    def _upload(self, local_path, s3_bucket, s3_key, catalog_id):
+        import random
+        from boto3.exceptions import S3UploadFailedError
+        from botocore.exceptions import BotoCoreError, ClientError, NoCredentialsError
+        for attempt in range(1, self.attempts + 1):
+            try:
+                with stage_timer('s3_upload'):
+                    get_s3_client().upload_file(local_path, s3_bucket, s3_key, Config=s3_transfer_config())
+                break
+            except NoCredentialsError as e:
+                print(f"[S3 UPLOAD ERROR] {e}")
+                return
+            except (BotoCoreError, ClientError, S3UploadFailedError) as e:
+                if attempt == self.attempts:
+                    print(f"[S3 UPLOAD ERROR] giving up on {s3_key} after {attempt} attempts: {e}")
+                    return
+                delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+                time.sleep(delay * random.uniform(0.5, 1.0))
+        if catalog_id is not None:
+            get_catalog_store().update(catalog_id, {'s3_url': f's3://{s3_bucket}/{s3_key}'})
+
+_s3_uploader = None
+_s3_uploader_pid = None
+_s3_uploader_lock = threading.Lock()
+
+def get_s3_uploader():
+    """The process-wide background uploader (threads do not survive a fork, so one per pid)."""
+    global _s3_uploader, _s3_uploader_pid
+    with _s3_uploader_lock:
+        if _s3_uploader is None or _s3_uploader_pid != os.getpid():
+            _s3_uploader = S3Uploader(
+                workers=int(os.environ.get('S3_UPLOAD_WORKERS', 2)),
+                max_queue=int(os.environ.get('S3_UPLOAD_QUEUE', 100)),
+                attempts=int(os.environ.get('S3_UPLOAD_ATTEMPTS', 5)),
+            )
+            _s3_uploader_pid = os.getpid()
+        return _s3_uploader
+
+class SynthesisError(Exception):
+    """Raised when the TTS backend fails to produce audio for a request."""
+
+# Chunk size limit in model tokens (default: the backend's text input limit)
+TTS_CHUNK_TOKENS = int(os.environ.get('TTS_CHUNK_TOKENS', 0))
+
+def tts_chunk_limits():
+    """(max_tokens, count_tokens) for chunking text for the active TTS backend."""
+    backend = get_tts_pipeline()
+    max_tokens = TTS_CHUNK_TOKENS or getattr(backend, 'max_text_tokens', BaseTTS.max_text_tokens)
+    return max_tokens, getattr(backend, 'count_tokens', utf8_token_count)
+
+def chunk_text_for_tts(text):
+    """Split request text into the chunks sent to the TTS backend, sized by its tokenizer."""
+    max_tokens, count_tokens = tts_chunk_limits()
+    with stage_timer('chunk'):
+        if len(text) <= max_tokens and count_tokens(text) <= max_tokens:
+            return [text]
+        return split_text_into_chunks(text, max_tokens=max_tokens, count_tokens=count_tokens)
+
+def iter_chunks_for_tts(pieces):
+    """chunk_text_for_tts for text arriving in pieces: chunks are yielded as soon as they are complete."""
+    max_tokens, count_tokens = tts_chunk_limits()
+    chunks = iter_text_chunks(pieces, max_tokens, count_tokens)
+    while True:
+        with stage_timer('chunk'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+# Crossfade applied at chunk boundaries when joining synthesized audio
+TTS_CROSSFADE_MS = float(os.environ.get('TTS_CROSSFADE_MS', 10))
+# Longest silence kept at a chunk join (trailing plus leading), and the level below which audio counts as silence
+TTS_JOIN_SILENCE_MS = float(os.environ.get('TTS_JOIN_SILENCE_MS', 300))
+SILENCE_THRESHOLD = 10 ** (-50 / 20)
+
+def as_float32_audio(audio_array):
+    """
+    Return samples as float32 in [-1, 1], shaped (frames,) or (frames, channels).
+    Integer PCM is scaled by its full-scale value; a leading batch axis of 1 is dropped.
+    """
+    audio_array = np.asarray(audio_array)
+    if audio_array.ndim == 2 and audio_array.shape[0] == 1:
+        audio_array = audio_array[0]
+    if np.issubdtype(audio_array.dtype, np.integer):
+        return audio_array.astype(np.float32) / np.float32(np.iinfo(audio_array.dtype).max + 1)
+    return audio_array.astype(np.float32, copy=False)
+
+def resample_audio(audio_array, from_rate, to_rate):
+    """Resample audio (frames first) to to_rate with vectorized linear interpolation."""
+    if from_rate == to_rate or len(audio_array) == 0:
+        return audio_array
+    n_out = int(round(len(audio_array) * to_rate / from_rate))
+    positions = np.arange(n_out) * (from_rate / to_rate)
+    frames = np.arange(len(audio_array))
+    if audio_array.ndim == 1:
+        return np.interp(positions, frames, audio_array).astype(np.float32)
+    return np.stack([np.interp(positions, frames, audio_array[:, c]) for c in range(audio_array.shape[1])], axis=1).astype(np.float32)
+
+def assemble_audio(audio_segments, crossfade_ms=None):
+    """
+    Join (audio_array, sampling_rate) segments into one float32 array.
+    The output buffer is allocated once and each segment is copied into it once.
+    Segments at a different rate are resampled to the rate of the first segment,
+    and neighbouring segments overlap by crossfade_ms with a linear fade.
+    Returns (audio_array, sampling_rate).
+    """
+    if crossfade_ms is None:
+        crossfade_ms = TTS_CROSSFADE_MS
+    with stage_timer('assemble'):
+        sampling_rate = audio_segments[0][1]
+        arrays = [resample_audio(as_float32_audio(arr), sr, sampling_rate) for arr, sr in audio_segments]
+        if len(arrays) == 1:
+            return arrays[0], sampling_rate
+        fade = int(sampling_rate * crossfade_ms / 1000)
+        out = np.empty((sum(len(arr) for arr in arrays),) + arrays[0].shape[1:], dtype=np.float32)
+        pos = 0
+        for arr in arrays:
+            overlap = min(fade, pos, len(arr))
+            if overlap:
+                ramp = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+                if arr.ndim == 2:
+                    ramp = ramp[:, None]
+                head = out[pos - overlap:pos]
+                head *= 1.0 - ramp
+                head += arr[:overlap] * ramp
+            out[pos:pos + len(arr) - overlap] = arr[overlap:]
+            pos += len(arr) - overlap
+        return out[:pos], sampling_rate
+
+def clamp_edge_silence(audio_array, sampling_rate, max_ms, leading=True, trailing=True):
+    """Shorten leading and/or trailing silence of float audio to at most max_ms each."""
+    keep = int(sampling_rate * max_ms / 1000)
+    level = np.abs(audio_array) if audio_array.ndim == 1 else np.abs(audio_array).max(axis=1)
+    loud = np.flatnonzero(level > SILENCE_THRESHOLD)
+    if len(loud) == 0:
+        return audio_array[:keep]
+    start = max(0, loud[0] - keep) if leading else 0
+    end = min(len(audio_array), loud[-1] + 1 + keep) if trailing else len(audio_array)
+    return audio_array[start:end]
+
+def join_chunk_audio(audio_segments, crossfade_ms=None):
+    """
+    assemble_audio for the consecutive chunks of one text: the silence on each
+    side of a join is clamped to half of TTS_JOIN_SILENCE_MS, so pauses between
+    chunks are as long as ordinary sentence pauses, and the joins are crossfaded.
+    Returns (audio_array, sampling_rate).
+    """
+    last = len(audio_segments) - 1
+    if last > 0:
+        audio_segments = [
+            (clamp_edge_silence(as_float32_audio(arr), sr, TTS_JOIN_SILENCE_MS / 2, leading=i > 0, trailing=i < last), sr)
+            for i, (arr, sr) in enumerate(audio_segments)
+        ]
+    return assemble_audio(audio_segments, crossfade_ms)
+
+def synthesize_text(text, tts_kwargs):
+    """
+    Chunk text, synthesize every chunk and combine the results.
+    Returns (audio_array, sampling_rate). Backend failures raise SynthesisError.
+    """
+    try:
+        # Pass advanced settings if supported by the model
+        audio_segments = synthesize_chunks(chunk_text_for_tts(text), tts_kwargs)
+        return join_chunk_audio(audio_segments)
+    except Exception as e:
+        raise SynthesisError(str(e)) from e
+
+def tts_backend_id():
+    """Identity of the active TTS backend, so cached audio is never reused across models."""
+    backend = getattr(tts_pipeline, 'backend', tts_pipeline)  # look through InferencePool
+    cls = type(backend) if backend is not None else get_tts_backend_class()
+    return f"{cls.__name__}:{cls.model_id or ''}"
+
+def open_sqlite(path):
+    """Open a SQLite database that can be shared by threads and worker processes."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+def link_or_copy(src, dst):
+    """
+    Hard-link src to dst (no data copied), falling back to a copy across filesystems.
+    An existing dst, such as a path reserved by allocate_output_file, is replaced.
+    """
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return
+    tmp = f"{dst}.{uuid.uuid4().hex}.tmp"
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+class SynthesisCache:
+    """
+    Content-addressed cache of encoded synthesis results.
+    Artifacts live in cache_dir as <key>.<format> and are hard-linked into each
+    request's output path. An in-memory LRU sits in front of a SQLite index that
+    survives restarts; the least recently used artifacts are evicted once the
+    cache grows beyond max_bytes. Concurrent misses for the same key wait for the
+    single in-flight synthesis instead of starting their own.
+    """
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3, memory_entries=1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()  # key -> (path, size, duration)
+        self._inflight = {}  # key -> threading.Event
+        self._counters = defaultdict(int)
+        self._db = open_sqlite(os.path.join(cache_dir, 'index.db'))
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'key TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, '
+            'duration REAL NOT NULL, last_access REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)')
+
+    @staticmethod
+    def make_key(text, params):
+        """Hash of the normalized text, synthesis/encoding params and backend identity."""
+        payload = json.dumps({
+            'text': ' '.join(text.split()),
+            'params': params,
+            'backend': tts_backend_id(),
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                self._lru.move_to_end(key)
+                source = 'memory_hits'
+            else:
+                row = self._db.execute('SELECT path, size, duration FROM entries WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    return None
+                entry = (row['path'], row['size'], row['duration'])
+                self._remember(key, entry)
+                source = 'disk_hits'
+            if not os.path.isfile(entry[0]):
+                # Artifact removed behind our back; forget it
+                self._lru.pop(key, None)
+                self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                return None
+            self._db.execute('UPDATE entries SET last_access = ? WHERE key = ?', (time.time(), key))
+            self._counters[source] += 1
+            return entry
+
+    def _remember(self, key, entry):
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.memory_entries:
+            self._lru.popitem(last=False)
+
+    def _store(self, key, output_file, duration):
+        ext = os.path.splitext(output_file)[1]
+        path = os.path.join(self.cache_dir, key[:2], key + ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        link_or_copy(output_file, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries (key, path, size, duration, last_access) VALUES (?, ?, ?, ?, ?)',
+                (key, path, size, duration, time.time())
+            )
+            self._remember(key, (path, size, duration))
+            self._evict()
+
+    def _evict(self):
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        while total > self.max_bytes:
+            rows = self._db.execute('SELECT key, path, size FROM entries ORDER BY last_access LIMIT 32').fetchall()
+            if not rows:
+                break
+            for row in rows:
+                if total <= self.max_bytes:
+                    break
+                self._db.execute('DELETE FROM entries WHERE key = ?', (row['key'],))
+                self._lru.pop(row['key'], None)
+                if os.path.isfile(row['path']):
+                    os.remove(row['path'])
+                total -= row['size']
+                self._counters['evictions'] += 1
+
+    def fetch(self, key, output_file):
+        """Link the cached artifact for key to output_file. Returns its duration, or None on a miss."""
+        entry = self._lookup(key)
+        if entry is None:
+            return None
+        link_or_copy(entry[0], output_file)
+        return entry[2]
+
+    def put(self, key, output_file, duration):
+        """Add an artifact produced outside get_or_create (e.g. by a fanned-out Celery job)."""
+        self._store(key, output_file, duration)
+
+    def get_or_create(self, key, output_file, produce):
+        """
+        Materialize the artifact for key at output_file.
+        produce(output_file) is only called on a miss and must return the duration in seconds.
+        Returns (duration_sec, cached).
+        """
+        while True:
+            duration = self.fetch(key, output_file)
+            if duration is not None:
+                return duration, True
+            with self._lock:
+                event = self._inflight.get(key)
+                leader = event is None
+                if leader:
+                    event = self._inflight[key] = threading.Event()
+                else:
+                    self._counters['coalesced'] += 1
+            if not leader:
+                # Another request is synthesizing the same audio; reuse its result
+                event.wait()
+                continue
+            try:
+                self._counters['misses'] += 1
+                duration = produce(output_file)
+                self._store(key, output_file, duration)
+                return duration, False
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+                event.set()
+
+    def stats(self):
+        with self._lock:
+            row = self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+            counters = dict(self._counters)
+        hits = counters.get('memory_hits', 0) + counters.get('disk_hits', 0)
+        lookups = hits + counters.get('misses', 0)
+        return {
+            'entries': row[0],
+            'bytes': row[1],
+            'max_bytes': self.max_bytes,
+            'memory_entries': len(self._lru),
+            'hits': hits,
+            'memory_hits': counters.get('memory_hits', 0),
+            'disk_hits': counters.get('disk_hits', 0),
+            'misses': counters.get('misses', 0),
+            'coalesced': counters.get('coalesced', 0),
+            'evictions': counters.get('evictions', 0),
+            'hit_rate': round(hits / lookups, 4) if lookups else 0,
+        }
+
+# Synthesis result cache (SYNTH_CACHE=0 disables it)
+_synthesis_cache = None
+_synthesis_cache_lock = threading.Lock()
+
+def get_synthesis_cache():
+    global _synthesis_cache
+    if os.environ.get('SYNTH_CACHE', '1') == '0':
+        return None
+    with _synthesis_cache_lock:
+        if _synthesis_cache is None:
+            if is_test_mode():
+                import tempfile
+                cache_dir = os.path.join(tempfile.gettempdir(), 'outputs', 'cache')
+            else:
+                cache_dir = os.path.join('outputs', 'cache')
+            max_bytes = int(os.environ.get('SYNTH_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+            _synthesis_cache = SynthesisCache(cache_dir, max_bytes=max_bytes)
+        return _synthesis_cache
+
+def render_audio_pieces(pieces, content_digest, tts_kwargs, output_file, format_, quality):
+    """
+    render_audio_file for text that arrives in pieces (a streamed upload).
+    The text is chunked as it is read and chunks are synthesized a batch at a time,
+    so synthesis starts before the rest of the text has been parsed. content_digest
+    identifies the text for the synthesis cache (None skips the cache); a cache hit
+    neither reads the pieces nor loads the model. Returns (duration_sec, cached).
+    """
+    def produce(path):
+        try:
+            chunks = iter_chunks_for_tts(pieces)
+            segments = []
+            batch_size = max(1, TTS_BATCH_SIZE)
+            while True:
+                batch = list(itertools.islice(chunks, batch_size))
+                if not batch:
+                    break
+                segments.extend(synthesize_chunks(batch, tts_kwargs, batch_size))
+            audio_array, sampling_rate = join_chunk_audio(segments)
+        except Exception as e:
+            raise SynthesisError(str(e)) from e
+        save_audio_with_format(audio_array, sampling_rate, path, format_, quality)
+        return len(audio_array) / sampling_rate
+    cache = get_synthesis_cache()
+    try:
+        if cache is None or content_digest is None:
+            return produce(output_file), False
+        key = cache.make_key('', dict(tts_kwargs, format=format_, quality=quality, content_sha256=content_digest))
+        duration_sec, cached = cache.get_or_create(key, output_file, produce)
+    except BaseException:
+        release_output_file(output_file)
+        raise
+    CACHE_REQUESTS.labels(result='hit' if cached else 'miss').inc()
+    return duration_sec, cached
+
+def render_audio_file(text, tts_kwargs, output_file, format_, quality):
+    """
+    Synthesize text and save it to output_file in the requested format.
+    Identical requests are served from the synthesis cache.
+    Returns (duration_sec, cached).
+    """
+    def produce(path):
+        audio_array, sampling_rate = synthesize_text(text, tts_kwargs)
+        save_audio_with_format(audio_array, sampling_rate, path, format_, quality)
+        return len(audio_array) / sampling_rate if hasattr(audio_array, '__len__') else 0
+    cache = get_synthesis_cache()
+    try:
+        if cache is None:
+            return produce(output_file), False
+        key = cache.make_key(text, dict(tts_kwargs, format=format_, quality=quality))
+        duration_sec, cached = cache.get_or_create(key, output_file, produce)
+    except BaseException:
+        release_output_file(output_file)
+        raise
+    CACHE_REQUESTS.labels(result='hit' if cached else 'miss').inc()
+    return duration_sec, cached
+
+def to_pcm16(audio_array):
+    """Convert float samples in [-1, 1] (or int16 samples) to little-endian 16-bit PCM bytes."""
+    audio_array = np.asarray(audio_array)
+    if audio_array.dtype == np.int16:
+        return audio_array.astype('<i2', copy=False).tobytes()
+    return (np.clip(audio_array, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+def wav_stream_header(sampling_rate, channels=1):
+    """RIFF/WAVE header for 16-bit PCM of unknown length (sizes set to the maximum)."""
+    block_align = channels * 2
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 0xFFFFFFFF, b'WAVE', b'fmt ', 16, 1, channels,
+        sampling_rate, sampling_rate * block_align, block_align, 16,
+        b'data', 0xFFFFFFFF,
+    )
+
+class StreamSink:
+    """Forward-only file object that collects encoder output until it is drained."""
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+    def tell(self):
+        return self._pos
+    def seek(self, offset, whence=io.SEEK_SET):
+        target = {io.SEEK_SET: offset, io.SEEK_CUR: self._pos + offset, io.SEEK_END: self._pos + offset}[whence]
+        if target != self._pos:
+            raise OSError('stream is not seekable')
+        return self._pos
+    def read(self, size=-1):
+        return b''
+    def flush(self):
+        pass
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+class StreamEncoder:
+    """
+    Incremental encoder for /speak-stream.
+    'wav' emits a streaming WAV header followed by 16-bit PCM, 'pcm' emits raw
+    16-bit little-endian PCM, and 'ogg' emits Ogg/Vorbis pages as they are produced.
+    """
+    MIMETYPES = {'wav': 'audio/wav', 'pcm': 'audio/L16', 'ogg': 'audio/ogg'}
+
+    def __init__(self, fmt, sampling_rate, quality='medium'):
+        self.fmt = fmt
+        self.sampling_rate = sampling_rate
+        self._sink = None
+        self._file = None
+        self._header = b''
+        if fmt == 'wav':
+            self._header = wav_stream_header(sampling_rate)
+        elif fmt == 'ogg':
+            self._sink = StreamSink()
+            self._file = sf.SoundFile(
+                self._sink, 'w', sampling_rate, 1, format='OGG', subtype='VORBIS',
+                compression_level=VORBIS_COMPRESSION_LEVELS.get(quality, VORBIS_COMPRESSION_LEVELS['medium']),
+            )
+
+    @property
+    def mimetype(self):
+        if self.fmt == 'pcm':
+            # Raw L16 cannot be decoded without its rate and channel count (RFC 2586)
+            return f'audio/L16;rate={self.sampling_rate};channels=1'
+        return self.MIMETYPES[self.fmt]
+
+    def encode(self, audio_array):
+        header, self._header = self._header, b''
+        if self._file is None:
+            return header + to_pcm16(audio_array)
+        self._file.write(np.asarray(audio_array, dtype=np.float32))
+        return header + self._sink.drain()
+
+    def close(self):
+        if self._file is None:
+            return b''
+        self._file.close()
+        return self._sink.drain()
+
+def build_tts_kwargs(voice, speed, pitch):
+    """Advanced synthesis settings passed to the backend when set."""
+    tts_kwargs = {}
+    if voice: tts_kwargs['voice'] = voice
+    if speed: tts_kwargs['speed'] = speed
+    if pitch: tts_kwargs['pitch'] = pitch
+    return tts_kwargs
+
+def allocate_output_file(text, format_, title=None):
+    """
+    Reserve a unique path in today's output directory by creating it empty.
+    Filename: {timestamp}-{title or first-5-words-of-text}.{format}
+    Returns (output_file, now).
+    """
+    output_dir = get_output_dir()
+    os.makedirs(output_dir, exist_ok=True)
+    now = datetime.now()
+    timestamp = now.strftime('%Y%m%d%H%M%S')
+    if title:
+        stem = sanitize_filename(title)
+    else:
+        stem = '-'.join(sanitize_filename(word) for word in text.strip().split()[:5])
+    base_filename = f"{timestamp}-{stem}.{format_}"
+    counter = 1
+    while True:
+        output_file = os.path.join(output_dir, base_filename)
+        try:
+            # Create the file to claim the name, so concurrent requests never share a path
+            os.close(os.open(output_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+            return output_file, now
+        except FileExistsError:
+            base_filename = f"{timestamp}-{stem}-{counter}.{format_}"
+            counter += 1
+
+def release_output_file(output_file):
+    """Give back a path from allocate_output_file that will not be written (or whose write failed)."""
+    try:
+        os.remove(output_file)
+    except FileNotFoundError:
+        pass
+
+def publish_output(output_file, now, duration_sec, fields):
+    """
+    Log a finished audio file to the catalog and export it to S3 (if enabled).
+    fields holds the request metadata (title, tone, prompt, voice, speed, pitch,
+    format, quality, user, tenant). Returns file_path, url, duration and s3_url.
+    S3 uploads run in the background by default: s3_url is then None in the result,
+    and the catalog row's s3_url is filled in once the upload completes.
+    S3_UPLOAD_ASYNC=0 uploads inline instead.
+    """
+    return publish_outputs([(output_file, now, duration_sec, fields)])[0]
+
+def publish_outputs(outputs):
+    """
+    publish_output for several files at once: outputs is a list of
+    (output_file, now, duration_sec, fields), and all of their catalog rows are
+    written in one transaction. Returns the results in the same order.
+    """
+    s3_bucket = os.environ.get('S3_BUCKET')
+    s3_prefix = os.environ.get('S3_PREFIX', '')
+    upload_async = os.environ.get('S3_UPLOAD_ASYNC', '1') == '1'
+    rows, results, uploads = [], [], []
+    for output_file, now, duration_sec, fields in outputs:
+        duration_str = str(timedelta(seconds=int(duration_sec)))
+        # Return file path and accessible URL
+        rel_path = os.path.relpath(output_file, start="outputs")
+        url = f"http://localhost:8000/outputs/{rel_path.replace(os.sep, '/')}"
+        # S3 export if enabled
+        s3_url = None
+        s3_key = os.path.join(s3_prefix, rel_path.replace(os.sep, '/')) if s3_bucket else None
+        if s3_bucket and not upload_async:
+            s3_url = upload_to_s3(output_file, s3_bucket, s3_key)
+        # Log metadata
+        metadata = {field: fields.get(field) for field in CATALOG_FIELDS}
+        metadata.update({
+            'date': now.strftime('%Y-%m-%d'),
+            'length': duration_str,
+            'file_path': f"/outputs/{rel_path}",
+            's3_url': s3_url,
+        })
+        rows.append(metadata)
+        uploads.append((output_file, s3_key))
+        results.append({
+            "file_path": f"/outputs/{rel_path}",
+            "url": url,
+            "duration": duration_str,
+            "s3_url": s3_url,
+        })
+    catalog_ids = log_metadata_many(rows)
+    if s3_bucket and upload_async:
+        for (output_file, s3_key), catalog_id in zip(uploads, catalog_ids):
+            get_s3_uploader().submit(output_file, s3_bucket, s3_key, catalog_id=catalog_id)
+    return results
+
 @app.route('/')
 def hello_world():
     return "Hello, World!"
 
+@app.route('/health', methods=['GET'])
+def health():
+    """Liveness: the process is up and serving requests (does not load the model)."""
+    return jsonify({'status': 'ok'})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness: 200 once the TTS model is loaded, 503 while it is not loaded, loading or failed."""
+    state = dict(MODEL_STATE)
+    state['ready'] = state['status'] == 'ready'
+    return jsonify(state), 200 if state['ready'] else 503
+
 @app.errorhandler(400)
 def bad_request(error):
     return jsonify({"error": "Bad Request", "message": str(error)}), 400
@@ -278,146 +2241,321 @@ def speak():
     if quality not in supported_qualities:
         quality = 'medium'
 
-    # Try/except for TTS generation
+    tts_kwargs = build_tts_kwargs(voice, speed, pitch)
+    output_file, now = allocate_output_file(text, format_)
+
+    # Synthesize and save audio, reusing a cached artifact for identical requests
     try:
-        # Chunking logic
-        max_chars = 2000  # could be configurable
-        overlap = 100
-        chunks = split_text_into_chunks(text, max_chars=max_chars, overlap=overlap) if len(text) > max_chars else [text]
-        audio_segments = []
-        tts_kwargs = {}
-        if voice: tts_kwargs['voice'] = voice
-        if speed: tts_kwargs['speed'] = speed
-        if pitch: tts_kwargs['pitch'] = pitch
-        for chunk in chunks:
-            # Pass advanced settings if supported by the model
-            audio = tts_pipeline(chunk, **tts_kwargs)
-            audio_array = audio["audio"] if isinstance(audio, dict) and "audio" in audio else audio
-            sampling_rate = audio.get("sampling_rate", 22050) if isinstance(audio, dict) else 22050
-            audio_segments.append((audio_array, sampling_rate))
-        # Combine audio segments
-        if len(audio_segments) == 1:
-            audio_array, sampling_rate = audio_segments[0]
-        else:
-            # Use pydub to concatenate
-            combined = AudioSegment.silent(duration=0)
-            for arr, sr in audio_segments:
-                seg = AudioSegment(
-                    arr.tobytes(),
-                    frame_rate=sr,
-                    sample_width=arr.dtype.itemsize,
-                    channels=1 if len(arr.shape) == 1 else arr.shape[1]
-                )
-                combined += seg
-            audio_array = np.array(combined.get_array_of_samples())
-            sampling_rate = combined.frame_rate
-    except Exception as e:
+        duration_sec, cached = render_audio_file(text, tts_kwargs, output_file, format_, quality)
+    except SynthesisError as e:
         return jsonify({"error": "TTS generation failed", "message": str(e)}), 500
-
-    # Create output directory structure
-    output_dir = get_output_dir()
-    os.makedirs(output_dir, exist_ok=True)
-
-    # Generate filename: {timestamp}-{first-5-words-of-text}.{format}
-    now = datetime.now()
-    timestamp = now.strftime('%Y%m%d%H%M%S')
-    words = '-'.join(sanitize_filename(word) for word in text.strip().split()[:5])
-    base_filename = f"{timestamp}-{words}.{format_}"
-    output_file = os.path.join(output_dir, base_filename)
-    counter = 1
-    while os.path.exists(output_file):
-        base_filename = f"{timestamp}-{words}-{counter}.{format_}"
-        output_file = os.path.join(output_dir, base_filename)
-        counter += 1
-
-    # Save audio file using helper
-    save_audio_with_format(audio_array, sampling_rate, output_file, format_, quality)
-    # Calculate duration
-    duration_sec = len(audio_array) / sampling_rate if hasattr(audio_array, '__len__') else 0
-    duration_str = str(timedelta(seconds=int(duration_sec)))
-    # Return file path and accessible URL
-    rel_path = os.path.relpath(output_file, start="outputs")
-    url = f"http://localhost:8000/outputs/{rel_path.replace(os.sep, '/')}"
-    # S3 export if enabled
-    s3_url = None
-    s3_bucket = os.environ.get('S3_BUCKET')
-    s3_prefix = os.environ.get('S3_PREFIX', '')
-    if s3_bucket:
-        s3_key = os.path.join(s3_prefix, rel_path.replace(os.sep, '/'))
-        s3_url = upload_to_s3(output_file, s3_bucket, s3_key)
-    # Log metadata
-    metadata = {
-        'title': None,
-        'date': now.strftime('%Y-%m-%d'),
-        'length': duration_str,
-        'tone': None,
-        'prompt': None,
+    result = publish_output(output_file, now, duration_sec, {
         'voice': voice,
         'speed': speed,
         'pitch': pitch,
         'format': format_,
         'quality': quality,
-        'file_path': f"/outputs/{rel_path}",
         'user': getattr(g, 'user', None),
         'tenant': getattr(g, 'tenant', None),
-        's3_url': s3_url,
-    }
-    log_metadata(metadata)
+    })
 
     return jsonify({
-        "file_path": f"/outputs/{rel_path}",
-        "url": url,
+        "file_path": result['file_path'],
+        "url": result['url'],
         "format": format_,
         "quality": quality,
-        "duration": duration_str,
-        "s3_url": s3_url,
+        "duration": result['duration'],
+        "s3_url": result['s3_url'],
+        "cached": cached,
+    })
+
+@app.route('/speak-stream', methods=['POST'])
+@jwt_required
+def speak_stream():
+    """
+    Stream synthesized audio as each text chunk finishes (chunked HTTP response).
+    JSON body: text, voice, speed, pitch, quality, format ('wav', 'pcm' or 'ogg').
+    The first chunk is synthesized before the response starts, since its sampling
+    rate fixes the stream's (sent as X-Sample-Rate, and in the mimetype for pcm).
+    The complete file is saved and catalogued once the stream ends; its location
+    is sent up front in the X-File-Path and X-Audio-URL headers. Streamed audio is
+    joined without crossfades, so it is not added to the synthesis cache.
+    """
+    data = request.get_json()
+    text = data.get('text', '')
+    voice = data.get('voice', 'default')
+    speed = data.get('speed', None)
+    pitch = data.get('pitch', None)
+    format_ = data.get('format', 'wav').lower()
+    quality = data.get('quality', 'medium')
+    if not text:
+        return jsonify({"error": "Text input is required."}), 400
+    if format_ not in StreamEncoder.MIMETYPES:
+        return jsonify({"error": f"Unsupported format '{format_}'. Supported: wav, pcm, ogg."}), 422
+    if quality not in {'low', 'medium', 'high'}:
+        quality = 'medium'
+    print(f"[TTS CONFIG] stream voice={voice}, speed={speed}, pitch={pitch}, format={format_}, quality={quality}")
+    tts_kwargs = build_tts_kwargs(voice, speed, pitch)
+    chunks = chunk_text_for_tts(text)
+    try:
+        first = synthesize_chunks([chunks[0]], tts_kwargs)[0]
+    except Exception as e:
+        return jsonify({"error": "TTS generation failed", "message": str(e)}), 500
+    encoder = StreamEncoder(format_, first[1], quality)
+    # Raw PCM is catalogued as WAV
+    file_format = 'ogg' if format_ == 'ogg' else 'wav'
+    output_file, now = allocate_output_file(text, file_format)
+    rel_path = os.path.relpath(output_file, start="outputs").replace(os.sep, '/')
+    fields = {
+        'voice': voice,
+        'speed': speed,
+        'pitch': pitch,
+        'format': file_format,
+        'quality': quality,
+        'user': getattr(g, 'user', None),
+        'tenant': getattr(g, 'tenant', None),
+    }
+
+    def generate():
+        segments = []
+        # Ogg pages are written to disk as they are streamed instead of being re-encoded
+        part_file = output_file + '.part'
+        tee = open(part_file, 'wb') if file_format == 'ogg' else None
+        finished = False
+        try:
+            for i, chunk in enumerate(chunks):
+                audio_array, sampling_rate = first if i == 0 else synthesize_chunks([chunk], tts_kwargs)[0]
+                audio_array = resample_audio(as_float32_audio(audio_array), sampling_rate, encoder.sampling_rate)
+                if len(chunks) > 1:
+                    # Same join pauses as join_chunk_audio; sent audio cannot be crossfaded
+                    audio_array = clamp_edge_silence(audio_array, encoder.sampling_rate, TTS_JOIN_SILENCE_MS / 2,
+                                                     leading=i > 0, trailing=i < len(chunks) - 1)
+                segments.append((audio_array, encoder.sampling_rate))
+                data = encoder.encode(audio_array)
+                if tee:
+                    tee.write(data)
+                yield data
+            data = encoder.close()
+            if tee:
+                tee.write(data)
+            yield data
+            finished = True
+        except Exception as e:
+            # Headers are already sent; end the stream without cataloguing a partial file
+            print(f"[TTS STREAM ERROR] {e}")
+        finally:
+            # Also runs on GeneratorExit when the client disconnects mid-stream
+            if tee:
+                tee.close()
+                if not finished:
+                    os.remove(part_file)
+        if not finished:
+            return
+        if tee:
+            os.replace(part_file, output_file)
+        duration_sec = sum(len(arr) for arr, _ in segments) / encoder.sampling_rate
+        if file_format == 'wav':
+            # Save exactly what was streamed
+            audio_array, sampling_rate = assemble_audio(segments, crossfade_ms=0)
+            save_audio_with_format(audio_array, sampling_rate, output_file, file_format, quality)
+        publish_output(output_file, now, duration_sec, fields)
+
+    def release_unused():
+        # The reserved file is still empty unless the stream finished (this also
+        # covers a response dropped before the generator started)
+        if os.path.isfile(output_file) and os.path.getsize(output_file) == 0:
+            release_output_file(output_file)
+
+    response = Response(generate(), content_type=encoder.mimetype, headers={
+        'X-Sample-Rate': str(encoder.sampling_rate),
+        'X-File-Path': f"/outputs/{rel_path}",
+        'X-Audio-URL': f"http://localhost:8000/outputs/{rel_path}",
+        'X-Accel-Buffering': 'no',
+        'Cache-Control': 'no-cache',
     })
+    response.call_on_close(release_unused)
+    return response
+
+JOB_FIELDS = ['job_id', 'user', 'text', 'status', 'submitted_at', 'completed_at', 'result_url', 'error']
+# Job fields sent to status watchers (the text can be long and never changes)
+JOB_STATUS_FIELDS = [field for field in JOB_FIELDS if field != 'text']
+# Statuses of jobs that are still queued or running in Celery
+ACTIVE_JOB_STATUSES = ('queued', 'pending', 'processing')
+
+class JobStore:
+    """
+    SQLite store for async job history (replaces outputs/job_history.csv).
+    Status transitions update one row in place through the job_id primary key,
+    and a poll that observes no change does not write at all. SQLite's file
+    locking keeps it safe across several web and worker processes. Every real
+    change bumps a global seq number so watchers can ask for "changes since".
+    """
+    def __init__(self, db_path, legacy_csv_path=None):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._last_seen = OrderedDict()  # job_id -> (status, result_url, error) last written by this process
+        self._last_seen_lock = threading.Lock()
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY, user TEXT, text TEXT, status TEXT,
+                submitted_at TEXT, completed_at TEXT, result_url TEXT, error TEXT,
+                seq INTEGER NOT NULL DEFAULT 0);
+            CREATE INDEX IF NOT EXISTS jobs_user ON jobs (user);
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+            CREATE INDEX IF NOT EXISTS jobs_seq ON jobs (seq);
+        """)
+        if legacy_csv_path and os.path.isfile(legacy_csv_path):
+            self._migrate_csv(legacy_csv_path)
+
+    def _conn(self):
+        # One connection per thread (and per process after a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = open_sqlite(self.db_path)
+            self._local.pid = os.getpid()
+        return conn
+
+    def _migrate_csv(self, csv_path):
+        """One-time import of the legacy job_history.csv; the CSV is kept as job_history.csv.migrated."""
+        with open(csv_path, 'r', newline='') as csvfile:
+            rows = list(csv.DictReader(csvfile))
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if os.path.isfile(csv_path):
+                for row in rows:
+                    self._insert(conn, row)
+                os.replace(csv_path, csv_path + '.migrated')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def _insert(conn, row):
+        values = ['' if row.get(field) is None else str(row.get(field)) for field in JOB_FIELDS]
+        conn.execute(
+            f'INSERT OR REPLACE INTO jobs ({", ".join(JOB_FIELDS)}, seq) '
+            f'VALUES ({", ".join("?" for _ in JOB_FIELDS)}, (SELECT COALESCE(MAX(seq), 0) + 1 FROM jobs))',
+            values
+        )
+
+    def add(self, job_id, user, text, status, submitted_at=None, completed_at=None, result_url=None, error=None):
+        self._insert(self._conn(), {
+            'job_id': job_id,
+            'user': user,
+            'text': text,
+            'status': status,
+            'submitted_at': submitted_at or time.strftime('%Y-%m-%d %H:%M:%S'),
+            'completed_at': completed_at,
+            'result_url': result_url,
+            'error': error,
+        })
 
-# Path for job history
-JOB_HISTORY_PATH = os.path.join('outputs', 'job_history.csv')
-JOB_HISTORY_LOCK = threading.Lock()
+    def update_status(self, job_id, status, result_url='', error='', completed_at=''):
+        """
+        Record a job's current status. completed_at is only stored the first time it is set.
+        Returns True if the row changed, False if the status was already recorded.
+        """
+        state = (status or '', result_url or '', error or '')
+        with self._last_seen_lock:
+            if self._last_seen.get(job_id) == state:
+                return False
+        cur = self._conn().execute(
+            """UPDATE jobs SET status = ?, result_url = ?, error = ?,
+                   completed_at = CASE WHEN completed_at = '' THEN ? ELSE completed_at END,
+                   seq = (SELECT COALESCE(MAX(seq), 0) + 1 FROM jobs)
+               WHERE job_id = ? AND (status IS NOT ? OR result_url IS NOT ? OR error IS NOT ?)""",
+            (*state, completed_at or '', job_id, *state)
+        )
+        with self._last_seen_lock:
+            self._last_seen[job_id] = state
+            self._last_seen.move_to_end(job_id)
+            while len(self._last_seen) > 10000:
+                self._last_seen.popitem(last=False)
+        return cur.rowcount > 0
+
+    def list(self, user=None, status=None, limit=20, offset=0):
+        """Jobs in submission order, filtered by user and/or status. Returns (rows, total)."""
+        clauses, params = [], []
+        if user:
+            clauses.append('user = ?')
+            params.append(user)
+        if status:
+            clauses.append('status = ?')
+            params.append(status)
+        where = (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+        conn = self._conn()
+        total = conn.execute(f'SELECT COUNT(*) FROM jobs{where}', params).fetchone()[0]
+        rows = conn.execute(
+            f'SELECT {", ".join(JOB_FIELDS)} FROM jobs{where} ORDER BY rowid LIMIT ? OFFSET ?',
+            params + [limit, offset]
+        )
+        return [dict(row) for row in rows], total
+
+    def max_seq(self):
+        """The seq of the latest change (0 for an empty store)."""
+        return self._conn().execute('SELECT COALESCE(MAX(seq), 0) FROM jobs').fetchone()[0]
+
+    def changes_since(self, seq, user=None, job_ids=None, limit=500):
+        """Jobs changed after seq, oldest change first, optionally only a user's or the given ids."""
+        clauses, params = ['seq > ?'], [seq]
+        if user:
+            clauses.append('user = ?')
+            params.append(user)
+        if job_ids:
+            clauses.append(f'job_id IN ({", ".join("?" for _ in job_ids)})')
+            params.extend(job_ids)
+        rows = self._conn().execute(
+            f'SELECT {", ".join(JOB_STATUS_FIELDS)}, seq FROM jobs WHERE {" AND ".join(clauses)} ORDER BY seq LIMIT ?',
+            params + [limit]
+        )
+        return [dict(row) for row in rows]
+
+    def active_ids(self, max_age=None, limit=500):
+        """
+        Ids of the most recently changed jobs that have not finished yet. With max_age,
+        jobs submitted more than max_age seconds ago are left out, so jobs whose
+        task was lost are not looked up forever.
+        """
+        clauses = [f'status IN ({", ".join("?" for _ in ACTIVE_JOB_STATUSES)})']
+        params = list(ACTIVE_JOB_STATUSES)
+        if max_age is not None:
+            # submitted_at is local '%Y-%m-%d %H:%M:%S', which sorts as text
+            clauses.append('submitted_at >= ?')
+            params.append(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() - max_age)))
+        rows = self._conn().execute(
+            f'SELECT job_id FROM jobs WHERE {" AND ".join(clauses)} ORDER BY seq DESC LIMIT ?',
+            params + [limit]
+        )
+        return [row['job_id'] for row in rows]
+
+_job_store = None
+_job_store_lock = threading.Lock()
+
+def get_job_store():
+    """
+    The process-wide job history store.
+    In test mode, use a temp file for the job history.
+    """
+    global _job_store
+    with _job_store_lock:
+        if _job_store is None:
+            if is_test_mode():
+                import tempfile
+                base = tempfile.gettempdir()
+            else:
+                base = 'outputs'
+            _job_store = JobStore(os.path.join(base, 'jobs.db'), legacy_csv_path=os.path.join(base, 'job_history.csv'))
+        return _job_store
 
 # Helper to log/update job history
 
 def log_job_history(job_id, user, text, status, submitted_at=None, completed_at=None, result_url=None, error=None):
-    import csv
-    import time
-    os.makedirs(os.path.dirname(JOB_HISTORY_PATH), exist_ok=True)
-    with JOB_HISTORY_LOCK:
-        file_exists = os.path.isfile(JOB_HISTORY_PATH)
-        with open(JOB_HISTORY_PATH, 'a', newline='') as csvfile:
-            fieldnames = ['job_id', 'user', 'text', 'status', 'submitted_at', 'completed_at', 'result_url', 'error']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow({
-                'job_id': job_id,
-                'user': user,
-                'text': text,
-                'status': status,
-                'submitted_at': submitted_at or time.strftime('%Y-%m-%d %H:%M:%S'),
-                'completed_at': completed_at or '',
-                'result_url': result_url or '',
-                'error': error or ''
-            })
+    get_job_store().add(job_id, user, text, status, submitted_at, completed_at, result_url, error)
 
-def update_job_history(job_id, **updates):
-    import csv
-    with JOB_HISTORY_LOCK:
-        if not os.path.isfile(JOB_HISTORY_PATH):
-            return
-        with open(JOB_HISTORY_PATH, 'r', newline='') as csvfile:
-            rows = list(csv.DictReader(csvfile))
-            fieldnames = csvfile.fieldnames if hasattr(csvfile, 'fieldnames') else rows[0].keys()
-        for row in rows:
-            if row['job_id'] == job_id:
-                for k, v in updates.items():
-                    if k in row:
-                        row[k] = v
-        with open(JOB_HISTORY_PATH, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
+def update_job_history(job_id, status, result_url='', error='', completed_at=''):
+    return get_job_store().update_status(job_id, status, result_url, error, completed_at)
 
 @app.route('/jobs', methods=['GET'])
 def list_jobs():
@@ -425,19 +2563,6 @@ def list_jobs():
     List async TTS jobs (history). Supports filtering by user, status, and pagination.
     Query params: user, status, page, page_size
     """
-    import csv
-    if not os.path.isfile(JOB_HISTORY_PATH):
-        return jsonify({'results': [], 'total': 0, 'page': 1, 'page_size': 20})
-    with JOB_HISTORY_LOCK:
-        with open(JOB_HISTORY_PATH, 'r', newline='') as csvfile:
-            reader = csv.DictReader(csvfile)
-            jobs = list(reader)
-    user = request.args.get('user')
-    status = request.args.get('status')
-    if user:
-        jobs = [j for j in jobs if j.get('user') == user]
-    if status:
-        jobs = [j for j in jobs if j.get('status') == status]
     try:
         page = int(request.args.get('page', 1))
         page_size = int(request.args.get('page_size', 20))
@@ -445,10 +2570,12 @@ def list_jobs():
         if page_size < 1: page_size = 20
     except Exception:
         page, page_size = 1, 20
-    total = len(jobs)
-    start = (page - 1) * page_size
-    end = start + page_size
-    paged = jobs[start:end]
+    paged, total = get_job_store().list(
+        user=request.args.get('user'),
+        status=request.args.get('status'),
+        limit=page_size,
+        offset=(page - 1) * page_size,
+    )
     return jsonify({'results': paged, 'total': total, 'page': page, 'page_size': page_size})
 
 # Update async job submission and status endpoints to log/update job history
@@ -461,12 +2588,12 @@ def speak_async():
     if not text:
         return jsonify({"error": "Text input is required."}), 400
     # Enqueue background task
-    job = tts_task.apply_async(args=[text, params])
+    job = tts_task.apply_async(args=[text, params], kwargs={'user': getattr(g, 'user', None), 'tenant': getattr(g, 'tenant', None)})
     log_job_history(job.id, getattr(g, 'user', None), text, 'queued')
     return jsonify({"job_id": job.id, "status": "queued"})
 
-@app.route('/job/<job_id>', methods=['GET'])
-def get_job_status(job_id):
+def celery_job_status(job_id):
+    """A job's state as Celery reports it. Returns (status, result_url, error, AsyncResult)."""
     job = tts_task.AsyncResult(job_id)
     status = None
     result_url = None
@@ -483,7 +2610,17 @@ def get_job_status(job_id):
         error = str(job.info)
     else:
         status = job.state
-    update_job_history(job_id, status=status, result_url=result_url or '', error=error or '', completed_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S') if status in ['complete','error'] else '')
+    return status, result_url or '', error or '', job
+
+def record_job_status(job_id, status, result_url, error):
+    """Store a status read from Celery in the job history. Returns True if it changed."""
+    completed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S') if status in ['complete', 'error'] else ''
+    return update_job_history(job_id, status=status, result_url=result_url, error=error, completed_at=completed_at)
+
+@app.route('/job/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    status, result_url, error, job = celery_job_status(job_id)
+    record_job_status(job_id, status, result_url, error)
     if job.state == 'SUCCESS':
         return jsonify({"status": "complete", "result": job.result})
     elif job.state == 'FAILURE':
@@ -495,24 +2632,193 @@ def get_job_status(job_id):
     else:
         return jsonify({"status": job.state})
 
-@app.route('/speak-file', methods=['POST'])
-@jwt_required
-def speak_file():
+JOB_STATUS_POLL_SECONDS = float(os.environ.get('JOB_STATUS_POLL_SECONDS', 1.0))
+JOB_STREAM_MAX_SECONDS = float(os.environ.get('JOB_STREAM_MAX_SECONDS', 300))
+# Unfinished jobs submitted longer ago than this are no longer looked up
+JOB_STATUS_MAX_AGE = float(os.environ.get('JOB_STATUS_MAX_AGE', 24 * 3600))
+JOB_STREAM_KEEPALIVE_SECONDS = 15
+JOB_POLL_MAX_TIMEOUT = 60
+JOB_STATUS_MAX_IDS = 100
+
+class JobStatusHub:
     """
-    Accepts a file upload (.txt, .md, .json) and optional fields as form-data.
-    Extracts text, title, and optional fields for TTS processing.
+    The one subscription to job state changes that /jobs/stream, /jobs/poll and
+    /jobs/status share within a process. A background thread asks Celery about
+    the unfinished jobs once per interval, however many clients are watching, and
+    records what changed in the JobStore (bumping its seq). Waiting clients are
+    woken whenever the store's seq moves on, whichever process made the change,
+    and then read their own changes from the store.
     """
-    if 'file' not in request.files:
-        return jsonify({"error": "No file part in the request."}), 400
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({"error": "No selected file."}), 400
-    filename = secure_filename(file.filename)
-    ext = os.path.splitext(filename)[1].lower()
-    # Read file content
-    content = file.read().decode('utf-8', errors='ignore')
-    # Parse fields
-    title = request.form.get('title', None)
+    def __init__(self, store, interval=1.0, status_fn=None, max_age=None):
+        self.store = store
+        self.interval = interval
+        self.max_age = max_age
+        self._status_fn = status_fn or (lambda job_id: celery_job_status(job_id)[:3])
+        self._cond = threading.Condition()
+        self._thread = None
+        self.seq = store.max_seq()
+        self.pid = os.getpid()
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='job-status-hub', daemon=True)
+                self._thread.start()
+
+    def refresh(self):
+        """One poll: update the unfinished jobs from Celery, then wake waiters if the seq moved."""
+        for job_id in self.store.active_ids(self.max_age):
+            status, result_url, error = self._status_fn(job_id)
+            record_job_status(job_id, status, result_url, error)
+        seq = self.store.max_seq()
+        with self._cond:
+            if seq != self.seq:
+                self.seq = seq
+                self._cond.notify_all()
+        return seq
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[JOB HUB] status refresh failed: {e}")
+            time.sleep(self.interval)
+
+    def wait(self, since, timeout):
+        """Block until the seq is past since, or for timeout seconds. Returns the current seq."""
+        self.start()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.seq <= since:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self.seq
+
+_job_hub = None
+_job_hub_lock = threading.Lock()
+
+def get_job_hub():
+    """The process-wide job status hub (re-created in a forked child, whose thread did not survive)."""
+    global _job_hub
+    with _job_hub_lock:
+        if _job_hub is None or _job_hub.pid != os.getpid():
+            _job_hub = JobStatusHub(get_job_store(), interval=JOB_STATUS_POLL_SECONDS, max_age=JOB_STATUS_MAX_AGE)
+        return _job_hub
+
+def job_scope_args():
+    """
+    The user and ids (comma-separated, at most JOB_STATUS_MAX_IDS) filters of a job
+    status request. The user is always the authenticated one, so ids of other
+    users' jobs match nothing.
+    """
+    ids = [job_id for job_id in (request.args.get('ids') or '').split(',') if job_id]
+    return g.user, ids[:JOB_STATUS_MAX_IDS] or None
+
+def job_since_arg(value):
+    """The seq to report changes after: the given one, else the latest (only future changes)."""
+    if value in (None, ''):
+        return get_job_store().max_seq()
+    return max(0, int(value))
+
+def wait_for_job_changes(since, user, job_ids, timeout):
+    """
+    Changes to the jobs in scope after since, waiting up to timeout seconds for
+    the first one. Returns (jobs, seq), where seq is the since for the next call.
+    """
+    hub = get_job_hub()
+    store = get_job_store()
+    deadline = time.monotonic() + timeout
+    while True:
+        seq = hub.seq
+        jobs = store.changes_since(since, user, job_ids)
+        if jobs:
+            return jobs, jobs[-1]['seq']
+        # Nothing in scope up to seq, so later calls can start from there
+        since = max(since, seq)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return [], since
+        hub.wait(since, remaining)
+
+@app.route('/jobs/status', methods=['GET'])
+@jwt_required(query_token=True)
+def jobs_status():
+    """
+    Status of several of the caller's jobs in one request: ids=a,b,c.
+    Answered from the job store, which the status hub keeps current. The returned
+    seq can be passed as since to /jobs/poll or /jobs/stream.
+    """
+    user, job_ids = job_scope_args()
+    if not job_ids:
+        return jsonify({"error": "ids is required."}), 400
+    hub = get_job_hub()
+    hub.start()
+    seq = hub.seq
+    jobs = get_job_store().changes_since(0, user, job_ids)
+    return jsonify({'jobs': jobs, 'seq': max([seq] + [job['seq'] for job in jobs])})
+
+@app.route('/jobs/poll', methods=['GET'])
+@jwt_required(query_token=True)
+def jobs_poll():
+    """
+    Long-poll for status changes of the caller's jobs. Query params: ids (to narrow
+    the scope), since (a seq from an earlier response; default: now) and timeout (seconds,
+    default 25, at most 60). Returns as soon as a job in scope changes, or with
+    an empty list at the timeout; pass the returned seq as the next since.
+    """
+    user, job_ids = job_scope_args()
+    try:
+        since = job_since_arg(request.args.get('since'))
+        timeout = min(max(float(request.args.get('timeout', 25)), 0.0), JOB_POLL_MAX_TIMEOUT)
+    except ValueError:
+        return jsonify({"error": "since must be an integer and timeout a number."}), 400
+    jobs, seq = wait_for_job_changes(since, user, job_ids, timeout)
+    return jsonify({'jobs': jobs, 'seq': seq})
+
+@app.route('/jobs/stream', methods=['GET'])
+@jwt_required(query_token=True)
+def jobs_stream():
+    """
+    Server-Sent Events stream of status changes of the caller's jobs. Query params:
+    token (EventSource cannot send an Authorization header), ids (to narrow the
+    scope) and since (default: now). Each change is a "job" event whose id is
+    its seq, so a reconnecting EventSource resumes from Last-Event-ID. Idle streams
+    get a comment line every 15 seconds, and a stream ends after
+    JOB_STREAM_MAX_SECONDS so the browser reconnects instead of holding a worker forever.
+    """
+    user, job_ids = job_scope_args()
+    try:
+        since = job_since_arg(request.headers.get('Last-Event-ID') or request.args.get('since'))
+    except ValueError:
+        return jsonify({"error": "since must be an integer."}), 400
+
+    def generate(cursor):
+        yield 'retry: 3000\n\n'
+        end = time.monotonic() + JOB_STREAM_MAX_SECONDS
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return
+            jobs, cursor = wait_for_job_changes(cursor, user, job_ids, min(JOB_STREAM_KEEPALIVE_SECONDS, remaining))
+            if not jobs:
+                yield ': keepalive\n\n'
+            for job in jobs:
+                yield f"id: {job['seq']}\nevent: job\ndata: {json.dumps(job)}\n\n"
+
+    return Response(generate(since), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def parse_text_document(filename, content, title=None):
+    """
+    Extract (title, text) from an uploaded .txt, .md or .json document.
+    .json files carry "text" and "title" keys; .txt/.md files may start with a
+    "Title:" line. An explicit title wins over the one in the document.
+    Whitespace is collapsed in both. Raises ValueError for malformed JSON.
+    """
+    ext = os.path.splitext(secure_filename(filename or ''))[1].lower()
     text = None
     # Handle .json, .txt, .md
     if ext == '.json':
@@ -522,12 +2828,12 @@ def speak_file():
             if not title:
                 title = data.get('title', None)
         except Exception as e:
-            return jsonify({"error": f"Invalid JSON: {str(e)}"}), 400
+            raise ValueError(f"Invalid JSON: {str(e)}")
     else:
         # .txt or .md: try to extract title and text
         lines = content.splitlines()
         if not title and lines and lines[0].lower().startswith('title:'):
-            title = lines[0][6:].trip()
+            title = lines[0][6:].strip()
             text = '\n'.join(lines[1:]).strip()
         else:
             text = content.strip()
@@ -536,6 +2842,41 @@ def speak_file():
         title = ' '.join(title.split())
     if text:
         text = ' '.join(text.split())
+    return title, text
+
+@app.route('/speak-file', methods=['POST'])
+@jwt_required
+def speak_file():
+    """
+    Accepts a file upload (.txt, .md, .json) and optional fields as form-data.
+    Extracts text, title, and optional fields for TTS processing.
+    """
+    if 'file' not in request.files:
+        return jsonify({"error": "No file part in the request."}), 400
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({"error": "No selected file."}), 400
+    title = request.form.get('title', None)
+    # A streamed upload's text is read in pieces; text is then only the first of them
+    pieces = content_digest = None
+    if os.path.splitext(secure_filename(file.filename))[1].lower() == '.json':
+        # JSON has to be parsed whole; only .txt/.md uploads are streamed
+        try:
+            title, text = parse_text_document(file.filename, file.read().decode('utf-8', errors='ignore'), title)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    else:
+        # Stream the upload: decode it block by block and chunk it as it is read
+        if get_synthesis_cache() is not None and file.stream.seekable():
+            # Key the cache on the text that is synthesized, which only includes a
+            # "Title:" line when the form gives the title
+            content_digest = hashlib.sha256()
+            for piece in upload_text_pieces(file.stream, title)[1]:
+                content_digest.update(piece.encode('utf-8'))
+            content_digest = content_digest.hexdigest()
+            file.stream.seek(0)
+        title, pieces = upload_text_pieces(file.stream, title)
+        text, pieces = skip_blank_pieces(pieces)
     # Accept optional fields
     tone = request.form.get('tone', None)
     prompt = request.form.get('prompt', None)
@@ -557,74 +2898,18 @@ def speak_file():
     supported_qualities = {'low', 'medium', 'high'}
     if quality not in supported_qualities:
         quality = 'medium'
-    # Try/except for TTS generation
+    tts_kwargs = build_tts_kwargs(voice, speed, pitch)
+    # Use title for filename if available, else fallback to timestamp-words
+    output_file, now = allocate_output_file(text, format_, title)
     try:
-        max_chars = 2000
-        overlap = 100
-        chunks = split_text_into_chunks(text, max_chars=max_chars, overlap=overlap) if len(text) > max_chars else [text]
-        audio_segments = []
-        tts_kwargs = {}
-        if voice: tts_kwargs['voice'] = voice
-        if speed: tts_kwargs['speed'] = speed
-        if pitch: tts_kwargs['pitch'] = pitch
-        for chunk in chunks:
-            audio = tts_pipeline(chunk, **tts_kwargs)
-            audio_array = audio["audio"] if isinstance(audio, dict) and "audio" in audio else audio
-            sampling_rate = audio.get("sampling_rate", 22050) if isinstance(audio, dict) else 22050
-            audio_segments.append((audio_array, sampling_rate))
-        if len(audio_segments) == 1:
-            audio_array, sampling_rate = audio_segments[0]
+        if pieces is None:
+            duration_sec, cached = render_audio_file(text, tts_kwargs, output_file, format_, quality)
         else:
-            combined = AudioSegment.silent(duration=0)
-            for arr, sr in audio_segments:
-                seg = AudioSegment(
-                    arr.tobytes(),
-                    frame_rate=sr,
-                    sample_width=arr.dtype.itemsize,
-                    channels=1 if len(arr.shape) == 1 else arr.shape[1]
-                )
-                combined += seg
-            audio_array = np.array(combined.get_array_of_samples())
-            sampling_rate = combined.frame_rate
-    except Exception as e:
+            duration_sec, cached = render_audio_pieces(pieces, content_digest, tts_kwargs, output_file, format_, quality)
+    except SynthesisError as e:
         return jsonify({"error": "TTS generation failed", "message": str(e)}), 500
-    # ...existing output file logic (use title if available for filename)...
-    output_dir = get_output_dir()
-    os.makedirs(output_dir, exist_ok=True)
-    # Use title for filename if available, else fallback to timestamp-words
-    now = datetime.now()
-    if title:
-        safe_title = sanitize_filename(title)
-        base_filename = f"{now.strftime('%Y%m%d%H%M%S')}-{safe_title}.{format_}"
-    else:
-        words = '-'.join(sanitize_filename(word) for word in text.strip().split()[:5])
-        base_filename = f"{now.strftime('%Y%m%d%H%M%S')}-{words}.{format_}"
-    output_file = os.path.join(output_dir, base_filename)
-    counter = 1
-    while os.path.exists(output_file):
-        if title:
-            base_filename = f"{now.strftime('%Y%m%d%H%M%S')}-{safe_title}-{counter}.{format_}"
-        else:
-            base_filename = f"{now.strftime('%Y%m%d%H%M%S')}-{words}-{counter}.{format_}"
-        output_file = os.path.join(output_dir, base_filename)
-        counter += 1
-    save_audio_with_format(audio_array, sampling_rate, output_file, format_, quality)
-    duration_sec = len(audio_array) / sampling_rate if hasattr(audio_array, '__len__') else 0
-    duration_str = str(timedelta(seconds=int(duration_sec)))
-    rel_path = os.path.relpath(output_file, start="outputs")
-    url = f"http://localhost:8000/outputs/{rel_path.replace(os.sep, '/')}"
-    # S3 export if enabled
-    s3_url = None
-    s3_bucket = os.environ.get('S3_BUCKET')
-    s3_prefix = os.environ.get('S3_PREFIX', '')
-    if s3_bucket:
-        s3_key = os.path.join(s3_prefix, rel_path.replace(os.sep, '/'))
-        s3_url = upload_to_s3(output_file, s3_bucket, s3_key)
-    # Log metadata
-    metadata = {
+    result = publish_output(output_file, now, duration_sec, {
         'title': title,
-        'date': now.strftime('%Y-%m-%d'),
-        'length': duration_str,
         'tone': tone,
         'prompt': prompt,
         'voice': voice,
@@ -632,70 +2917,367 @@ def speak_file():
         'pitch': pitch,
         'format': format_,
         'quality': quality,
-        'file_path': f"/outputs/{rel_path}",
         'user': getattr(g, 'user', None),
         'tenant': getattr(g, 'tenant', None),
-        's3_url': s3_url,
-    }
-    log_metadata(metadata)
+    })
     return jsonify({
-        "file_path": f"/outputs/{rel_path}",
-        "url": url,
+        "file_path": result['file_path'],
+        "url": result['url'],
         "title": title,
         "tone": tone,
         "prompt": prompt,
         "format": format_,
         "quality": quality,
-        "duration": duration_str,
-        "s3_url": s3_url,
+        "duration": result['duration'],
+        "s3_url": result['s3_url'],
+        "cached": cached,
     })
 
+# Per-item params accepted by /speak-batch (everything else is ignored)
+BATCH_PARAM_FIELDS = ('title', 'tone', 'prompt', 'voice', 'speed', 'pitch', 'format', 'quality')
+SPEAK_BATCH_MAX_ITEMS = int(os.environ.get('SPEAK_BATCH_MAX_ITEMS', 100))
+
+class BatchStore:
+    """
+    SQLite store for /speak-batch submissions: one row per batch and one per item.
+    Items keep their text and params, so the worker task only needs the batch id,
+    and each item's status and result are recorded as soon as it finishes.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS batches (
+                batch_id TEXT PRIMARY KEY, user TEXT, tenant TEXT, status TEXT,
+                total INTEGER, submitted_at TEXT, completed_at TEXT);
+            CREATE TABLE IF NOT EXISTS batch_items (
+                batch_id TEXT NOT NULL, idx INTEGER NOT NULL, text TEXT, params TEXT,
+                status TEXT, result TEXT, error TEXT,
+                PRIMARY KEY (batch_id, idx));
+        """)
+
+    def _conn(self):
+        # One connection per thread (and per process after a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = open_sqlite(self.db_path)
+            self._local.pid = os.getpid()
+        return conn
+
+    def _transaction(self, fn):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            fn(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def create(self, batch_id, user, tenant, items):
+        """Record a new batch of (text, params) items, all queued."""
+        def insert(conn):
+            conn.execute(
+                "INSERT INTO batches VALUES (?, ?, ?, 'queued', ?, ?, '')",
+                (batch_id, user, tenant, len(items), time.strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            conn.executemany(
+                "INSERT INTO batch_items VALUES (?, ?, ?, ?, 'queued', '', '')",
+                [(batch_id, i, text, json.dumps(params)) for i, (text, params) in enumerate(items)]
+            )
+        self._transaction(insert)
+
+    def set_status(self, batch_id, status, completed_at=''):
+        self._conn().execute(
+            'UPDATE batches SET status = ?, completed_at = ? WHERE batch_id = ?',
+            (status, completed_at, batch_id)
+        )
+
+    def finish_items(self, batch_id, updates):
+        """Record finished items in one transaction: updates is a list of (index, status, result, error)."""
+        if not updates:
+            return
+        self._transaction(lambda conn: conn.executemany(
+            'UPDATE batch_items SET status = ?, result = ?, error = ? WHERE batch_id = ? AND idx = ?',
+            [(status, json.dumps(result) if result else '', error or '', batch_id, idx)
+             for idx, status, result, error in updates]
+        ))
+
+    def pending_items(self, batch_id):
+        """Items not yet finished, in submission order, with their text and params."""
+        rows = self._conn().execute(
+            "SELECT idx, text, params FROM batch_items WHERE batch_id = ? AND status = 'queued' ORDER BY idx",
+            (batch_id,)
+        )
+        return [{'index': row['idx'], 'text': row['text'], 'params': json.loads(row['params'])} for row in rows]
+
+    def get(self, batch_id):
+        """A batch with per-item status and results (without the item texts), or None."""
+        conn = self._conn()
+        row = conn.execute('SELECT * FROM batches WHERE batch_id = ?', (batch_id,)).fetchone()
+        if row is None:
+            return None
+        batch = dict(row)
+        batch['items'] = []
+        counts = defaultdict(int)
+        for item in conn.execute(
+            'SELECT idx, params, status, result, error FROM batch_items WHERE batch_id = ? ORDER BY idx', (batch_id,)
+        ):
+            entry = {'index': item['idx'], 'title': json.loads(item['params']).get('title'), 'status': item['status']}
+            if item['result']:
+                entry.update(json.loads(item['result']))
+            if item['error']:
+                entry['error'] = item['error']
+            batch['items'].append(entry)
+            counts[item['status']] += 1
+        batch.update({'queued': counts['queued'], 'completed': counts['complete'], 'failed': counts['error']})
+        return batch
+
+_batch_store = None
+_batch_store_lock = threading.Lock()
+
+def get_batch_store():
+    """
+    The process-wide /speak-batch store (next to the job history database).
+    In test mode, use a temp file.
+    """
+    global _batch_store
+    with _batch_store_lock:
+        if _batch_store is None:
+            if is_test_mode():
+                import tempfile
+                base = tempfile.gettempdir()
+            else:
+                base = 'outputs'
+            _batch_store = BatchStore(os.path.join(base, 'batches.db'))
+        return _batch_store
+
+def batch_items_from_request():
+    """
+    Read the items of a /speak-batch request. Returns (items, errors): items is a
+    list of (text, params) and errors a list of {'index', 'error'} for every invalid item.
+
+    JSON body: {"items": [{"text": ..., "title": ..., "format": ...} or "text", ...],
+    plus shared params at the top level, which per-item params override.
+    form-data: one or more "file" parts (.txt, .md, .json, parsed like /speak-file),
+    shared params as form fields, and optionally an "items" field holding a JSON
+    list of per-file params in upload order.
+    """
+    if request.files:
+        shared = {k: v for k, v in request.form.items() if k in BATCH_PARAM_FIELDS}
+        try:
+            overrides = json.loads(request.form.get('items') or '[]')
+        except ValueError:
+            return [], [{'index': None, 'error': 'items must be a JSON list of per-file params.'}]
+        if not isinstance(overrides, list):
+            return [], [{'index': None, 'error': 'items must be a JSON list of per-file params.'}]
+        raw = []
+        for i, file in enumerate(request.files.getlist('file')):
+            item = dict(overrides[i]) if i < len(overrides) and isinstance(overrides[i], dict) else {}
+            try:
+                title, text = parse_text_document(file.filename, file.read().decode('utf-8', errors='ignore'), item.get('title') or shared.get('title'))
+            except ValueError as e:
+                raw.append(e)
+                continue
+            item.update({'text': text, 'title': title})
+            raw.append(item)
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('items'), list):
+            return [], [{'index': None, 'error': 'Expected a JSON object with an "items" list, or "file" uploads.'}]
+        shared = {k: v for k, v in data.items() if k in BATCH_PARAM_FIELDS}
+        raw = [{'text': item} if isinstance(item, str) else item for item in data['items']]
+    if not raw:
+        return [], [{'index': None, 'error': 'The batch has no items.'}]
+    if len(raw) > SPEAK_BATCH_MAX_ITEMS:
+        return [], [{'index': None, 'error': f'A batch holds at most {SPEAK_BATCH_MAX_ITEMS} items.'}]
+    items, errors = [], []
+    for i, item in enumerate(raw):
+        if isinstance(item, Exception):
+            errors.append({'index': i, 'error': str(item)})
+            continue
+        if not isinstance(item, dict):
+            errors.append({'index': i, 'error': 'Each item must be a text or an object.'})
+            continue
+        params = dict(shared)
+        params.update({k: v for k, v in item.items() if k in BATCH_PARAM_FIELDS and v is not None})
+        text = item.get('text')
+        if not isinstance(text, str) or not text.strip():
+            errors.append({'index': i, 'error': 'Text input is required.'})
+            continue
+        try:
+            tts_job_options(params)
+        except ValueError as e:
+            errors.append({'index': i, 'error': str(e)})
+            continue
+        items.append((text, params))
+    return items, errors
+
+@celery_app.task(bind=True)
+def speak_batch_task(self, batch_id):
+    """
+    Synthesize the queued items of a /speak-batch submission.
+    Items with the same voice settings are chunked up front, and their chunks run
+    through synthesize_chunks together, so short documents share model batches
+    instead of each leaving a batch mostly empty. An item is encoded and saved as
+    soon as its last chunk is done; the catalog rows and item results of everything
+    a model batch finished are then written in one transaction each.
+    Cached items are served from the synthesis cache without any inference.
+    """
+    store = get_batch_store()
+    batch = store.get(batch_id)
+    if batch is None:
+        raise ValueError(f'Unknown batch {batch_id}')
+    store.set_status(batch_id, 'processing')
+    try:
+        cache = get_synthesis_cache()
+        finished, failed = [], []
+
+        def flush():
+            updates = [(item['index'], 'error', None, item['error']) for item in failed]
+            if finished:
+                results = publish_outputs([
+                    (item['output_file'], item['now'], item['duration_sec'], tts_job_fields(item['params'], batch['user'], batch['tenant']))
+                    for item in finished
+                ])
+                for item, result in zip(finished, results):
+                    result.update({'format': item['format'], 'quality': item['quality'], 'cached': item['cached']})
+                    updates.append((item['index'], 'complete', result, None))
+            store.finish_items(batch_id, updates)
+            finished.clear()
+            failed.clear()
+
+        groups = OrderedDict()
+        for item in store.pending_items(batch_id):
+            voice, speed, pitch, item['format'], item['quality'] = tts_job_options(item['params'])
+            tts_kwargs = build_tts_kwargs(voice, speed, pitch)
+            item['error'] = None
+            item['cache_key'] = None
+            if cache is not None:
+                item['cache_key'] = cache.make_key(item['text'], dict(tts_kwargs, format=item['format'], quality=item['quality']))
+                output_file, now = allocate_output_file(item['text'], item['format'], item['params'].get('title'))
+                duration_sec = cache.fetch(item['cache_key'], output_file)
+                CACHE_REQUESTS.labels(result='hit' if duration_sec is not None else 'miss').inc()
+                if duration_sec is not None:
+                    item.update({'output_file': output_file, 'now': now, 'duration_sec': duration_sec, 'cached': True})
+                    finished.append(item)
+                    continue
+                release_output_file(output_file)
+            groups.setdefault(MicroBatcher._key(tts_kwargs), (tts_kwargs, []))[1].append(item)
+        flush()
+
+        batch_size = max(1, TTS_BATCH_SIZE)
+        for tts_kwargs, items in groups.values():
+            work = []
+            for item in items:
+                item['chunks'] = chunk_text_for_tts(item['text'])
+                item['segments'] = [None] * len(item['chunks'])
+                work.extend((item, i) for i in range(len(item['chunks'])))
+            for offset in range(0, len(work), batch_size):
+                window = [(item, i) for item, i in work[offset:offset + batch_size] if item['error'] is None]
+                try:
+                    segments = synthesize_chunks([item['chunks'][i] for item, i in window], tts_kwargs, batch_size)
+                except Exception as e:
+                    for item, _ in window:
+                        if item['error'] is None:
+                            item['error'] = f'TTS generation failed: {e}'
+                            failed.append(item)
+                    segments = []
+                for (item, i), segment in zip(window, segments):
+                    item['segments'][i] = segment
+                    if i < len(item['chunks']) - 1:
+                        continue
+                    # Last chunk of this item: encode it now and free its segments
+                    try:
+                        audio_array, sampling_rate = join_chunk_audio(item.pop('segments'))
+                        # Reserve the path only once there is audio to save
+                        item['output_file'], item['now'] = allocate_output_file(item['text'], item['format'], item['params'].get('title'))
+                        try:
+                            save_audio_with_format(audio_array, sampling_rate, item['output_file'], item['format'], item['quality'])
+                        except Exception:
+                            release_output_file(item['output_file'])
+                            raise
+                        item.update({'duration_sec': len(audio_array) / sampling_rate, 'cached': False})
+                        if item['cache_key'] is not None:
+                            cache.put(item['cache_key'], item['output_file'], item['duration_sec'])
+                        finished.append(item)
+                    except Exception as e:
+                        item['error'] = str(e)
+                        failed.append(item)
+                flush()
+    except Exception:
+        store.set_status(batch_id, 'error', completed_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+        raise
+
+    batch = store.get(batch_id)
+    status = 'error' if batch['failed'] == batch['total'] else 'complete'
+    store.set_status(batch_id, status, completed_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+    batch['status'] = status
+    return {k: batch[k] for k in ('batch_id', 'status', 'total', 'completed', 'failed')}
+
+@app.route('/speak-batch', methods=['POST'])
+@jwt_required
+def speak_batch():
+    """
+    Submit many documents as one job (see batch_items_from_request for the body).
+    Every item is validated before anything is queued: if any is invalid, the
+    response is 422 with the errors of all of them. Otherwise the batch is queued
+    as a single speak_batch_task and its id returned; poll /speak-batch/<batch_id>
+    (or /job/<batch_id>) for progress.
+    """
+    items, errors = batch_items_from_request()
+    if errors:
+        return jsonify({"error": "Invalid batch", "errors": errors}), 422
+    user, tenant = getattr(g, 'user', None), getattr(g, 'tenant', None)
+    batch_id = str(uuid.uuid4())
+    get_batch_store().create(batch_id, user, tenant, items)
+    log_job_history(batch_id, user, f'Batch of {len(items)} items', 'queued')
+    speak_batch_task.apply_async(args=[batch_id], task_id=batch_id)
+    return jsonify({"batch_id": batch_id, "status": "queued", "total": len(items)})
+
+@app.route('/speak-batch/<batch_id>', methods=['GET'])
+@jwt_required
+def get_speak_batch(batch_id):
+    """
+    Status of a batch with per-item status and results (file_path, url, duration, ... or error).
+    Only its submitter (or an admin) can see it; other users get a 404.
+    """
+    batch = get_batch_store().get(batch_id)
+    if batch is None or (batch['user'] != g.user and g.user not in ADMIN_USERS):
+        return jsonify({"error": "Batch not found."}), 404
+    return jsonify(batch)
+
+def catalog_csv_response(rows, filename):
+    """Stream catalog rows as a CSV attachment (same columns as the legacy catalog.csv)."""
+    def generate():
+        from io import StringIO
+        sio = StringIO()
+        writer = csv.DictWriter(sio, fieldnames=CATALOG_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for i, row in enumerate(rows, 1):
+            writer.writerow(row)
+            if i % 1000 == 0:
+                yield sio.getvalue()
+                sio.seek(0)
+                sio.truncate()
+        yield sio.getvalue()
+    return Response(generate(), mimetype='text/csv', headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
 @app.route('/catalog', methods=['GET'])
 def get_catalog():
     """
     Returns the catalog of generated audio files as a list of dicts (JSON) or as a CSV export.
     Supports filtering by user, tenant, date, format, and search by title.
-    Query params: user, tenant, date, format, title (substring match), page, page_size, export=csv
+    Query params: user, tenant, date, format, title (substring match), page, page_size, after_id, export=csv
+    Each result carries a stable 'id'. Pass after_id (the previous response's next_after_id)
+    for keyset pagination through large catalogs.
     """
-    if is_test_mode():
-        import tempfile
-        catalog_path = os.path.join(tempfile.gettempdir(), 'catalog.csv')
-    else:
-        catalog_path = os.path.join('outputs', 'catalog.csv')
-    if not os.path.isfile(catalog_path):
-        if request.args.get('export') == 'csv':
-            return Response('', mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename="catalog.csv"'})
-        return jsonify({'results': [], 'total': 0, 'page': 1, 'page_size': 20})
-    with open(catalog_path, 'r', newline='') as csvfile:
-        reader = csv.DictReader(csvfile)
-        catalog = list(reader)
-        fieldnames = reader.fieldnames
-    # Filtering
-    user = request.args.get('user')
-    tenant = request.args.get('tenant')
-    date = request.args.get('date')
-    fmt = request.args.get('format')
+    store = get_catalog_store()
+    filters = {field: request.args.get(field) for field in CatalogStore.FILTERS}
     title = request.args.get('title')
-    if user:
-        catalog = [row for row in catalog if row.get('user') == user]
-    if tenant:
-        catalog = [row for row in catalog if row.get('tenant') == tenant]
-    if date:
-        catalog = [row for row in catalog if row.get('date') == date]
-    if fmt:
-        catalog = [row for row in catalog if row.get('format') == fmt]
-    if title:
-        catalog = [row for row in catalog if row.get('title') and title.lower() in row['title'].lower()]
     # Export as CSV if requested
     if request.args.get('export') == 'csv':
-        from io import StringIO
-        sio = StringIO()
-        writer = csv.DictWriter(sio, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in catalog:
-            writer.writerow(row)
-        csv_data = sio.getvalue()
-        return Response(csv_data, mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename="catalog.csv"'})
+        return catalog_csv_response(store.iter_rows(filters, title), 'catalog.csv')
     # Pagination
     try:
         page = int(request.args.get('page', 1))
@@ -704,125 +3286,116 @@ def get_catalog():
         if page_size < 1: page_size = 20
     except Exception:
         page, page_size = 1, 20
-    total = len(catalog)
-    start = (page - 1) * page_size
-    end = start + page_size
-    paged = catalog[start:end]
-    return jsonify({'results': paged, 'total': total, 'page': page, 'page_size': page_size})
+    try:
+        after_id = int(request.args['after_id']) if request.args.get('after_id') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid after_id'}), 400
+    paged, total = store.query(filters, title, limit=page_size, offset=(page - 1) * page_size, after_id=after_id)
+    next_after_id = paged[-1]['id'] if len(paged) == page_size else None
+    return jsonify({'results': paged, 'total': total, 'page': page, 'page_size': page_size, 'next_after_id': next_after_id})
 
 @app.route('/catalog/<int:item_id>', methods=['DELETE'])
 def delete_catalog_item(item_id):
     """
-    Delete a catalog entry and its audio file by index (row number in catalog).
+    Delete a catalog entry and its audio file by catalog item id.
     """
-    if is_test_mode():
-        import tempfile
-        catalog_path = os.path.join(tempfile.gettempdir(), 'catalog.csv')
-    else:
-        catalog_path = os.path.join('outputs', 'catalog.csv')
-    if not os.path.isfile(catalog_path):
-        return jsonify({'error': 'Catalog not found'}), 404
-    with open(catalog_path, 'r', newline='') as csvfile:
-        rows = list(csv.DictReader(csvfile))
-    if item_id < 0 or item_id >= len(rows):
+    row = get_catalog_store().delete(item_id)
+    if row is None:
         return jsonify({'error': 'Invalid item_id'}), 404
-    file_path = rows[item_id].get('file_path')
+    file_path = row.get('file_path')
     # Remove audio file
     if file_path:
         abs_path = os.path.abspath(file_path.lstrip('/'))
         if os.path.isfile(abs_path):
             os.remove(abs_path)
-    # Remove row and rewrite catalog
-    del rows[item_id]
-    with open(catalog_path, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=['title', 'date', 'length', 'tone', 'prompt', 'voice', 'speed', 'pitch', 'format', 'quality', 'file_path', 'user', 'tenant', 's3_url'])
-        writer.writeheader()
-        writer.writerows(rows)
     return jsonify({'status': 'deleted', 'item_id': item_id})
 
 @app.route('/catalog/<int:item_id>', methods=['PUT'])
 def update_catalog_item(item_id):
     """
-    Update a catalog entry by index (row number in catalog).
+    Update a catalog entry by catalog item id.
     Accepts JSON body with any updatable fields (title, tone, prompt, voice, speed, pitch, format, quality).
     """
-    if is_test_mode():
-        import tempfile
-        catalog_path = os.path.join(tempfile.gettempdir(), 'catalog.csv')
-    else:
-        catalog_path = os.path.join('outputs', 'catalog.csv')
-    if not os.path.isfile(catalog_path):
-        return jsonify({'error': 'Catalog not found'}), 404
-    with open(catalog_path, 'r', newline='') as csvfile:
-        rows = list(csv.DictReader(csvfile))
-        fieldnames = csvfile.fieldnames if hasattr(csvfile, 'fieldnames') else rows[0].keys()
-    if item_id < 0 or item_id >= len(rows):
-        return jsonify({'error': 'Invalid item_id'}), 404
     data = request.get_json()
     updatable = ['title', 'tone', 'prompt', 'voice', 'speed', 'pitch', 'format', 'quality']
-    for field in updatable:
-        if field in data:
-            rows[item_id][field] = data[field]
-    with open(catalog_path, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
+    store = get_catalog_store()
+    if store.get(item_id) is None:
+        return jsonify({'error': 'Invalid item_id'}), 404
+    store.update(item_id, {field: data[field] for field in updatable if field in data})
     return jsonify({'status': 'updated', 'item_id': item_id})
 
+class ZipStreamSink(StreamSink):
+    """StreamSink that refuses every seek, so zipfile writes data descriptors instead of seeking back."""
+    def seek(self, offset, whence=io.SEEK_SET):
+        raise OSError('stream is not seekable')
+
+# Already-compressed formats are stored; deflating them costs CPU and saves nothing
+ZIP_STORED_EXTENSIONS = {'.mp3', '.ogg'}
+ZIP_READ_BYTES = 1024 * 1024
+
+def stream_zip(paths):
+    """
+    Yield a zip archive of paths piece by piece (entries named by basename).
+    Memory stays at about one ZIP_READ_BYTES block however many files there are;
+    entries and archives past the 4 GiB / 65535-entry limits use ZIP64.
+    """
+    sink = ZipStreamSink()
+    names = set()
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as zf:
+        for path in paths:
+            arcname = os.path.basename(path)
+            stem, ext = os.path.splitext(arcname)
+            counter = 1
+            while arcname in names:
+                arcname = f'{stem}-{counter}{ext}'
+                counter += 1
+            names.add(arcname)
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            info.compress_type = zipfile.ZIP_STORED if ext.lower() in ZIP_STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+            # from_file records the size, so zipfile switches the entry to ZIP64 when it needs to
+            with open(path, 'rb') as src, zf.open(info, 'w') as dst:
+                while True:
+                    block = src.read(ZIP_READ_BYTES)
+                    if not block:
+                        break
+                    dst.write(block)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
 @app.route('/catalog/batch', methods=['POST'])
 def catalog_batch():
     """
     Batch actions on catalog: download as zip, export as csv, batch update.
-    Expects JSON: { action: 'download'|'export_csv'|'edit', indices: [int], update: {field: value, ...} }
+    Expects JSON: { action: 'download'|'export_csv'|'edit', ids: [int], update: {field: value, ...} }
     """
     data = request.get_json()
+    if 'indices' in data:
+        # Row positions from the old list-backed catalog do not map onto catalog ids
+        return jsonify({'error': "'indices' is no longer supported; send catalog 'ids'"}), 400
     action = data.get('action')
-    indices = data.get('indices', [])
+    ids = data.get('ids', [])
     update = data.get('update', {})
-    if is_test_mode():
-        import tempfile
-        catalog_path = os.path.join(tempfile.gettempdir(), 'catalog.csv')
-    else:
-        catalog_path = os.path.join('outputs', 'catalog.csv')
-    if not os.path.isfile(catalog_path):
-        return jsonify({'error': 'Catalog not found'}), 404
-    with open(catalog_path, 'r', newline='') as csvfile:
-        rows = list(csv.DictReader(csvfile))
-        fieldnames = csvfile.fieldnames if hasattr(csvfile, 'fieldnames') else rows[0].keys()
-    selected = [rows[i] for i in indices if 0 <= i < len(rows)]
+    store = get_catalog_store()
     if action == 'download':
-        # Create zip of audio files
-        mem_zip = BytesIO()
-        with zipfile.ZipFile(mem_zip, 'w') as zf:
-            for row in selected:
-                file_path = row.get('file_path')
-                if file_path:
-                    abs_path = os.path.abspath(file_path.lstrip('/'))
-                    if os.path.isfile(abs_path):
-                        zf.write(abs_path, arcname=os.path.basename(abs_path))
-        mem_zip.seek(0)
-        return send_file(mem_zip, mimetype='application/zip', as_attachment=True, download_name='catalog_batch.zip')
-    elif action == 'export_csv':
-        from io import StringIO
-        sio = StringIO()
-        writer = csv.DictWriter(sio, fieldnames=fieldnames)
-        writer.writeheader()
+        selected = store.get_many(ids)
+        # Stream a zip of the audio files as they are read
+        paths = []
         for row in selected:
-            writer.writerow(row)
-        sio.seek(0)
-        return Response(sio.getvalue(), mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename="catalog_batch.csv"'})
+            file_path = row.get('file_path')
+            if file_path:
+                abs_path = os.path.abspath(file_path.lstrip('/'))
+                if os.path.isfile(abs_path):
+                    paths.append(abs_path)
+        return Response(stream_zip(paths), mimetype='application/zip', headers={
+            'Content-Disposition': 'attachment; filename="catalog_batch.zip"',
+        })
+    elif action == 'export_csv':
+        return catalog_csv_response(store.get_many(ids), 'catalog_batch.csv')
     elif action == 'edit':
         # Batch update fields
-        for i in indices:
-            if 0 <= i < len(rows):
-                for k, v in update.items():
-                    if k in rows[i]:
-                        rows[i][k] = v
-        with open(catalog_path, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(rows)
-        return jsonify({'status': 'updated', 'count': len(indices)})
+        store.update_many(ids, update)
+        return jsonify({'status': 'updated', 'count': len(ids)})
     else:
         return jsonify({'error': 'Invalid action'}), 400
 
@@ -834,41 +3407,121 @@ def safe_output_path(audio_path):
         abort(403)
     return full
 
+# Generated files are never rewritten in place, so clients may cache them indefinitely
+DOWNLOAD_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DOWNLOAD_READ_BYTES = 256 * 1024
+
+def iter_file_range(f, start, length):
+    """Yield length bytes of f from start in DOWNLOAD_READ_BYTES blocks, then close f."""
+    try:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(DOWNLOAD_READ_BYTES, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+    finally:
+        f.close()
+
+def file_range_body(file_path, start, length):
+    """
+    Response body for a byte range of a file. Servers that provide wsgi.file_wrapper
+    (gunicorn, uWSGI) send it with sendfile from the file's current offset for
+    Content-Length bytes, so the data never passes through Python.
+    """
+    f = open(file_path, 'rb')
+    wrapper = request.environ.get('wsgi.file_wrapper')
+    if wrapper is None:
+        return iter_file_range(f, start, length)
+    f.seek(start)
+    return wrapper(f, DOWNLOAD_READ_BYTES)
+
+def satisfiable_ranges(range_header, size):
+    """
+    Parse a Range header into [(start, end_exclusive), ...] clipped to size.
+    Returns None if there is no usable Range header (serve the whole file) and
+    [] if no range is satisfiable (416).
+    """
+    from werkzeug.http import parse_range_header
+    parsed = parse_range_header(range_header) if range_header else None
+    if parsed is None or parsed.units != 'bytes':
+        return None
+    ranges = []
+    for start, stop in parsed.ranges:
+        if start < 0:  # suffix range: the last -start bytes
+            start, stop = max(0, size + start), size
+        stop = size if stop is None else min(stop, size)
+        if start < stop:
+            ranges.append((start, stop))
+    return ranges
+
+def if_range_matches(etag, last_modified):
+    """True if there is no If-Range header or it names the current representation."""
+    if_range = request.if_range
+    if if_range.etag is None and if_range.date is None:
+        return True
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    return int(last_modified) <= int(if_range.date.timestamp())
+
 @app.route('/download/<path:audio_path>', methods=['GET'])
 def download_audio(audio_path):
     """
-    Stream audio file with Range support for preview/download.
+    Serve an audio file for preview/download.
+    Sends ETag/Last-Modified and answers If-None-Match/If-Modified-Since with 304.
+    Supports single, suffix (bytes=-N) and multiple ranges (multipart/byteranges),
+    honouring If-Range. Single ranges and whole files go out via the server's
+    file wrapper (sendfile) where available.
     """
+    from werkzeug.http import http_date, is_resource_modified, quote_etag
     file_path = safe_output_path(audio_path)
     if not os.path.isfile(file_path):
         return jsonify({'error': 'File not found'}), 404
-    file_size = os.path.getsize(file_path)
-    range_header = request.headers.get('Range', None)
-    if not range_header:
-        # No Range: send whole file
-        mime = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
-        return send_file(file_path, mimetype=mime, as_attachment=True, download_name=os.path.basename(file_path))
-    # Parse Range header
-    try:
-        match = re.match(r'bytes=(\d+)-(\d*)', range_header)
-        if not match:
-            return jsonify({'error': 'Invalid Range header'}), 416
-        start = int(match.group(1))
-        end = int(match.group(2)) if match.group(2) else file_size - 1
-        if start > end or end >= file_size:
-            return jsonify({'error': 'Range Not Satisfiable'}), 416
-        length = end - start + 1
-        with open(file_path, 'rb') as f:
-            f.seek(start)
-            data = f.read(length)
-        resp = Response(data, 206, mimetype=mimetypes.guess_type(file_path)[0] or 'application/octet-stream', direct_passthrough=True)
-        resp.headers.add('Content-Range', f'bytes {start}-{end}/{file_size}')
-        resp.headers.add('Accept-Ranges', 'bytes')
-        resp.headers.add('Content-Length', str(length))
-        resp.headers.add('Content-Disposition', f'inline; filename="{os.path.basename(file_path)}"')
-        return resp
-    except Exception as e:
-        return jsonify({'error': 'Failed to stream file', 'message': str(e)}), 500
+    st = os.stat(file_path)
+    size = st.st_size
+    etag = f'{st.st_mtime_ns:x}-{size:x}'
+    mime = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+    filename = os.path.basename(file_path)
+    headers = {
+        'ETag': quote_etag(etag),
+        'Last-Modified': http_date(st.st_mtime),
+        'Cache-Control': DOWNLOAD_CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+    }
+    if not is_resource_modified(request.environ, etag=etag, last_modified=headers['Last-Modified']):
+        return Response(status=304, headers=headers)
+    ranges = satisfiable_ranges(request.headers.get('Range'), size)
+    if ranges is not None and not if_range_matches(etag, st.st_mtime):
+        ranges = None  # the client's copy is stale: send the whole new file
+    if ranges is None:
+        headers['Content-Length'] = str(size)
+        headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return Response(file_range_body(file_path, 0, size), 200, mimetype=mime, headers=headers, direct_passthrough=True)
+    if not ranges:
+        headers['Content-Range'] = f'bytes */{size}'
+        return Response(json.dumps({'error': 'Range Not Satisfiable'}), 416, mimetype='application/json', headers=headers)
+    headers['Content-Disposition'] = f'inline; filename="{filename}"'
+    if len(ranges) == 1:
+        start, stop = ranges[0]
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+        headers['Content-Length'] = str(stop - start)
+        return Response(file_range_body(file_path, start, stop - start), 206, mimetype=mime, headers=headers, direct_passthrough=True)
+    # Several ranges: multipart/byteranges with an exact Content-Length
+    boundary = uuid.uuid4().hex
+    part_headers = [
+        f'--{boundary}\r\nContent-Type: {mime}\r\nContent-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n'.encode()
+        for start, stop in ranges
+    ]
+    closing = f'--{boundary}--\r\n'.encode()
+    headers['Content-Length'] = str(sum(len(h) + (stop - start) + 2 for h, (start, stop) in zip(part_headers, ranges)) + len(closing))
+    def generate():
+        for part_header, (start, stop) in zip(part_headers, ranges):
+            yield part_header
+            yield from iter_file_range(open(file_path, 'rb'), start, stop - start)
+            yield b'\r\n'
+        yield closing
+    return Response(generate(), 206, content_type=f'multipart/byteranges; boundary={boundary}', headers=headers, direct_passthrough=True)
 
 @app.route('/s3/list', methods=['GET'])
 def s3_list():
@@ -882,7 +3535,7 @@ def s3_list():
     if not s3_bucket:
         return jsonify({'error': 'S3_BUCKET not configured'}), 400
     try:
-        s3 = boto3.client('s3')
+        s3 = get_s3_client()
         kwargs = {'Bucket': s3_bucket, 'Prefix': s3_prefix, 'MaxKeys': max_keys}
         if start_after:
             kwargs['StartAfter'] = start_after
@@ -898,6 +3551,8 @@ def s3_list():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+S3_STREAM_CHUNK_BYTES = 256 * 1024
+
 @app.route('/s3/download', methods=['GET'])
 def s3_download():
     """
@@ -907,16 +3562,51 @@ def s3_download():
     key = request.args.get('key')
     if not s3_bucket or not key:
         return jsonify({'error': 'Missing S3_BUCKET or key'}), 400
+    # Range and If-None-Match are passed to S3, so seeking and revalidation work end to end
+    params = {'Bucket': s3_bucket, 'Key': key}
+    if request.headers.get('Range'):
+        params['Range'] = request.headers['Range']
+    if request.headers.get('If-None-Match'):
+        params['IfNoneMatch'] = request.headers['If-None-Match']
     try:
-        s3 = boto3.client('s3')
-        obj = s3.get_object(Bucket=s3_bucket, Key=key)
-        data = obj['Body'].read()
-        filename = os.path.basename(key)
-        return Response(data, mimetype='application/octet-stream', headers={
-            'Content-Disposition': f'attachment; filename="{filename}"'
-        })
+        from botocore.exceptions import ClientError
+        s3 = get_s3_client()
+        obj = s3.get_object(**params)
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code')
+        status = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        if code == '304' or status == 304:
+            return Response(status=304, headers={'ETag': request.headers['If-None-Match']})
+        if code in ('NoSuchKey', '404'):
+            return jsonify({'error': 'Not found'}), 404
+        if code == 'InvalidRange':
+            return jsonify({'error': 'Requested range not satisfiable'}), 416
+        return jsonify({'error': str(e)}), 500
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    body = obj['Body']
+    def generate():
+        # Stream the object in fixed-size blocks instead of reading it into memory
+        for block in body.iter_chunks(chunk_size=S3_STREAM_CHUNK_BYTES):
+            yield block
+    filename = os.path.basename(key)
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Content-Length': str(obj['ContentLength']),
+        'Accept-Ranges': 'bytes',
+    }
+    if obj.get('ETag'):
+        headers['ETag'] = obj['ETag']
+    if obj.get('LastModified'):
+        headers['Last-Modified'] = obj['LastModified'].strftime('%a, %d %b %Y %H:%M:%S GMT')
+    if obj.get('ContentRange'):
+        headers['Content-Range'] = obj['ContentRange']
+    # Not direct_passthrough: that hands the bare generator to the server and skips close callbacks
+    response = Response(generate(), status=206 if obj.get('ContentRange') else 200,
+                        mimetype='application/octet-stream', headers=headers)
+    # Return the S3 connection to the pool even if the response is dropped before the first block
+    response.call_on_close(body.close)
+    return response
 
 @app.route('/s3/delete', methods=['POST'])
 def s3_delete():
@@ -929,7 +3619,7 @@ def s3_delete():
     if not s3_bucket or not key:
         return jsonify({'error': 'Missing S3_BUCKET or key'}), 400
     try:
-        s3 = boto3.client('s3')
+        s3 = get_s3_client()
         s3.delete_object(Bucket=s3_bucket, Key=key)
         return jsonify({'status': 'deleted', 'key': key})
     except Exception as e:
@@ -943,33 +3633,119 @@ ADMIN_USERS = {'alice'}  # Set of usernames with admin rights
 def admin_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        auth = request.headers.get('Authorization', None)
-        if not auth or not auth.startswith('Bearer '):
-            return jsonify({'error': 'Missing or invalid Authorization header'}), 401
-        token = auth.split(' ', 1)[1]
-        try:
-            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
-            user = payload['user']
-            if user not in ADMIN_USERS:
-                return jsonify({'error': 'Admin access required'}), 403
-        except Exception as e:
-            return jsonify({'error': 'Invalid token', 'message': str(e)}), 401
+        claims, error = authenticate_request()
+        if error:
+            return error
+        if claims['user'] not in ADMIN_USERS:
+            return jsonify({'error': 'Admin access required'}), 403
+        g.user = claims['user']
+        g.tenant = claims.get('tenant')
         return f(*args, **kwargs)
     return decorated
 
+@app.route('/admin/scheduler', methods=['GET'])
+@admin_required
+def admin_scheduler():
+    """Micro-batching scheduler statistics (queue depth, batch sizes, wait times)."""
+    if tts_scheduler is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **tts_scheduler.stats()})
+
+@app.route('/admin/warmup', methods=['POST'])
+@admin_required
+def admin_warmup():
+    """Start loading the TTS model now; poll /ready for completion."""
+    if MODEL_STATE['status'] != 'ready':
+        warmup_model()
+    return jsonify(dict(MODEL_STATE)), 202
+
+@app.route('/admin/cache', methods=['GET'])
+@admin_required
+def admin_cache():
+    """Synthesis result cache statistics (hit/miss counters, size)."""
+    cache = get_synthesis_cache()
+    if cache is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **cache.stats()})
+
 USERS_PATH = os.path.join('outputs', 'users.json')
 AUDIT_LOG_PATH = os.path.join('outputs', 'audit_log.csv')
 
+class UserStore:
+    """
+    users.json, parsed once and re-read only when the file changes (mtime, size or inode).
+    The file is re-checked at most every recheck_seconds, so a save_users in another
+    process (e.g. deleting a user) takes effect everywhere within that interval.
+    Falls back to the built-in USERS when the file does not exist.
+    """
+    def __init__(self, path, defaults, recheck_seconds=1.0):
+        self.path = path
+        self.defaults = defaults
+        self.recheck_seconds = recheck_seconds
+        self._users = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _current(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._users is None or now - self._checked_at >= self.recheck_seconds:
+                self._checked_at = now
+                signature = self._stat_signature()
+                if self._users is None or signature != self._signature:
+                    if signature is None:
+                        self._users = {name: dict(record) for name, record in self.defaults.items()}
+                    else:
+                        with open(self.path, 'r') as f:
+                            self._users = json.load(f)
+                    self._signature = signature
+            return self._users
+
+    def get(self, username):
+        """One user's record, or None."""
+        record = self._current().get(username)
+        return dict(record) if record is not None else None
+
+    def load(self):
+        """All users, as a copy the caller may modify and pass to save()."""
+        return {name: dict(record) for name, record in self._current().items()}
+
+    def save(self, users):
+        # Write atomically so other processes never read a half-written file
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(users, f)
+        os.replace(tmp_path, self.path)
+        with self._lock:
+            self._users = {name: dict(record) for name, record in users.items()}
+            self._signature = self._stat_signature()
+            self._checked_at = time.monotonic()
+
+_user_store = None
+_user_store_lock = threading.Lock()
+
+def get_user_store():
+    """The process-wide user store. USERS_RECHECK_SECONDS sets how often users.json is re-checked."""
+    global _user_store
+    with _user_store_lock:
+        if _user_store is None:
+            _user_store = UserStore(USERS_PATH, USERS, recheck_seconds=float(os.environ.get('USERS_RECHECK_SECONDS', 1.0)))
+        return _user_store
+
 def load_users():
-    if os.path.isfile(USERS_PATH):
-        with open(USERS_PATH, 'r') as f:
-            return json.load(f)
-    return USERS.copy()
+    return get_user_store().load()
 
 def save_users(users):
-    os.makedirs(os.path.dirname(USERS_PATH), exist_ok=True)
-    with open(USERS_PATH, 'w') as f:
-        json.dump(users, f)
+    get_user_store().save(users)
 
 def log_audit(action, user, details=None):
     os.makedirs(os.path.dirname(AUDIT_LOG_PATH), exist_ok=True)
@@ -1041,5 +3817,74 @@ def admin_audit_log():
         log = list(reader)
     return jsonify({'log': log})
 
+def spectral_similarity(audio_a, sr_a, audio_b, sr_b, frame=1024):
+    """
+    Cosine similarity of the long-term log-magnitude spectra of two clips (1.0 = identical).
+    Dia samples its output, so two runs never match sample for sample; comparing
+    spectra instead of waveforms tolerates that while still catching a degraded variant.
+    """
+    a = as_float32_audio(audio_a)
+    b = resample_audio(as_float32_audio(audio_b), sr_b, sr_a)
+    spectra = []
+    for x in (a, b):
+        x = x.mean(axis=1) if x.ndim == 2 else x
+        x = np.pad(x, (0, max(0, frame - len(x))))
+        frames = np.lib.stride_tricks.sliding_window_view(x, frame)[::frame // 2]
+        spectra.append(np.log1p(np.abs(np.fft.rfft(frames * np.hanning(frame), axis=1)).mean(axis=0)))
+    norm_a, norm_b = np.linalg.norm(spectra[0]), np.linalg.norm(spectra[1])
+    if not norm_a or not norm_b:
+        return 1.0 if norm_a == norm_b else 0.0  # silence only matches silence
+    return float(spectra[0] @ spectra[1] / (norm_a * norm_b))
+
+def compare_tts_backends(names, texts, baseline=None):
+    """
+    Load each backend in TTS_BACKENDS and synthesize texts with it.
+    Returns one row per backend: load time, synthesis time, real-time factor
+    (synthesis seconds per second of audio) and spectral similarity to the baseline,
+    which is the first name unless one is given.
+    """
+    baseline = baseline or names[0]
+    order = [baseline] + [n for n in names if n != baseline]
+    reference = None
+    rows = []
+    for name in order:
+        start = time.perf_counter()
+        backend = TTS_BACKENDS[name]()
+        load_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        outputs = [unpack_audio(backend(text)) for text in texts]
+        synth_seconds = time.perf_counter() - start
+        audio_seconds = sum(len(as_float32_audio(a)) / sr for a, sr in outputs)
+        if reference is None:
+            reference = outputs
+        similarity = float(np.mean([spectral_similarity(a, sr, b, sr_b) for (a, sr), (b, sr_b) in zip(reference, outputs)]))
+        rows.append({
+            'backend': name,
+            'load_seconds': round(load_seconds, 3),
+            'synth_seconds': round(synth_seconds, 3),
+            'audio_seconds': round(audio_seconds, 3),
+            'rtf': round(synth_seconds / audio_seconds, 4) if audio_seconds else None,
+            'similarity': round(similarity, 4),
+        })
+        del backend
+    return rows
+
+@app.cli.command('compare-backends')
+@click.option('--backends', default='dia,dia-int8,dia-bf16,dia-compiled', help='Comma-separated TTS_BACKENDS names; the first is the baseline.')
+@click.option('--text', 'texts', multiple=True, help='Text to synthesize (repeatable).')
+def compare_backends_command(backends, texts):
+    """Report real-time factor and similarity to the baseline for each TTS backend."""
+    names = [n.strip() for n in backends.split(',') if n.strip()]
+    unknown = [n for n in names if n not in TTS_BACKENDS]
+    if unknown:
+        raise click.BadParameter(f"unknown backends: {', '.join(unknown)}", param_hint='--backends')
+    texts = list(texts) or ["[S1] Dia is an open weights text to dialogue model. [S2] You get full control over scripts and voices."]
+    click.echo(f"{'backend':14s} {'load s':>8s} {'synth s':>8s} {'audio s':>8s} {'rtf':>8s} {'similarity':>10s}")
+    for row in compare_tts_backends(names, texts):
+        click.echo(f"{row['backend']:14s} {row['load_seconds']:8.2f} {row['synth_seconds']:8.2f} {row['audio_seconds']:8.2f} {row['rtf'] or 0:8.3f} {row['similarity']:10.4f}")
+
 if __name__ == '__main__':
+    # Load the model in the background while the server starts answering requests
+    if os.environ.get('TTS_WARMUP', '1') == '1':
+        warmup_model()
     app.run(host='0.0.0.0', port=8000)
@@ -3,6 +3,7 @@ import tempfile
 import pytest
 import json
 from src.app import app
+import src.app as app_module
 
 def get_jwt_token(client, username, password):
     resp = client.post('/login', json={'username': username, 'password': password})
@@ -50,3 +51,782 @@ def test_rate_limit(client):
         client.post('/speak', json={'text': 'Rate limit test'}, headers={'Authorization': f'Bearer {token}'})
     resp = client.post('/speak', json={'text': 'Rate limit test'}, headers={'Authorization': f'Bearer {token}'})
     assert resp.status_code == 429
+
+class RecordingTTS(app_module.BaseTTS):
+    """Returns audio whose length encodes the input text, recording each call."""
+    def __init__(self, fail_batch=False):
+        self.calls = []
+        self.fail_batch = fail_batch
+    def __call__(self, text, **kwargs):
+        self.calls.append(('single', [text]))
+        return {"audio": app_module.np.full(len(text), 0.1, dtype=app_module.np.float32), "sampling_rate": 22050}
+    def batch(self, texts, batch_size=None, **kwargs):
+        if self.fail_batch:
+            raise RuntimeError('no batching')
+        self.calls.append(('batch', list(texts)))
+        return [{"audio": app_module.np.full(len(t), 0.1, dtype=app_module.np.float32), "sampling_rate": 22050} for t in texts]
+
+def test_synthesize_chunks_batches_in_order(monkeypatch):
+    backend = RecordingTTS()
+    monkeypatch.setattr(app_module, 'tts_pipeline', backend)
+    chunks = ['a' * n for n in range(1, 8)]
+    segments = app_module.synthesize_chunks(chunks, {}, batch_size=3)
+    assert [len(arr) for arr, _ in segments] == list(range(1, 8))
+    assert [kind for kind, _ in backend.calls] == ['batch', 'batch', 'single']
+
+def test_synthesize_chunks_falls_back_to_single_calls(monkeypatch):
+    backend = RecordingTTS(fail_batch=True)
+    monkeypatch.setattr(app_module, 'tts_pipeline', backend)
+    segments = app_module.synthesize_chunks(['aa', 'b', 'ccc'], {}, batch_size=2)
+    assert [len(arr) for arr, _ in segments] == [2, 1, 3]
+    assert all(kind == 'single' for kind, _ in backend.calls)
+
+def test_micro_batcher_groups_matching_settings(monkeypatch):
+    backend = RecordingTTS()
+    monkeypatch.setattr(app_module, 'tts_pipeline', backend)
+    batcher = app_module.MicroBatcher(max_wait_ms=200, max_batch_size=3)
+    futures = [batcher.submit('a' * n, voice='v1') for n in (1, 2, 3)]
+    futures.append(batcher.submit('bbbb', voice='v2'))
+    assert [len(f.result(timeout=5)[0]) for f in futures] == [1, 2, 3, 4]
+    assert ('batch', ['a', 'aa', 'aaa']) in backend.calls
+    assert ('single', ['bbbb']) in backend.calls
+    stats = batcher.stats()
+    assert stats['queue_depth'] == 0 and stats['batches'] == 2
+    assert stats['batch_size_histogram'] == {'1': 1, '3': 1}
+
+def test_synthesis_cache_hits_and_single_flight(tmp_path):
+    import threading
+    cache = app_module.SynthesisCache(str(tmp_path / 'cache'), max_bytes=10 ** 6)
+    key = cache.make_key('Hello   world', {'format': 'wav'})
+    assert key == cache.make_key('Hello world', {'format': 'wav'})
+    calls = []
+    release = threading.Event()
+    def produce(path):
+        calls.append(path)
+        release.wait(5)
+        with open(path, 'wb') as f:
+            f.write(b'audio')
+        return 1.5
+    results = {}
+    def request(i):
+        results[i] = cache.get_or_create(key, str(tmp_path / f'out{i}.wav'), produce)
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(3)]
+    for t in threads:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert len(calls) == 1
+    assert sorted(cached for _, cached in results.values()) == [False, True, True]
+    assert all((tmp_path / f'out{i}.wav').read_bytes() == b'audio' for i in range(3))
+    # A fresh instance sees the persisted index
+    reopened = app_module.SynthesisCache(str(tmp_path / 'cache'), max_bytes=10 ** 6)
+    assert reopened.get_or_create(key, str(tmp_path / 'out3.wav'), produce) == (1.5, True)
+    assert reopened.stats()['disk_hits'] == 1
+
+def test_output_paths_are_reserved_and_links_replace_them(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'get_output_dir', lambda: str(tmp_path))
+    first, _ = app_module.allocate_output_file('Same text', 'wav')
+    second, _ = app_module.allocate_output_file('Same text', 'wav')
+    assert first != second and os.path.getsize(first) == 0 and os.path.getsize(second) == 0
+    cache = app_module.SynthesisCache(str(tmp_path / 'cache'), max_bytes=10 ** 6)
+    def produce(path):
+        with open(path, 'wb') as f:
+            f.write(b'audio')
+        return 1.0
+    key = cache.make_key('Same text', {'format': 'wav'})
+    assert cache.get_or_create(key, first, produce) == (1.0, False)
+    # A hit replaces the reserved (empty) file, and linking a file onto itself is a no-op
+    assert cache.get_or_create(key, second, produce) == (1.0, True)
+    assert open(second, 'rb').read() == b'audio'
+    assert cache.get_or_create(key, first, produce) == (1.0, True)
+    assert open(first, 'rb').read() == b'audio'
+    app_module.release_output_file(second)
+    assert set(os.listdir(tmp_path)) == {'cache', os.path.basename(first)}
+
+def test_synthesis_cache_evicts_by_size(tmp_path):
+    cache = app_module.SynthesisCache(str(tmp_path / 'cache'), max_bytes=10)
+    def produce(path):
+        with open(path, 'wb') as f:
+            f.write(b'x' * 6)
+        return 1.0
+    for i in range(3):
+        cache.get_or_create(f'k{i}', str(tmp_path / f'out{i}.wav'), produce)
+    stats = cache.stats()
+    assert stats['entries'] == 1 and stats['bytes'] == 6 and stats['evictions'] == 2
+
+def test_tts_task_synthesizes_and_catalogs():
+    result = app_module.tts_task.apply(args=['Async task synthesis test', {'format': 'wav'}], kwargs={'user': 'alice', 'tenant': 'org1'}).get()
+    assert result['status'] == 'complete'
+    assert result['url'].endswith('.wav')
+    assert os.path.isfile(os.path.normpath(os.path.join('outputs', result['file_path'][len('/outputs/'):])))
+
+def test_tts_fanout_parts_assemble_in_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'tts_pipeline', RecordingTTS())
+    parts = [
+        app_module.tts_chunk_task.apply(args=[chunk, {}, str(tmp_path / f'{i:05d}.npy')]).get()
+        for i, chunk in enumerate(['aaa', 'b', 'cc'])
+    ]
+    result = app_module.tts_assemble_task.apply(args=[parts, 'aaa b cc', {'format': 'wav'}, 'alice', 'org1', str(tmp_path)]).get()
+    assert result['status'] == 'complete' and result['cached'] is False
+    assert not tmp_path.exists()
+
+def test_speak_stream_wav_and_ogg(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'tts_pipeline', RecordingTTS())
+    monkeypatch.setattr(app_module, 'chunk_text_for_tts', lambda text: ['aaaa', 'bb', 'cccccc'])
+    token = app_module.create_token('alice', 'org1')
+    headers = {'Authorization': f'Bearer {token}'}
+    resp = client.post('/speak-stream', json={'text': 'Stream me', 'format': 'wav'}, headers=headers)
+    assert resp.status_code == 200 and resp.mimetype == 'audio/wav'
+    body = resp.get_data()
+    assert body[:4] == b'RIFF' and len(body) == 44 + 2 * 12
+    assert resp.headers['X-File-Path'].endswith('.wav')
+    resp = client.post('/speak-stream', json={'text': 'Stream me', 'format': 'ogg'}, headers=headers)
+    assert resp.get_data()[:4] == b'OggS'
+    # Raw PCM carries its rate, which the first chunk fixed, in the content type
+    resp = client.post('/speak-stream', json={'text': 'Stream me', 'format': 'pcm'}, headers=headers)
+    assert resp.headers['Content-Type'] == 'audio/L16;rate=22050;channels=1' and resp.headers['X-Sample-Rate'] == '22050'
+    assert len(resp.get_data()) == 2 * 12
+    # A client that disconnects mid-stream leaves no partial file behind
+    resp = client.post('/speak-stream', json={'text': 'Stream me', 'format': 'ogg'}, headers=headers, buffered=False)
+    output_file = os.path.join('outputs', resp.headers['X-File-Path'][len('/outputs/'):])
+    next(iter(resp.response))
+    assert os.path.exists(output_file + '.part')
+    resp.close()
+    assert not os.path.exists(output_file + '.part') and not os.path.exists(output_file)
+
+def test_assemble_audio_resamples_and_crossfades():
+    np = app_module.np
+    a = (np.ones(1000, dtype=np.float32) * 0.5, 1000)
+    b = (np.full(500, 16384, dtype=np.int16), 500)  # half scale, half the rate
+    audio, sr = app_module.assemble_audio([a, b], crossfade_ms=0)
+    assert sr == 1000 and audio.dtype == np.float32 and len(audio) == 2000
+    assert np.allclose(audio, 0.5)
+    audio, _ = app_module.assemble_audio([(np.zeros(1000, dtype=np.float32), 1000), (np.ones(1000, dtype=np.float32), 1000)], crossfade_ms=100)
+    assert len(audio) == 1900
+    fade = audio[900:1000]
+    assert fade[0] == 0.0 and fade[-1] == 1.0 and np.all(np.diff(fade) > 0)
+
+@pytest.mark.parametrize('fmt', ['mp3', 'ogg'])
+def test_save_audio_with_format_encodes_in_memory(tmp_path, fmt):
+    import soundfile as sf
+    np = app_module.np
+    if app_module.SOUNDFILE_CODECS[fmt][0] not in sf.available_formats():
+        pytest.skip(f'libsndfile built without {fmt}')
+    t = np.arange(44100) / 44100
+    audio = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    sizes = {}
+    for quality in ('low', 'high'):
+        out = tmp_path / f'{quality}.{fmt}'
+        app_module.save_audio_with_format(audio, 44100, str(out), fmt, quality)
+        sizes[quality] = out.stat().st_size
+        assert sf.info(str(out)).samplerate == 44100
+    assert sizes['low'] < sizes['high']
+    assert sorted(os.listdir(tmp_path)) == [f'high.{fmt}', f'low.{fmt}']
+
+def test_mp3_compression_level_follows_mpeg_bitrate_ranges():
+    level = app_module.mp3_compression_level
+    assert level(320, 44100) == 0.0 and level(32, 44100) == 1.0
+    assert level(160, 22050) == 0.0 and level(192, 22050) == 0.0 and level(8, 22050) == 1.0
+    # MPEG-2.5 (below 16 kHz) tops out at 64 kbps
+    assert level(64, 11025) == 0.0 and level(128, 8000) == 0.0 and level(36, 11025) == 0.5
+
+def test_missing_native_codecs_are_probed_once_and_fall_back(monkeypatch, capsys):
+    monkeypatch.setattr(app_module.sf, 'available_formats', lambda: {'WAV': 'Microsoft WAV', 'OGG': 'OGG'})
+    assert app_module.probe_native_codecs() == {'ogg'}
+    assert '[AUDIO WARNING]' in capsys.readouterr().out
+    monkeypatch.setattr(app_module, 'NATIVE_CODECS', {'ogg'})
+    assert app_module.soundfile_codec_args('mp3', 44100, 'medium') is None
+    assert app_module.soundfile_codec_args('ogg', 44100, 'medium')['format'] == 'OGG'
+
+def test_catalog_store_migrates_csv_and_searches(tmp_path):
+    import csv
+    legacy = tmp_path / 'catalog.csv'
+    with open(legacy, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=app_module.CATALOG_FIELDS)
+        writer.writeheader()
+        for i, title in enumerate(['Moby Dick', 'The Odyssey', '', 'Dickens Reader']):
+            writer.writerow({'title': title, 'user': 'alice' if i % 2 == 0 else 'bob', 'format': 'wav'})
+    store = app_module.CatalogStore(str(tmp_path / 'catalog.db'), legacy_csv_path=str(legacy))
+    assert not legacy.exists() and (tmp_path / 'catalog.csv.migrated').exists()
+    rows, total = store.query()
+    assert total == 4 and [r['id'] for r in rows] == [1, 2, 3, 4]
+    assert rows[2]['title'] == '' and rows[0]['speed'] == ''
+    assert [r['title'] for r in store.query(title='DICK')[0]] == ['Moby Dick', 'Dickens Reader']
+    assert [r['title'] for r in store.query(title='dy')[0]] == ['The Odyssey']
+    assert store.query({'user': 'alice'}, title='dick')[1] == 1
+    # Ids stay stable when earlier rows are deleted
+    store.delete(1)
+    page, total = store.query(limit=2, after_id=2)
+    assert total == 3 and [r['id'] for r in page] == [3, 4]
+    store.update_many([3, 4], {'title': 'Renamed'})
+    assert [r['id'] for r in store.query(title='renamed')[0]] == [3, 4]
+
+def test_catalog_endpoint_ids_and_csv_export(client):
+    item_id = app_module.log_metadata({'title': 'Endpoint catalog item', 'user': 'carol', 'format': 'mp3'})
+    data = client.get('/catalog?user=carol&title=endpoint catalog').get_json()
+    assert [row['id'] for row in data['results']] == [item_id]
+    assert client.put(f'/catalog/{item_id}', json={'tone': 'calm'}).status_code == 200
+    csv_text = client.get('/catalog?user=carol&export=csv').get_data(as_text=True)
+    assert csv_text.splitlines()[0] == ','.join(app_module.CATALOG_FIELDS)
+    assert 'Endpoint catalog item' in csv_text and 'calm' in csv_text
+    assert client.delete(f'/catalog/{item_id}').status_code == 200
+    assert client.delete(f'/catalog/{item_id}').status_code == 404
+
+def test_job_store_updates_in_place_and_skips_no_ops(tmp_path):
+    store = app_module.JobStore(str(tmp_path / 'jobs.db'))
+    other_process = app_module.JobStore(str(tmp_path / 'jobs.db'))
+    store.add('j1', 'alice', 'one', 'queued')
+    store.add('j2', 'bob', 'two', 'queued')
+    assert store.update_status('j1', 'pending') is True
+    assert store.update_status('j1', 'pending') is False
+    assert other_process.update_status('j1', 'pending') is False
+    assert store.update_status('j1', 'complete', result_url='u', completed_at='2024-01-01 00:00:00') is True
+    assert other_process.update_status('j1', 'complete', result_url='u', completed_at='2024-01-02 00:00:00') is False
+    rows, total = other_process.list(user='alice', status='complete')
+    assert total == 1 and rows[0]['completed_at'] == '2024-01-01 00:00:00' and rows[0]['result_url'] == 'u'
+    assert [r['job_id'] for r in store.list()[0]] == ['j1', 'j2']
+
+def test_liveness_and_readiness(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'tts_pipeline', None)
+    monkeypatch.setattr(app_module, 'MODEL_STATE', dict(app_module.MODEL_STATE, status='not_loaded'))
+    assert client.get('/health').status_code == 200
+    resp = client.get('/ready')
+    assert resp.status_code == 503 and resp.get_json()['ready'] is False
+    # Catalog does not need the model
+    assert client.get('/catalog').status_code == 200
+    assert app_module.tts_pipeline is None
+    app_module.warmup_model(background=False)
+    resp = client.get('/ready')
+    assert resp.status_code == 200 and resp.get_json()['backend'] == 'DummyTTS'
+
+class PidTTS(app_module.BaseTTS):
+    """Returns audio filled with the pid of the process that synthesized it."""
+    def __call__(self, text, **kwargs):
+        return {"audio": app_module.np.full(len(text), os.getpid(), dtype=app_module.np.int64), "sampling_rate": 16000}
+
+def test_inference_pool_spreads_batches_over_workers():
+    pool = app_module.InferencePool(PidTTS(), workers=2).start()
+    try:
+        results = pool.batch(['a' * n for n in range(1, 7)])
+        assert [len(r['audio']) for r in results] == list(range(1, 7))
+        pids = {int(r['audio'][0]) for r in results}
+        assert len(pids) == 2 and os.getpid() not in pids
+        single = pool('hello')
+        assert len(single['audio']) == 5 and single['sampling_rate'] == 16000
+    finally:
+        pool.close()
+
+def test_compare_backends_reports_rtf_and_similarity(monkeypatch):
+    class ToneTTS(app_module.BaseTTS):
+        def __call__(self, text, **kwargs):
+            t = app_module.np.arange(16000) / 16000
+            return {"audio": app_module.np.sin(2 * app_module.np.pi * 440 * t).astype(app_module.np.float32), "sampling_rate": 16000}
+    monkeypatch.setitem(app_module.TTS_BACKENDS, 'tone', ToneTTS)
+    rows = app_module.compare_tts_backends(['dummy', 'tone'], ['hello'], baseline='tone')
+    assert [r['backend'] for r in rows] == ['tone', 'dummy']
+    assert rows[0]['similarity'] == pytest.approx(1.0)
+    assert rows[1]['similarity'] < 0.5
+    assert rows[0]['audio_seconds'] == pytest.approx(1.0) and rows[0]['rtf'] is not None
+    result = app.test_cli_runner().invoke(args=['compare-backends', '--backends', 'tone,dummy', '--text', 'hi'])
+    assert result.exit_code == 0 and 'tone' in result.output
+
+def test_metrics_endpoint_reports_stages_and_requests(client, monkeypatch):
+    monkeypatch.setattr(app_module, '_rate_limiter', app_module.MemoryRateLimiter())
+    registry = app_module.prometheus_client.REGISTRY
+    in_flight_before = registry.get_sample_value('speechforge_requests_in_flight', {'endpoint': 'speak'}) or 0
+    token = client.post('/login', json={'username': 'bob', 'password': 'password456'}).get_json()['token']
+    resp = client.post('/speak', json={'text': f'Metrics test {os.urandom(4).hex()}', 'format': 'wav'}, headers={'Authorization': f'Bearer {token}'})
+    assert resp.status_code == 200
+    resp.close()  # the WSGI server closes responses; that ends the in-flight/latency timing
+    body = client.get('/metrics').get_data(as_text=True)
+    for stage in ('chunk', 'inference', 'assemble', 'encode', 'catalog'):
+        assert f'speechforge_stage_seconds_count{{stage="{stage}"}}' in body
+    assert 'speechforge_requests_total{backend="dummy",endpoint="speak",format="wav",status="200"}' in body
+    assert 'speechforge_characters_synthesized_total{backend="dummy"}' in body
+    assert registry.get_sample_value('speechforge_requests_in_flight', {'endpoint': 'speak'}) == in_flight_before
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+    def __call__(self):
+        return self.now
+
+class FakeRedis:
+    """Just enough of redis-py for RedisRateLimiter (expiry is not simulated)."""
+    def __init__(self):
+        self.data = {}
+    def get(self, key):
+        return self.data.get(key)
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+    def decr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) - 1
+        return self.data[key]
+    def pipeline(self, transaction=True):
+        redis, ops = self, []
+        class Pipeline:
+            def __getattr__(self, name):
+                return lambda *args: ops.append((name, args))
+            def execute(self):
+                return [None if name == 'expire' else getattr(redis, name)(*args) for name, args in ops]
+        return Pipeline()
+
+@pytest.mark.parametrize('make_limiter', [
+    lambda clock: app_module.MemoryRateLimiter(clock=clock),
+    lambda clock: app_module.RedisRateLimiter(FakeRedis(), clock=clock),
+])
+def test_rate_limiter_sliding_window(make_limiter):
+    clock = FakeClock(1200.0)  # start of a 60 s window
+    limiter = make_limiter(clock)
+    results = [limiter.hit('user:bob', 10, 60) for _ in range(11)]
+    assert [r.allowed for r in results] == [True] * 10 + [False]
+    assert results[0].remaining == 9 and results[9].remaining == 0
+    assert results[10].retry_after == 66  # next window, plus until the weighted count drops to 9
+    # Halfway into the next window half of the previous window still counts
+    clock.now = 1290.0
+    assert [limiter.hit('user:bob', 10, 60).allowed for _ in range(6)] == [True] * 5 + [False]
+    assert limiter.hit('user:alice', 10, 60).allowed
+
+def test_redis_rate_limiter_is_shared_between_processes():
+    redis, clock = FakeRedis(), FakeClock(1200.0)
+    first, second = app_module.RedisRateLimiter(redis, clock=clock), app_module.RedisRateLimiter(redis, clock=clock)
+    allowed = [(first if i % 2 else second).hit('user:bob', 4, 60).allowed for i in range(6)]
+    assert allowed == [True] * 4 + [False] * 2
+    assert redis.get('ratelimit:user:bob:60:20') == 4
+
+def test_memory_rate_limiter_drops_idle_keys():
+    clock = FakeClock(1200.0)
+    limiter = app_module.MemoryRateLimiter(max_keys=3, clock=clock)
+    for user in 'abcd':
+        limiter.hit(f'user:{user}', 10, 60)
+    assert list(limiter._windows) == ['user:b', 'user:c', 'user:d']
+    clock.now += 180
+    limiter.hit('user:e', 10, 60)
+    assert list(limiter._windows) == ['user:e']
+
+def test_rate_limit_headers_and_tenant_limits(client, monkeypatch):
+    monkeypatch.setattr(app_module, '_rate_limiter', app_module.MemoryRateLimiter())
+    monkeypatch.setitem(app_module.RATE_LIMIT_TENANTS, 'org2', 2)
+    token = get_jwt_token(client, 'bob', 'password456')
+    headers = {'Authorization': f'Bearer {token}'}
+    ok = client.post('/speak', json={'text': 'Tenant limit'}, headers=headers)
+    assert ok.status_code == 200
+    assert ok.headers['RateLimit-Limit'] == '2' and ok.headers['RateLimit-Remaining'] == '1'
+    client.post('/speak', json={'text': 'Tenant limit'}, headers=headers)
+    limited = client.post('/speak', json={'text': 'Tenant limit'}, headers=headers)
+    assert limited.status_code == 429
+    assert int(limited.headers['Retry-After']) >= 1 and limited.headers['RateLimit-Remaining'] == '0'
+
+def test_token_cache_verifies_each_token_once(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'token_cache', app_module.TokenCache())
+    decoded = []
+    real_decode = app_module.jwt.decode
+    monkeypatch.setattr(app_module.jwt, 'decode', lambda *a, **kw: decoded.append(a[0]) or real_decode(*a, **kw))
+    token = get_jwt_token(client, 'alice', 'password123')
+    for _ in range(3):
+        assert client.get('/admin/tenants', headers={'Authorization': f'Bearer {token}'}).status_code == 200
+    assert decoded == [token]
+    expired = app_module.jwt.encode({'user': 'alice', 'exp': 1}, app_module.JWT_SECRET, algorithm=app_module.JWT_ALGO)
+    assert client.get('/admin/tenants', headers={'Authorization': f'Bearer {expired}'}).status_code == 401
+
+def test_user_changes_revoke_tokens_across_processes(client, tmp_path, monkeypatch):
+    users_path = str(tmp_path / 'users.json')
+    monkeypatch.setattr(app_module, 'AUDIT_LOG_PATH', str(tmp_path / 'audit_log.csv'))
+    monkeypatch.setattr(app_module, '_user_store', app_module.UserStore(users_path, app_module.USERS, recheck_seconds=0))
+    admin = {'Authorization': f"Bearer {get_jwt_token(client, 'alice', 'password123')}"}
+    resp = client.post('/admin/users', json={'username': 'carol', 'password': 'pw1', 'tenant': 'org3'}, headers=admin)
+    assert resp.status_code == 200
+    assert app_module.load_users()['carol']['tenant'] == 'org3'
+    assert 'add_user' in open(str(tmp_path / 'audit_log.csv')).read()  # admin_required sets g.user
+    carol = {'Authorization': f"Bearer {get_jwt_token(client, 'carol', 'pw1')}"}
+    assert client.post('/speak', json={'text': 'hi'}, headers=carol).status_code == 200
+    # Another process changes carol's password: her existing token stops working
+    other = app_module.UserStore(users_path, app_module.USERS)
+    users = other.load()
+    users['carol']['password'] = 'pw2'
+    other.save(users)
+    assert client.post('/speak', json={'text': 'hi'}, headers=carol).status_code == 401
+    carol = {'Authorization': f"Bearer {get_jwt_token(client, 'carol', 'pw2')}"}
+    assert client.post('/speak', json={'text': 'hi'}, headers=carol).status_code == 200
+    # ... and deleting her revokes the new one
+    client.delete('/admin/users', json={'username': 'carol'}, headers=admin)
+    resp = client.post('/speak', json={'text': 'hi'}, headers=carol)
+    assert resp.status_code == 401 and 'revoked' in resp.get_json()['message']
+
+@pytest.fixture
+def s3_bucket(monkeypatch):
+    moto = pytest.importorskip('moto')
+    for name, value in {'AWS_ACCESS_KEY_ID': 'testing', 'AWS_SECRET_ACCESS_KEY': 'testing', 'AWS_DEFAULT_REGION': 'us-east-1'}.items():
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        monkeypatch.setattr(app_module, '_s3_client', None)
+        app_module.get_s3_client().create_bucket(Bucket='speech-test')
+        monkeypatch.setenv('S3_BUCKET', 'speech-test')
+        yield 'speech-test'
+
+def test_s3_upload_runs_in_background_and_fills_catalog(client, s3_bucket, monkeypatch):
+    uploader = app_module.S3Uploader(workers=1, max_queue=4)
+    monkeypatch.setattr(app_module, '_s3_uploader', uploader)
+    monkeypatch.setattr(app_module, '_s3_uploader_pid', os.getpid())
+    monkeypatch.setattr(app_module, '_rate_limiter', app_module.MemoryRateLimiter())
+    token = get_jwt_token(client, 'alice', 'password123')
+    resp = client.post('/speak', json={'text': f'S3 upload {os.urandom(4).hex()}'}, headers={'Authorization': f'Bearer {token}'})
+    assert resp.status_code == 200 and resp.get_json()['s3_url'] is None
+    uploader.join()
+    row = next(r for r in app_module.get_catalog_store().iter_rows({}, None) if r['file_path'] == resp.get_json()['file_path'])
+    key = row['file_path'][len('/outputs/'):]
+    assert row['s3_url'] == f's3://{s3_bucket}/{key}'
+    assert app_module.get_s3_client().head_object(Bucket=s3_bucket, Key=key)['ContentLength'] > 0
+
+def test_s3_uploader_retries_with_backoff(s3_bucket, tmp_path, monkeypatch):
+    from botocore.exceptions import ClientError
+    real_client = app_module.get_s3_client()
+    failures = []
+    class FlakyClient:
+        def upload_file(self, *args, **kwargs):
+            if len(failures) < 2:
+                failures.append(args[2])
+                raise ClientError({'Error': {'Code': 'SlowDown', 'Message': 'slow down'}}, 'PutObject')
+            return real_client.upload_file(*args, **kwargs)
+    monkeypatch.setattr(app_module, 'get_s3_client', lambda: FlakyClient())
+    path = tmp_path / 'a.wav'
+    path.write_bytes(b'RIFF' * 100)
+    catalog_id = app_module.get_catalog_store().insert({'title': 'retry', 'file_path': '/outputs/a.wav'})
+    uploader = app_module.S3Uploader(workers=1, attempts=3, backoff=0.001)
+    uploader.submit(str(path), s3_bucket, 'retry/a.wav', catalog_id=catalog_id)
+    uploader.join()
+    assert failures == ['retry/a.wav', 'retry/a.wav']
+    assert app_module.get_catalog_store().get(catalog_id)['s3_url'] == f's3://{s3_bucket}/retry/a.wav'
+    assert real_client.get_object(Bucket=s3_bucket, Key='retry/a.wav')['Body'].read() == b'RIFF' * 100
+
+def test_s3_download_streams_ranges_and_forwards_etag(client, s3_bucket, monkeypatch):
+    data = os.urandom(300000)
+    s3 = app_module.get_s3_client()
+    s3.put_object(Bucket=s3_bucket, Key='books/long.mp3', Body=data)
+    resp = client.get('/s3/download?key=books/long.mp3')
+    assert resp.status_code == 200 and resp.is_streamed
+    assert resp.headers['Content-Length'] == '300000' and resp.headers['Accept-Ranges'] == 'bytes'
+    etag = resp.headers['ETag']
+    assert etag == s3.head_object(Bucket=s3_bucket, Key='books/long.mp3')['ETag']
+    assert resp.get_data() == data
+    # The S3 body is closed with the response, even one dropped before any block was read
+    closed = []
+    get_object = s3.get_object
+    def tracking_get_object(**params):
+        obj = get_object(**params)
+        close = obj['Body'].close
+        obj['Body'].close = lambda: closed.append(params['Key']) or close()
+        return obj
+    with monkeypatch.context() as m:
+        m.setattr(s3, 'get_object', tracking_get_object)
+        client.get('/s3/download?key=books/long.mp3', buffered=False).close()
+    assert closed == ['books/long.mp3']
+    part = client.get('/s3/download?key=books/long.mp3', headers={'Range': 'bytes=1000-1999'})
+    assert part.status_code == 206
+    assert part.headers['Content-Range'] == 'bytes 1000-1999/300000' and part.headers['Content-Length'] == '1000'
+    assert part.get_data() == data[1000:2000]
+    assert client.get('/s3/download?key=books/long.mp3', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/s3/download?key=books/missing.mp3').status_code == 404
+
+def test_catalog_batch_download_streams_zip(client, tmp_path, monkeypatch):
+    import io, zipfile
+    monkeypatch.setattr(app_module, 'ZIP_READ_BYTES', 4096)
+    files = {'a.wav': os.urandom(10000), 'b.mp3': os.urandom(10000), 'sub/a.wav': b'\0' * 10000}
+    ids = []
+    for name, data in files.items():
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(data)
+        ids.append(app_module.get_catalog_store().insert({'title': name, 'file_path': '/' + os.path.relpath(str(path))}))
+    resp = client.post('/catalog/batch', json={'action': 'download', 'ids': ids})
+    assert resp.status_code == 200 and resp.is_streamed and resp.mimetype == 'application/zip'
+    chunks = list(resp.response)
+    assert len(chunks) > 3
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as zf:
+        assert zf.testzip() is None
+        infos = {info.filename: info for info in zf.infolist()}
+        assert set(infos) == {'a.wav', 'b.mp3', 'a-1.wav'}
+        assert infos['b.mp3'].compress_type == zipfile.ZIP_STORED
+        assert infos['a-1.wav'].compress_type == zipfile.ZIP_DEFLATED and infos['a-1.wav'].compress_size < 1000
+        assert zf.read('a-1.wav') == files['sub/a.wav'] and zf.read('b.mp3') == files['b.mp3']
+    legacy = client.post('/catalog/batch', json={'action': 'download', 'indices': [0]})
+    assert legacy.status_code == 400 and 'indices' in legacy.get_json()['error']
+
+@pytest.fixture
+def download_file():
+    data = os.urandom(5000)
+    os.makedirs('outputs', exist_ok=True)
+    name = f'test-download-{os.urandom(4).hex()}.mp3'
+    with open(os.path.join('outputs', name), 'wb') as f:
+        f.write(data)
+    yield name, data
+    os.remove(os.path.join('outputs', name))
+
+def test_download_conditional_requests(client, download_file):
+    name, data = download_file
+    resp = client.get(f'/download/{name}')
+    assert resp.status_code == 200 and resp.get_data() == data
+    assert 'immutable' in resp.headers['Cache-Control'] and resp.headers['Content-Length'] == '5000'
+    etag, last_modified = resp.headers['ETag'], resp.headers['Last-Modified']
+    assert client.get(f'/download/{name}', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get(f'/download/{name}', headers={'If-Modified-Since': last_modified}).status_code == 304
+    # If-Range: ranges apply only while the validator still matches
+    part = client.get(f'/download/{name}', headers={'Range': 'bytes=-100', 'If-Range': etag})
+    assert part.status_code == 206 and part.get_data() == data[-100:]
+    assert part.headers['Content-Range'] == 'bytes 4900-4999/5000'
+    stale = client.get(f'/download/{name}', headers={'Range': 'bytes=0-9', 'If-Range': '"old"'})
+    assert stale.status_code == 200 and stale.get_data() == data
+    unsatisfiable = client.get(f'/download/{name}', headers={'Range': 'bytes=6000-'})
+    assert unsatisfiable.status_code == 416 and unsatisfiable.headers['Content-Range'] == 'bytes */5000'
+
+def test_download_multiple_ranges_and_file_wrapper(client, download_file):
+    name, data = download_file
+    resp = client.get(f'/download/{name}', headers={'Range': 'bytes=0-9,100-199,-5'})
+    assert resp.status_code == 206 and resp.mimetype == 'multipart/byteranges'
+    body = resp.get_data()
+    assert len(body) == int(resp.headers['Content-Length'])
+    boundary = resp.mimetype_params['boundary'].encode()
+    parts = body.split(b'--' + boundary)[1:-1]
+    assert [p.split(b'\r\n\r\n', 1)[1][:-2] for p in parts] == [data[0:10], data[100:200], data[-5:]]
+    assert b'Content-Range: bytes 100-199/5000' in parts[1]
+    wrapped = []
+    def file_wrapper(f, block_size):
+        wrapped.append(f.tell())
+        return iter(lambda: f.read(block_size), b'')
+    resp = client.get(f'/download/{name}', headers={'Range': 'bytes=1000-1999'}, environ_base={'wsgi.file_wrapper': file_wrapper})
+    assert resp.status_code == 206 and wrapped == [1000] and resp.headers['Content-Length'] == '1000'
+
+def test_speak_cli_retries_honour_retry_after_and_manifest_skips(tmp_path, monkeypatch):
+    import speak
+    class FakeResponse:
+        def __init__(self, status, headers=None):
+            self.status_code, self.headers = status, headers or {}
+        def close(self):
+            pass
+    responses = [FakeResponse(429, {'Retry-After': '7'}), FakeResponse(503), FakeResponse(200)]
+    class FakeSession:
+        def request(self, method, url, **kwargs):
+            return responses.pop(0)
+    delays = []
+    monkeypatch.setattr(speak.time, 'sleep', delays.append)
+    resp = speak.request_with_retries(FakeSession(), 'POST', 'http://api/speak-file', retries=3, backoff=1.0)
+    assert resp.status_code == 200
+    assert delays[0] == 7 and 1.0 <= delays[1] <= 2.0
+    manifest = speak.Manifest(str(tmp_path / 'manifest.jsonl'))
+    key = speak.Manifest.key(b'chapter one', {'format': 'mp3'})
+    output = tmp_path / 'one.mp3'
+    output.write_bytes(b'audio')
+    manifest.record(key, source='one.txt', output=str(output))
+    reloaded = speak.Manifest(str(tmp_path / 'manifest.jsonl'))
+    assert reloaded.done(key)
+    assert not reloaded.done(speak.Manifest.key(b'chapter one', {'format': 'ogg'}))
+    assert not reloaded.done(speak.Manifest.key(b'chapter one, edited', {'format': 'mp3'}))
+
+def test_speak_batch_shares_model_batches_and_catalogs_in_bulk(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, '_rate_limiter', app_module.MemoryRateLimiter())
+    monkeypatch.setattr(app_module, '_batch_store', app_module.BatchStore(str(tmp_path / 'batches.db')))
+    monkeypatch.setattr(app_module, '_catalog_store', app_module.CatalogStore(str(tmp_path / 'catalog.db')))
+    monkeypatch.setattr(app_module.celery_app.conf, 'task_always_eager', True)
+    monkeypatch.setenv('SYNTH_CACHE', '0')
+    backend = RecordingTTS()
+    monkeypatch.setattr(app_module, 'tts_pipeline', backend)
+    bulk_inserts = []
+    insert_many = app_module.log_metadata_many
+    monkeypatch.setattr(app_module, 'log_metadata_many', lambda rows: bulk_inserts.append(len(rows)) or insert_many(rows))
+    token = get_jwt_token(client, 'alice', 'password123')
+    headers = {'Authorization': f'Bearer {token}'}
+    resp = client.post('/speak-batch', headers=headers, json={
+        'format': 'wav',
+        'items': ['First batch doc', {'text': 'Second batch doc', 'title': 'Second'}, {'text': 'Third', 'format': 'mp3'}],
+    })
+    assert resp.status_code == 200
+    batch_id = resp.get_json()['batch_id']
+    # Chunks of different documents went through one model batch
+    assert backend.calls == [('batch', ['First batch doc', 'Second batch doc', 'Third'])]
+    assert bulk_inserts == [3]
+    assert client.get(f'/speak-batch/{batch_id}').status_code == 401
+    bob = get_jwt_token(client, 'bob', 'password456')
+    assert client.get(f'/speak-batch/{batch_id}', headers={'Authorization': f'Bearer {bob}'}).status_code == 404
+    batch = client.get(f'/speak-batch/{batch_id}', headers=headers).get_json()
+    assert batch['status'] == 'complete' and batch['completed'] == 3 and batch['failed'] == 0
+    assert [item['format'] for item in batch['items']] == ['wav', 'wav', 'mp3']
+    assert batch['items'][1]['title'] == 'Second' and 'Second' in batch['items'][1]['file_path']
+    rows = app_module.get_catalog_store().query({'user': 'alice'}, 'Second', limit=10, offset=0)[0]
+    assert any(row['file_path'] == batch['items'][1]['file_path'] for row in rows)
+
+def test_speak_batch_validates_every_item_first(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, '_rate_limiter', app_module.MemoryRateLimiter())
+    monkeypatch.setattr(app_module, '_batch_store', app_module.BatchStore(str(tmp_path / 'batches.db')))
+    token = get_jwt_token(client, 'alice', 'password123')
+    headers = {'Authorization': f'Bearer {token}'}
+    resp = client.post('/speak-batch', headers=headers, json={'items': ['ok', {'text': ''}, {'text': 'x', 'format': 'flac'}]})
+    assert resp.status_code == 422
+    assert [e['index'] for e in resp.get_json()['errors']] == [1, 2]
+    from io import BytesIO
+    resp = client.post('/speak-batch', headers=headers, content_type='multipart/form-data', data={
+        'format': 'ogg',
+        'file': [(BytesIO(b'Title: One\nFirst file'), 'one.txt'), (BytesIO(b'{not json'), 'two.json')],
+    })
+    assert resp.status_code == 422
+    errors = resp.get_json()['errors']
+    assert [e['index'] for e in errors] == [1] and errors[0]['error'].startswith('Invalid JSON')
+
+def test_job_status_hub_feeds_bulk_status_long_poll_and_sse(client, tmp_path, monkeypatch):
+    import threading
+    store = app_module.JobStore(str(tmp_path / 'jobs.db'))
+    monkeypatch.setattr(app_module, '_job_store', store)
+    store.add('job-a', 'alice', 'text a', 'queued')
+    store.add('job-b', 'bob', 'text b', 'queued')
+    states = {'job-a': ('processing', '', ''), 'job-b': ('pending', '', '')}
+    lookups = []
+    def status_fn(job_id):
+        lookups.append(job_id)
+        return states[job_id]
+    hub = app_module.JobStatusHub(store, interval=3600, status_fn=status_fn)
+    # No background thread: the hub refreshes only when the test calls refresh()
+    monkeypatch.setattr(hub, 'start', lambda: None)
+    monkeypatch.setattr(app_module, '_job_hub', hub)
+    monkeypatch.setattr(app_module, '_rate_limiter', app_module.MemoryRateLimiter())
+    token = get_jwt_token(client, 'alice', 'password123')
+    headers = {'Authorization': f'Bearer {token}'}
+
+    assert client.get('/jobs/status?ids=job-a').status_code == 401
+    assert client.get('/jobs/stream').status_code == 401
+    # Only the caller's jobs are reported
+    resp = client.get('/jobs/status?ids=job-a,job-b,missing', headers=headers)
+    body = resp.get_json()
+    assert {job['job_id']: job['status'] for job in body['jobs']} == {'job-a': 'queued'}
+    assert 'text' not in body['jobs'][0]
+    since = body['seq']
+
+    hub.refresh()
+    resp = client.get(f'/jobs/poll?since={since}&timeout=0', headers=headers)
+    jobs = resp.get_json()['jobs']
+    assert [(job['job_id'], job['status']) for job in jobs] == [('job-a', 'processing')]
+    since = resp.get_json()['seq']
+
+    # A waiting long-poll returns as soon as the hub records a change
+    def finish():
+        states['job-a'] = ('complete', 'http://localhost:8000/outputs/a.wav', '')
+        hub.refresh()
+    threading.Timer(0.2, finish).start()
+    resp = client.get(f'/jobs/poll?since={since}&timeout=10', headers=headers)
+    jobs = resp.get_json()['jobs']
+    assert [(job['job_id'], job['status'], job['result_url']) for job in jobs] == [('job-a', 'complete', 'http://localhost:8000/outputs/a.wav')]
+    # Celery is asked once per unfinished job per refresh, however many clients watch
+    lookups.clear()
+    hub.refresh()
+    assert lookups == ['job-b']
+
+    monkeypatch.setattr(app_module, 'JOB_STREAM_MAX_SECONDS', 0.3)
+    resp = client.get(f'/jobs/stream?token={token}', headers={'Last-Event-ID': '0'})
+    assert resp.mimetype == 'text/event-stream'
+    events = [block for block in resp.get_data(as_text=True).split('\n\n') if 'event: job' in block]
+    assert len(events) == 1 and f"id: {jobs[0]['seq']}" in events[0]
+    assert json.loads(events[0].split('data: ', 1)[1])['status'] == 'complete'
+
+    # Jobs stuck unfinished past the age cutoff are no longer looked up
+    store.add('job-old', 'alice', 'text', 'queued', submitted_at='2000-01-01 00:00:00')
+    assert store.active_ids() == ['job-old', 'job-b']
+    assert store.active_ids(max_age=3600) == ['job-b']
+
+def test_chunks_follow_token_limit_without_repeating_text():
+    text = '[S1] One two three. Four five six. [S2] Seven eight nine. Ten eleven twelve.'
+    chunks = app_module.split_text_into_chunks(text, max_tokens=30)
+    assert chunks == ['[S1] One two three.', '[S1] Four five six.', '[S2] Seven eight nine.', '[S2] Ten eleven twelve.']
+    assert all(app_module.utf8_token_count(chunk) <= 30 for chunk in chunks)
+    # A sentence longer than the limit is split between words; multibyte text is counted in bytes
+    chunks = app_module.split_text_into_chunks('é' * 10 + ' ' + 'ü' * 10, max_tokens=26)
+    assert chunks == ['é' * 10, 'ü' * 10]
+    # Unbroken CJK text is cut with a logarithmic number of tokenizer calls per chunk
+    calls = []
+    def count_tokens(text):
+        calls.append(text)
+        return app_module.utf8_token_count(text)
+    text = '漢' * 5000
+    chunks = app_module.split_long_piece(text, 1024, count_tokens)
+    assert ''.join(chunks) == text and [len(chunk) for chunk in chunks[:-1]] == [341] * (len(chunks) - 1)
+    assert len(calls) <= 12 * len(chunks)
+
+def test_chunk_joins_clamp_silence_and_crossfade(monkeypatch):
+    np = app_module.np
+    monkeypatch.setattr(app_module, 'TTS_JOIN_SILENCE_MS', 100)
+    speech = np.full(1000, 0.5, dtype=np.float32)
+    silence = np.zeros(500, dtype=np.float32)
+    first = (np.concatenate([silence, speech, silence]), 1000)
+    second = (np.concatenate([silence, speech, silence]), 1000)
+    audio, sr = app_module.join_chunk_audio([first, second], crossfade_ms=0)
+    # Outer edges are kept; each side of the join keeps 50 ms
+    assert len(audio) == 500 + 1000 + 50 + 50 + 1000 + 500
+    audio, _ = app_module.join_chunk_audio([first, second], crossfade_ms=20)
+    assert len(audio) == 3100 - 20
+
+def test_uploaded_text_is_decoded_and_chunked_incrementally():
+    from io import BytesIO
+    raw = 'Title: Été  report\nHéllo wörld. Ünïcode text. '.encode('utf-8')
+    pieces = list(app_module.iter_decoded_text(BytesIO(raw), block_size=3))
+    assert ''.join(pieces) == raw.decode('utf-8')
+    title, rest = app_module.split_title_line(iter(pieces))
+    assert title == 'Été report' and ''.join(rest).strip().startswith('Héllo')
+    consumed = []
+    def upload():
+        for i in range(10000):
+            consumed.append(i)
+            yield f'Sentence number {i}. '
+    chunks = app_module.iter_text_chunks(upload(), max_tokens=60)
+    assert next(chunks) == 'Sentence number 0. Sentence number 1. Sentence number 2.'
+    assert len(consumed) < 10
+
+def test_speak_file_streams_txt_upload_and_caches(client, tmp_path, monkeypatch):
+    from io import BytesIO
+    monkeypatch.setattr(app_module, '_rate_limiter', app_module.MemoryRateLimiter())
+    monkeypatch.setattr(app_module, 'TTS_CHUNK_TOKENS', 40)
+    backend = RecordingTTS()
+    monkeypatch.setattr(app_module, 'tts_pipeline', backend)
+    token = get_jwt_token(client, 'alice', 'password123')
+    body = ('Title: Streamed Upload\n' + ' '.join(f'Line {i} {os.urandom(4).hex()}.' for i in range(20))).encode()
+    def upload(**form):
+        return client.post('/speak-file', headers={'Authorization': f'Bearer {token}'}, content_type='multipart/form-data',
+                           data={'file': (BytesIO(body), 'doc.txt'), 'format': 'wav', **form})
+    data = upload().get_json()
+    assert data['title'] == 'Streamed Upload' and data['cached'] is False
+    chunks = [text for _, texts in backend.calls for text in texts]
+    assert len(chunks) > 1 and all(len(chunk) <= 40 for chunk in chunks)
+    assert ' '.join(chunks) == ' '.join(body.decode().split('\n', 1)[1].split())
+    # With a form title the "Title:" line is read aloud, which is different audio
+    data = upload(title='Custom').get_json()
+    assert data['title'] == 'Custom' and data['cached'] is False
+    # .json uploads share cache entries with /speak for the same text
+    text = f'Json upload {os.urandom(4).hex()}.'
+    resp = client.post('/speak-file', headers={'Authorization': f'Bearer {token}'}, content_type='multipart/form-data',
+                       data={'file': (BytesIO(json.dumps({'text': text}).encode()), 'doc.json'), 'format': 'wav'})
+    assert resp.get_json()['cached'] is False
+    cache = app_module.get_synthesis_cache()
+    key = cache.make_key(text, dict(app_module.build_tts_kwargs('default', None, None), format='wav', quality='medium'))
+    assert cache.fetch(key, str(tmp_path / 'hit.wav')) is not None
+    # A cache hit neither chunks the text nor touches the model
+    def no_model():
+        raise AssertionError('model loaded on a cache hit')
+    monkeypatch.setattr(app_module, 'get_tts_pipeline', no_model)
+    assert upload().get_json()['cached'] is True
+
+def test_inference_pool_restarts_dead_workers():
+    import signal
+    import time
+    pool = app_module.InferencePool(PidTTS(), workers=2).start()
+    try:
+        old = pool._procs[0]
+        os.kill(old.pid, signal.SIGKILL)
+        old.join(timeout=5)
+        # A result for a task the pool no longer tracks is ignored, not fatal to the collector
+        pool._deliver(12345, 0, [], None)
+        deadline = time.monotonic() + 10
+        while (pool._procs[0] is old or not pool._procs[0].is_alive()) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert pool._procs[0] is not old and pool._procs[0].is_alive()
+        results = pool.batch(['a' * n for n in range(1, 5)])
+        assert len({int(r['audio'][0]) for r in results}) == 2
+    finally:
+        pool.close()